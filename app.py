@@ -2,11 +2,17 @@
 import uvicorn
 import socket
 import os
+import asyncio
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.staticfiles import StaticFiles
 from modules.routes import router
-from modules.database import init_db
+from modules.page_cache import page_cache
+from modules.assets import assets
+from modules.database import init_db, close_db, progress_flush_loop
+from modules.sessions import session_store, session_sweep_loop
+from modules.submissions import submission_pipeline
+from modules.config import WORKERS, SESSION_BACKEND, PROGRESS_WRITE_BEHIND, ASSET_CHECK_INTERVAL
 
 
 # 🌟 推荐的新版 Lifespan 处理器，替代过时的 @app.on_event
@@ -23,11 +29,28 @@ async def lifespan(app: FastAPI):
     print("📡 正在检查/初始化数据库...")
     init_db()
     print("✅ 数据库已就绪")
+    print(f"🧩 已预编译 {page_cache.precompile()} 个模板")
+    print(f"📦 已构建 {assets.refresh()} 个静态资源（指纹 + 预压缩）")
+
+    # 3. 启动观看进度的定时批量落盘
+    flusher = asyncio.ensure_future(progress_flush_loop())
+    # 4. 启动过期会话的后台清理
+    sweeper = asyncio.ensure_future(session_sweep_loop())
+    # 5. 启动交卷流水线（同时接手上次退出时未完成的提交）
+    submission_pipeline.start()
+    # 6. 后台检查静态资源是否修改（指纹与预压缩文件在线程池里重建）
+    watcher = asyncio.ensure_future(assets.watch(ASSET_CHECK_INTERVAL)) if ASSET_CHECK_INTERVAL > 0 else None
 
     yield  # 此时应用正在运行...
 
     # --- [关闭时运行] ---
     print("🔌 正在关闭服务...")
+    flusher.cancel()
+    sweeper.cancel()
+    if watcher is not None: watcher.cancel()
+    await submission_pipeline.stop()
+    close_db()  # 等进行中的落盘结束，再把缓冲中的进度全部写入
+    session_store.close()
 
 
 app = FastAPI(lifespan=lifespan)
@@ -67,4 +90,14 @@ if __name__ == "__main__":
     print(f"📡 【内网穿透访问】: (请使用你的花生壳/frp提供的公网网址)")
     print("█" * 60 + "\n")
 
-    uvicorn.run(app, host="0.0.0.0", port=port)
\ No newline at end of file
+    # 多 worker 需要共享的会话存储，否则请求落到别的进程就会“掉登录”
+    workers = WORKERS
+    if workers > 1 and SESSION_BACKEND != "sqlite":
+        print("⚠️ WORKERS > 1 需要 SESSION_BACKEND = \"sqlite\"，已退回单进程运行")
+        workers = 1
+    if workers > 1 and PROGRESS_WRITE_BEHIND:
+        print("ℹ️ 多 worker 模式下观看进度改为每次上报直接写库（进程内写缓冲对其他 worker 不可见）")
+    if workers > 1:
+        uvicorn.run("app:app", host="0.0.0.0", port=port, workers=workers)
+    else:
+        uvicorn.run(app, host="0.0.0.0", port=port)
\ No newline at end of file
@@ -0,0 +1,82 @@
+# benchmarks/bench_db_pool.py
+# 连接池（每线程长连接 + WAL + 调优 pragma）对比原来的“每次调用 connect / close + 回滚日志”。
+# 用法：python benchmarks/bench_db_pool.py [线程数] [每线程操作数]
+# 在临时目录里建库运行，不会读写仓库里的 users.db
+import contextlib, os, random, shutil, sqlite3, sys, tempfile, threading, time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+THREADS = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+OPS = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+USERS = 1000
+WRITE_RATIO = 0.2  # 考试期间的典型比例：多数请求查会话用户信息，部分请求写作答
+
+
+@contextlib.contextmanager
+def connect_per_call(path):
+    """原来的 get_user_db()：每次调用新建连接，默认回滚日志，用完关闭"""
+    conn = sqlite3.connect(path)
+    conn.row_factory = sqlite3.Row
+    try:
+        yield conn
+    finally:
+        conn.close()
+
+
+def worker(get_conn, seed, latencies, errors):
+    rnd = random.Random(seed)
+    for _ in range(OPS):
+        u = f"s{rnd.randrange(USERS)}"
+        t = time.perf_counter()
+        try:
+            with get_conn() as c:
+                if rnd.random() < WRITE_RATIO:
+                    c.execute("INSERT OR REPLACE INTO user_answers (username, question_id, selected_option, is_correct) "
+                              "VALUES (?,?,?,?)", (u, rnd.randrange(50), "ABCD"[rnd.randrange(4)], 1))
+                    c.commit()
+                else:
+                    c.execute("SELECT nickname, avatar, role FROM users WHERE username = ?", (u,)).fetchone()
+        except sqlite3.OperationalError:
+            errors.append(1)  # database is locked
+        latencies.append(time.perf_counter() - t)
+
+
+def run(name, get_conn):
+    latencies, errors = [], []
+    threads = [threading.Thread(target=worker, args=(get_conn, i, latencies, errors)) for i in range(THREADS)]
+    start = time.perf_counter()
+    for t in threads: t.start()
+    for t in threads: t.join()
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    pct = lambda p: latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000
+    print(f"{name:<24}{len(latencies) / elapsed:>10.0f} ops/s   p50 {pct(0.5):6.2f}ms   p99 {pct(0.99):7.2f}ms"
+          f"   locked {len(errors)}")
+    return len(latencies) / elapsed
+
+
+def main():
+    workdir = tempfile.mkdtemp(prefix="bench-db-pool-")
+    os.chdir(workdir)
+    try:
+        from modules.database import init_db, close_db, db_import_users, get_user_db
+        init_db()
+        db_import_users((i, f"s{i}", "pw", None) for i in range(USERS))
+        close_db()
+        # 基线库：同样的表与数据，改回原来的回滚日志模式
+        shutil.copy("users.db", "baseline.db")
+        with sqlite3.connect("baseline.db") as c:
+            c.execute("PRAGMA journal_mode=DELETE")
+        print(f"⏱️ {THREADS} 线程 × {OPS} 次操作，写占 {WRITE_RATIO:.0%}")
+        old = run("每次调用 connect", lambda: connect_per_call("baseline.db"))
+        new = run("连接池 + WAL", get_user_db)
+        close_db()
+        print(f"📈 吞吐提升 {new / old:.1f} 倍")
+    finally:
+        os.chdir(ROOT)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+# benchmarks/bench_streaming.py
+# /video-stream 吞吐：现在的 Range 引擎（mmap / 热点分片缓存）对比原来的逐块 f.read() 生成器。
+# 服务端在子进程里用 uvicorn 运行，客户端在本进程并发请求，测两种场景：
+#   整文件顺序下载、全班同时打开同一视频（多客户端并发请求开头若干 MB 的随机 1MB 区间）
+# 用法：python benchmarks/bench_streaming.py [视频 MB] [并发客户端数] [区间请求总数]
+import asyncio, os, random, shutil, socket, subprocess, sys, tempfile, time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+VIDEO_MB = int(sys.argv[1]) if len(sys.argv) > 1 and sys.argv[1] != "--serve" else 256
+CLIENTS = int(sys.argv[2]) if len(sys.argv) > 2 and sys.argv[1] != "--serve" else 32
+REQUESTS = int(sys.argv[3]) if len(sys.argv) > 3 and sys.argv[1] != "--serve" else 2000
+HOT_MB = 16  # 开课时大家请求的都是开头这一段
+MB = 1024 * 1024
+
+
+def make_app(video_dir):
+    from fastapi import FastAPI, Request
+    from fastapi.responses import StreamingResponse
+    from modules.streaming import send_video_range
+
+    app = FastAPI()
+
+    @app.get("/new/{filename}")
+    async def new(request: Request, filename: str):
+        return send_video_range(os.path.join(video_dir, filename), request.headers, request.method)
+
+    @app.get("/old/{filename}")
+    async def old(request: Request, filename: str):
+        # 原来的实现（见 user-001 之前的 routes.send_video_range）：生成器逐块 1MB f.read()
+        file_path = os.path.join(video_dir, filename)
+        file_size = os.path.getsize(file_path)
+        start, end = 0, file_size - 1
+        range_header = request.headers.get("range")
+        if range_header:
+            parts = range_header.replace("bytes=", "").split("-")
+            if parts[0]: start = int(parts[0])
+            if parts[1]: end = int(parts[1])
+        end = min(end, file_size - 1)
+        total = end - start + 1
+
+        def iterfile():
+            with open(file_path, "rb") as f:
+                f.seek(start)
+                remaining = total
+                while remaining > 0:
+                    data = f.read(min(remaining, MB))
+                    if not data: break
+                    remaining -= len(data)
+                    yield data
+
+        return StreamingResponse(iterfile(), status_code=206, headers={
+            "Content-Range": f"bytes {start}-{end}/{file_size}", "Accept-Ranges": "bytes",
+            "Content-Length": str(total), "Content-Type": "video/mp4"})
+
+    return app
+
+
+def serve(port, video_dir):
+    import uvicorn
+    uvicorn.run(make_app(video_dir), host="127.0.0.1", port=port, log_level="warning")
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def full_download(client, path):
+    start, size = time.perf_counter(), 0
+    async with client.stream("GET", path) as r:
+        async for chunk in r.aiter_raw():
+            size += len(chunk)
+    return size / MB / (time.perf_counter() - start)
+
+
+async def hot_ranges(client, path):
+    queue = asyncio.Queue()
+    for _ in range(REQUESTS): queue.put_nowait(random.randrange(HOT_MB))
+    latencies, received = [], [0]
+
+    async def one_client():
+        while not queue.empty():
+            mb = queue.get_nowait()
+            t = time.perf_counter()
+            r = await client.get(path, headers={"Range": f"bytes={mb * MB}-{(mb + 1) * MB - 1}"})
+            assert r.status_code == 206 and len(r.content) == MB
+            received[0] += len(r.content)
+            latencies.append(time.perf_counter() - t)
+
+    start = time.perf_counter()
+    await asyncio.gather(*[one_client() for _ in range(CLIENTS)])
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return REQUESTS / elapsed, received[0] / MB / elapsed, latencies[len(latencies) // 2] * 1000, \
+        latencies[int(len(latencies) * 0.99)] * 1000
+
+
+async def bench(port):
+    import httpx
+    limits = httpx.Limits(max_connections=CLIENTS, max_keepalive_connections=CLIENTS)
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", limits=limits, timeout=60) as client:
+        for _ in range(100):  # 等服务端起来
+            try:
+                await client.get("/docs")
+                break
+            except httpx.TransportError:
+                await asyncio.sleep(0.1)
+        results = {}
+        for impl in ("old", "new"):
+            path = f"/{impl}/lecture.mp4"
+            await full_download(client, path)  # 预热页缓存
+            full = await full_download(client, path)
+            rps, mbps, p50, p99 = await hot_ranges(client, path)
+            results[impl] = (full, rps, mbps, p50, p99)
+            print(f"{impl:<4} 整文件 {full:8.0f} MB/s   并发区间 {rps:7.0f} req/s {mbps:8.0f} MB/s   "
+                  f"p50 {p50:6.1f}ms   p99 {p99:6.1f}ms")
+        return results
+
+
+def main():
+    workdir = tempfile.mkdtemp(prefix="bench-streaming-")
+    try:
+        with open(os.path.join(workdir, "lecture.mp4"), "wb") as f:
+            for _ in range(VIDEO_MB): f.write(os.urandom(MB))
+        port = free_port()
+        server = subprocess.Popen([sys.executable, os.path.abspath(__file__), "--serve", str(port), workdir], cwd=workdir)
+        try:
+            print(f"⏱️ 视频 {VIDEO_MB}MB；{CLIENTS} 个客户端并发请求开头 {HOT_MB}MB 内的 1MB 区间共 {REQUESTS} 次")
+            results = asyncio.run(bench(port))
+            print(f"📈 整文件 {results['new'][0] / results['old'][0]:.1f} 倍，"
+                  f"并发区间 {results['new'][1] / results['old'][1]:.1f} 倍")
+        finally:
+            server.terminate()
+            server.wait()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["--serve"]:
+        os.chdir(sys.argv[3])
+        serve(int(sys.argv[2]), sys.argv[3])
+    else:
+        main()
@@ -0,0 +1,81 @@
+# benchmarks/bench_user_import.py
+# 批量导入 1 万个账号：名单解析 + executemany 分块事务，对比原来逐个 create_user（每个账号一次连接 + 一次提交）；
+# 顺带测批量延期与批量注销（每张表一条集合语句）。
+# 基线存的是裸 SHA-256；导入改存加盐的轻量 PBKDF2（口令线程池并行计算），哈希占导入耗时的大头，随 CPU 核数缩短。
+# 用法：python benchmarks/bench_user_import.py [账号数] [基线逐个创建的账号数]
+# 在临时目录里建库运行，不会读写仓库里的 users.db
+import hashlib, io, os, random, shutil, sqlite3, string, sys, tempfile, time
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+ROWS = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+BASELINE_ROWS = int(sys.argv[2]) if len(sys.argv) > 2 else 1000  # 逐个创建太慢，按实测速率推算
+
+
+def roster_csv(n: int) -> bytes:
+    lines = ["学号,密码,姓名"] + [f"2026{i:06d},pw{i:06d},学生{i}" for i in range(n)]
+    return ("\n".join(lines) + "\n").encode("utf-8")
+
+
+def old_create_user(path, u, p):
+    """原来的 create_user：每个账号新建连接（回滚日志）、插入、提交、关闭"""
+    ex = datetime.now() + timedelta(days=60)
+    nk = "学研员_" + ''.join(random.choices(string.ascii_letters + string.digits, k=4))
+    conn = sqlite3.connect(path)
+    try:
+        conn.execute("INSERT INTO users (username, password, nickname, expires_at, role) VALUES (?,?,?,?,?)",
+                     (u, hashlib.sha256(p.encode()).hexdigest(), nk, ex, 'student'))
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def main():
+    workdir = tempfile.mkdtemp(prefix="bench-user-import-")
+    os.chdir(workdir)
+    try:
+        from modules.database import init_db, close_db, db_import_users, db_extend_users, db_delete_users
+        from modules.roster import parse_roster
+        init_db()
+        close_db()
+        # 基线库：同样的表结构，改回原来的回滚日志模式
+        shutil.copy("users.db", "baseline.db")
+        with sqlite3.connect("baseline.db") as c:
+            c.execute("PRAGMA journal_mode=DELETE")
+
+        start = time.perf_counter()
+        for i in range(BASELINE_ROWS): old_create_user("baseline.db", f"b{i}", f"pw{i}")
+        per_row = (time.perf_counter() - start) / BASELINE_ROWS
+        print(f"🐢 逐个 create_user：{BASELINE_ROWS} 个 {per_row * BASELINE_ROWS:.2f}s，"
+              f"推算 {ROWS} 个约 {per_row * ROWS:.1f}s")
+
+        data = roster_csv(ROWS)
+        errors = []
+        start = time.perf_counter()
+        created, skipped = db_import_users(parse_roster(io.BytesIO(data), "roster.csv", errors))
+        imported = time.perf_counter() - start
+        assert created == ROWS and not errors and not skipped
+        print(f"📥 名单导入：{created} 个 {imported:.2f}s（{created / imported:.0f} 行/s，CSV {len(data) / 1024:.0f}KB）")
+
+        start = time.perf_counter()
+        created, skipped = db_import_users(parse_roster(io.BytesIO(data), "roster.csv", errors))
+        print(f"🔁 重复导入同一名单：新建 {created}，逐行报告重复 {len(skipped)} 行，{time.perf_counter() - start:.2f}s")
+
+        names = [f"2026{i:06d}" for i in range(ROWS)]
+        start = time.perf_counter()
+        db_extend_users(names, 30)
+        print(f"⏳ 批量延期 {ROWS} 个：{time.perf_counter() - start:.2f}s")
+        start = time.perf_counter()
+        db_delete_users(names)
+        print(f"🗑️ 批量注销 {ROWS} 个：{time.perf_counter() - start:.2f}s")
+        print(f"📈 导入比逐个创建快 {per_row * ROWS / imported:.0f} 倍")
+        close_db()
+    finally:
+        os.chdir(ROOT)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+# modules/assets.py
+import asyncio, gzip, hashlib, mimetypes, os, sys, threading
+from starlette.responses import FileResponse, Response
+from .config import STATIC_DIR, ASSET_BUILD_DIR, ASSET_URL_PREFIX, ASSET_EXCLUDE, ASSET_COMPRESS_EXTS
+
+try:
+    import brotli
+except ImportError:  # 未安装 brotli 时只生成 .gz
+    brotli = None
+
+# 🌟 静态资源流水线：static/ 下的样式、脚本、图片按内容哈希生成带指纹的文件名（css/global.3f2a1b9c0d4e.css），
+# 可压缩的类型预先生成 .gz / .br，请求时按 Accept-Encoding 协商直接发送预压缩文件，
+# 并以 Cache-Control: immutable 长期缓存；文件内容一变指纹随之改变，模板里的 asset_url() 自动指向新地址。
+# 启动时构建一次，之后由后台任务定时检查（遍历目录、哈希、压缩都在线程池里），请求与模板渲染只查内存中的清单。
+# 上传的头像与视频（ASSET_EXCLUDE）仍走原来的 /static
+
+_IMMUTABLE = "public, max-age=31536000, immutable"
+
+
+def _write_atomic(path: str, data: bytes):
+    # 多个 worker 同时构建时先写临时文件再改名，读者不会看到写了一半的文件
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+class AssetPipeline:
+    def __init__(self, source: str, build: str, prefix: str):
+        self.source, self.build, self.prefix = source, build, prefix
+        self.lock = threading.Lock()
+        # 清单整体替换（不原地修改），后台线程重建时请求读到的总是完整的旧清单或新清单
+        self.manifest = {}  # 逻辑路径 -> (源文件 mtime, 带指纹的相对路径)
+        self.served = {}  # 带指纹的相对路径 -> 可用编码集合（"br" / "gzip"）
+        self.version = 0  # 任一资源重新构建后加一，页面缓存据此失效
+
+    def _sources(self):
+        for root, dirs, files in os.walk(self.source):
+            rel_root = os.path.relpath(root, self.source)
+            dirs[:] = [d for d in dirs if not d.startswith(".") and
+                       os.path.normpath(os.path.join(rel_root, d)) not in ASSET_EXCLUDE]
+            for name in files:
+                if not name.startswith("."):
+                    yield os.path.normpath(os.path.join(rel_root, name)).replace(os.sep, "/")
+
+    def _build_one(self, logical: str, mtime: float, manifest: dict, served: dict):
+        with open(os.path.join(self.source, logical), "rb") as f:
+            data = f.read()
+        stem, ext = os.path.splitext(logical)
+        hashed = f"{stem}.{hashlib.sha256(data).hexdigest()[:12]}{ext}"
+        target = os.path.join(self.build, hashed)
+        encodings = set()
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        if not os.path.exists(target): _write_atomic(target, data)
+        if ext.lower() in ASSET_COMPRESS_EXTS:
+            # 内容寻址：同名文件内容必然相同，已存在则跳过；压缩后不更小的编码不生成
+            for enc, suffix, compress in (("gzip", ".gz", lambda d: gzip.compress(d, 9, mtime=0)),
+                                          ("br", ".br", brotli and (lambda d: brotli.compress(d, quality=11)))):
+                if compress is None: continue
+                if os.path.exists(target + suffix):
+                    encodings.add(enc)
+                    continue
+                packed = compress(data)
+                if len(packed) < len(data):
+                    _write_atomic(target + suffix, packed)
+                    encodings.add(enc)
+        manifest[logical] = (mtime, hashed)
+        served[hashed] = encodings
+
+    def refresh(self) -> int:
+        """检查源文件修改时间，重新构建有变化的资源，返回构建数（启动时与后台任务调用，会读写磁盘）"""
+        with self.lock:
+            manifest, served = dict(self.manifest), dict(self.served)
+            built, seen = 0, set()
+            for logical in self._sources():
+                seen.add(logical)
+                mtime = os.path.getmtime(os.path.join(self.source, logical))
+                entry = manifest.get(logical)
+                if entry is None or entry[0] != mtime:
+                    self._build_one(logical, mtime, manifest, served)
+                    built += 1
+            for gone in set(manifest) - seen: del manifest[gone]
+            if built or len(manifest) != len(self.manifest):
+                # 旧指纹文件保留在 served 中：已加载旧页面的浏览器仍能取到
+                self.manifest, self.served = manifest, served
+                self.version += 1
+            return built
+
+    async def watch(self, interval: float):
+        """后台定时检查源文件（lifespan 中启动），开发时修改样式无需重启"""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await asyncio.get_running_loop().run_in_executor(None, self.refresh)
+            except Exception as e:
+                print(f"⚠️ 静态资源检查失败: {e}")
+
+    def current_version(self) -> int:
+        return self.version
+
+    def url(self, logical: str) -> str:
+        """模板用：返回带指纹的资源地址；不在流水线内的文件退回 /static 原路径"""
+        logical = logical.lstrip("/")
+        entry = self.manifest.get(logical)
+        return f"{self.prefix}/{entry[1]}" if entry else f"/static/{logical}"
+
+    def response(self, request, path: str):
+        """按 Accept-Encoding 选择 br → gzip → 原文件发送；只接受已构建的带指纹文件名。
+        ETag 取文件名中的内容指纹（每种编码各不相同），浏览器强制刷新时重新验证直接回 304"""
+        encodings = self.served.get(path)
+        if encodings is None: return Response(status_code=404)
+        accepted = {}
+        for part in request.headers.get("accept-encoding", "").split(","):
+            token, _, params = part.strip().partition(";")
+            q = params.strip()[2:] if params.strip().startswith("q=") else "1"
+            try:
+                accepted[token.strip().lower()] = float(q)
+            except ValueError:
+                continue
+        enc, suffix = next(((e, sfx) for e, sfx in (("br", ".br"), ("gzip", ".gz"))
+                            if e in encodings and accepted.get(e, 0) > 0), (None, ""))
+        digest = os.path.splitext(path)[0].rsplit(".", 1)[-1]
+        headers = {"Cache-Control": _IMMUTABLE, "Vary": "Accept-Encoding",
+                   "ETag": f'"{digest}-{enc}"' if enc else f'"{digest}"'}
+        inm = request.headers.get("if-none-match")
+        if inm and headers["ETag"] in [t.strip().removeprefix("W/") for t in inm.split(",")]:
+            return Response(status_code=304, headers=headers)
+        if enc: headers["Content-Encoding"] = enc
+        media_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        return FileResponse(os.path.join(self.build, path) + suffix, media_type=media_type, headers=headers)
+
+    def stats(self) -> dict:
+        return {"assets": len(self.manifest), "version": self.version, "brotli": brotli is not None}
+
+
+assets = AssetPipeline(STATIC_DIR, ASSET_BUILD_DIR, ASSET_URL_PREFIX)
+asset_url = assets.url
+
+
+if __name__ == "__main__":
+    # 部署前预构建：python -m modules.assets build（启动时也会自动构建）
+    if sys.argv[1:2] == ["build"]:
+        print(f"📦 已构建 {assets.refresh()} 个静态资源 -> {ASSET_BUILD_DIR}/")
+        for logical, (_, hashed) in sorted(assets.manifest.items()):
+            print(f"  {logical} -> {hashed} {sorted(assets.served[hashed])}")
+    else:
+        print("用法: python -m modules.assets build")
@@ -0,0 +1,217 @@
+# modules/bandwidth.py
+import asyncio, ipaddress, time
+from typing import Optional
+from collections import OrderedDict, deque
+from .config import (STREAM_GLOBAL_RATE, STREAM_IP_RATE, STREAM_SESSION_RATE, STREAM_PACING_FACTOR,
+                     STREAM_PACING_BURST_SECONDS, STREAM_SCHED_QUANTUM, STREAM_PRIORITY_BYTES,
+                     STREAM_PRIORITY_REFILL_SECONDS, TRUSTED_PROXIES)
+
+# 🌟 视频出口带宽公平调度：隧道上行有限，单个学生多路并发拖动不能把其他人饿死
+# 每个会话、每个 IP 各有令牌桶；全局上行按客户端轮询（round-robin）分配，
+# 每个响应开头的若干字节走优先通道，保证大家的首帧时间；优先额度按客户端计，
+# 多路并发拖动只共享一份，且优先字节照样计入会话 / IP / 节奏桶；
+# 播放器拖动时是一个接一个的 Range 请求，桶在最后一路流结束后继续保留，回满后才清理，额度跨请求延续
+
+
+class TokenBucket:
+    """允许透支的令牌桶：先发后还，长期速率不超过 rate（rate<=0 表示不限速）"""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate, self.burst = rate, burst
+        self.tokens, self.stamp = burst, time.monotonic()
+
+    def delay(self, n: int) -> float:
+        """扣除 n 个令牌，返回需要等待的秒数"""
+        if self.rate <= 0: return 0.0
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+        self.tokens -= n
+        return -self.tokens / self.rate if self.tokens < 0 else 0.0
+
+    def take(self, n: int) -> bool:
+        """余额足够时扣除 n 个令牌并返回 True，不透支"""
+        if self.rate <= 0: return True
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+        if self.tokens < n: return False
+        self.tokens -= n
+        return True
+
+    def full(self) -> bool:
+        """令牌已回满：此时丢弃该桶与重新创建等价"""
+        return self.rate <= 0 or self.tokens + (time.monotonic() - self.stamp) * self.rate >= self.burst
+
+    async def consume(self, n: int):
+        wait = self.delay(n)
+        if wait > 0: await asyncio.sleep(wait)
+
+
+class FairScheduler:
+    PRUNE_INTERVAL = 10  # 清理空闲且已回满的桶的最小间隔（秒）
+
+    def __init__(self, global_rate, ip_rate, session_rate, pacing_factor, quantum, priority_bytes):
+        self.global_rate, self.ip_rate, self.session_rate = global_rate, ip_rate, session_rate
+        self.pacing_factor, self.quantum, self.priority_bytes = pacing_factor, quantum, priority_bytes
+        self.global_bucket = TokenBucket(global_rate, max(global_rate, quantum))
+        self.buckets = {}  # ("ip"|"sid"|"prio", key) -> [TokenBucket, 活跃流数]
+        self.queues = OrderedDict()  # 客户端 -> deque[(future, n)]，全局轮询队列
+        self.urgent = deque()  # 首帧优先通道
+        self.pump_task = None
+        self.pruned_at = time.monotonic()
+        self.active = self.bytes_sent = self.throttled = 0
+        self.first_byte_ms = deque(maxlen=1000)
+
+    @property
+    def enabled(self) -> bool:
+        return self.global_rate > 0 or self.ip_rate > 0 or self.session_rate > 0 or self.pacing_factor > 0
+
+    def _bucket(self, kind: str, key: str, rate: float, burst: float = None):
+        entry = self.buckets.get((kind, key))
+        if entry is None:
+            bucket = TokenBucket(rate, max(rate, self.quantum) if burst is None else burst)
+            entry = self.buckets[(kind, key)] = [bucket, 0]
+        entry[1] += 1
+        return entry[0]
+
+    def _release(self, kind: str, key: str):
+        """流结束只减计数，不删桶：紧接着的下一个 Range 请求要接着用同一份余额"""
+        entry = self.buckets.get((kind, key))
+        if entry is not None: entry[1] -= 1
+
+    def _prune(self):
+        """删除没有活跃流且令牌已回满的桶"""
+        now = time.monotonic()
+        if now - self.pruned_at < self.PRUNE_INTERVAL: return
+        self.pruned_at = now
+        for key in [k for k, (bucket, streams) in self.buckets.items() if streams <= 0 and bucket.full()]:
+            del self.buckets[key]
+
+    async def _global(self, client: str, n: int, urgent: bool):
+        """在全局上行中排队：优先通道先出，其余客户端轮流各取一个分片"""
+        if self.global_rate <= 0: return
+        fut = asyncio.get_running_loop().create_future()
+        if urgent:
+            self.urgent.append((fut, n))
+        else:
+            self.queues.setdefault(client, deque()).append((fut, n))
+        if self.pump_task is None or self.pump_task.done():
+            self.pump_task = asyncio.ensure_future(self._pump())
+        await fut
+
+    async def _pump(self):
+        while self.urgent or self.queues:
+            if self.urgent:
+                fut, n = self.urgent.popleft()
+            else:
+                client, q = next(iter(self.queues.items()))
+                fut, n = q.popleft()
+                if q: self.queues.move_to_end(client)
+                else: del self.queues[client]
+            if fut.done(): continue  # 客户端已断开
+            await self.global_bucket.consume(n)
+            if not fut.done(): fut.set_result(None)
+
+    def wrap(self, send, user: Optional[str], ip: str, bitrate: Optional[int] = None):
+        """返回限速后的 ASGI send：按 quantum 切分响应体，依次经过 会话/IP/节奏/全局 四道闸。
+        user 必须是已校验会话的用户名（不能直接用 cookie 值，否则改 cookie 就能换到新桶），没有登录时按 IP 计"""
+        if not self.enabled: return send, (lambda: None)
+        self._prune()
+        self.active += 1
+        client = user or ip
+        session_bucket = self._bucket("sid", client, self.session_rate) if self.session_rate > 0 else None
+        ip_bucket = self._bucket("ip", ip, self.ip_rate) if self.ip_rate > 0 else None
+        priority = self._bucket("prio", client, self.priority_bytes / STREAM_PRIORITY_REFILL_SECONDS,
+                                self.priority_bytes) if self.priority_bytes > 0 else None
+        pace = None
+        if self.pacing_factor > 0 and bitrate:
+            rate = bitrate / 8 * self.pacing_factor
+            pace = TokenBucket(rate, rate * STREAM_PACING_BURST_SECONDS)
+        state = {"sent": 0, "start": time.monotonic(), "first": True}
+
+        async def gate(n: int):
+            # 响应开头且本客户端还有优先额度时走优先通道；优先字节同样扣各桶，透支部分由后续分片等待偿还
+            urgent = state["sent"] < self.priority_bytes and priority is not None and priority.take(n)
+            waits = [b.delay(n) for b in (session_bucket, ip_bucket, pace) if b is not None]
+            if not urgent and waits and max(waits) > 0:
+                self.throttled += 1
+                await asyncio.sleep(max(waits))
+            await self._global(client, n, urgent)
+            state["sent"] += n
+            self.bytes_sent += n
+
+        async def throttled_send(message):
+            body = message.get("body", b"")
+            if message["type"] == "http.response.zerocopysend":
+                # 一个区间只有一条消息：同样按 quantum 切成 offset/count 小段逐段过闸，不能整段等待后一次性突发
+                offset, count, more = message.get("offset", 0), message["count"], message.get("more_body", False)
+                for i in range(0, count, self.quantum):
+                    n = min(self.quantum, count - i)
+                    await gate(n)
+                    await send({**message, "offset": offset + i, "count": n, "more_body": more or i + n < count})
+                    self._mark_first(state)
+                return
+            elif len(body) > self.quantum:
+                more = message.get("more_body", False)
+                for i in range(0, len(body), self.quantum):
+                    piece = body[i:i + self.quantum]
+                    await gate(len(piece))
+                    await send({"type": "http.response.body", "body": piece,
+                                "more_body": more or i + self.quantum < len(body)})
+                    self._mark_first(state)
+                return
+            elif body:
+                await gate(len(body))
+            await send(message)
+            if body: self._mark_first(state)
+
+        def close():
+            self.active -= 1
+            if session_bucket is not None: self._release("sid", client)
+            if ip_bucket is not None: self._release("ip", ip)
+            if priority is not None: self._release("prio", client)
+
+        return throttled_send, close
+
+    def _mark_first(self, state):
+        if state["first"]:
+            state["first"] = False
+            self.first_byte_ms.append((time.monotonic() - state["start"]) * 1000)
+
+    def stats(self) -> dict:
+        samples = sorted(self.first_byte_ms)
+        pct = lambda p: round(samples[min(len(samples) - 1, int(len(samples) * p))], 1) if samples else None
+        return {"enabled": self.enabled, "global_rate": self.global_rate, "ip_rate": self.ip_rate,
+                "session_rate": self.session_rate, "pacing_factor": self.pacing_factor, "quantum": self.quantum,
+                "active_streams": self.active, "queued_clients": len(self.queues), "queued_urgent": len(self.urgent),
+                "bytes_sent": self.bytes_sent, "throttled_waits": self.throttled,
+                "first_byte_ms_p50": pct(0.5), "first_byte_ms_p99": pct(0.99)}
+
+
+scheduler = FairScheduler(STREAM_GLOBAL_RATE, STREAM_IP_RATE, STREAM_SESSION_RATE, STREAM_PACING_FACTOR,
+                          STREAM_SCHED_QUANTUM, STREAM_PRIORITY_BYTES)
+
+
+_TRUSTED_NETS = [ipaddress.ip_network(p, strict=False) for p in TRUSTED_PROXIES]
+
+
+def _trusted_proxy(addr: str) -> bool:
+    try:
+        ip = ipaddress.ip_address(addr)
+    except ValueError:
+        return False
+    return ip.is_loopback or any(ip in net for net in _TRUSTED_NETS)
+
+
+def client_ip(request) -> str:
+    """经 frp / 花生壳 转发时所有连接都来自本机，此时取 X-Forwarded-For 中的客户端地址。
+    只有直连对端是可信代理时才采信该头；从右往左跳过可信代理追加的地址，
+    第一个不可信的才是真实客户端（更靠左的部分由客户端自己填写，可以伪造）"""
+    peer = request.client.host if request.client else "unknown"
+    fwd = request.headers.get("x-forwarded-for")
+    if not fwd or not _trusted_proxy(peer): return peer
+    hops = [a.strip() for a in fwd.split(",") if a.strip()]
+    for addr in reversed(hops):
+        if not _trusted_proxy(addr): return addr
+    return hops[0] if hops else peer
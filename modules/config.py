@@ -1,3 +1,107 @@
 # login-demo/modules/config.py
 # 视频删除密码（后续可改为从环境变量或配置文件读取）
-VIDEO_DELETE_PASSWORD = "123456"
\ No newline at end of file
+VIDEO_DELETE_PASSWORD = "123456"
+
+# 成绩单 TXT 存档与提交锁定文件所在目录
+DATA_DIR = "Data"
+
+# 成绩单归档：True 时新成绩单压缩追加到分段文件，不再每份单独写 TXT（旧 TXT 用
+# python -m modules.transcript_archive migrate 一次性迁入）
+RECORDS_ARCHIVE = True
+ARCHIVE_DIR = f"{DATA_DIR}/archive"
+ARCHIVE_SEGMENT_BYTES = 64 * 1024 * 1024  # 单个段文件写满该大小后换下一段
+
+# 模板：编译结果缓存目录；PAGE_CACHE 为 True 时与用户无关的页面缓存渲染结果（模板修改后自动失效）
+TEMPLATE_DIR = "templates"
+TEMPLATE_BYTECODE_DIR = ".jinja_cache"
+PAGE_CACHE = True
+
+# 静态资源流水线：static/ 下的资源按内容哈希加指纹并预压缩，经 /assets 长期缓存发送
+STATIC_DIR = "static"
+ASSET_BUILD_DIR = ".assets"
+ASSET_URL_PREFIX = "/assets"
+ASSET_EXCLUDE = ("uploads", "videos")  # 用户上传内容不进流水线
+ASSET_COMPRESS_EXTS = (".css", ".js", ".svg", ".json", ".txt", ".map", ".ico")
+ASSET_CHECK_INTERVAL = 2.0  # 后台检查源文件是否修改的间隔（秒），0 表示只在启动时构建
+
+# 视频流引擎参数
+STREAM_CHUNK_SIZE = 1024 * 1024  # 单次发送块大小（与原 1MB 缓冲区一致）
+STREAM_MAX_RANGES = 16  # 单个请求允许的最大区间数，超出则回整文件
+
+# 热点分片缓存（设为 0 关闭缓存，退回 mmap 直读）
+SEGMENT_SIZE = STREAM_CHUNK_SIZE  # 缓存分片大小，按此对齐
+SEGMENT_CACHE_BYTES = 256 * 1024 * 1024  # 缓存内存上限
+
+# 视频出口带宽调度（单位：字节/秒，0 表示不限；全局上限请按 frp/花生壳 隧道的实际上行带宽填写）
+STREAM_GLOBAL_RATE = 0
+STREAM_IP_RATE = 0
+STREAM_SESSION_RATE = 0
+STREAM_PACING_FACTOR = 0  # >0 时按 视频码率 × 该系数 匀速发送（建议 1.25），0 表示关闭
+STREAM_PACING_BURST_SECONDS = 10  # 节奏模式下允许一次性预缓冲的视频秒数
+STREAM_SCHED_QUANTUM = 256 * 1024  # 调度粒度：每轮每个客户端最多发送的字节数
+STREAM_PRIORITY_BYTES = 512 * 1024  # 每个响应开头走优先通道的字节数（缩短首帧时间）
+STREAM_PRIORITY_REFILL_SECONDS = 2  # 每个客户端的优先额度（STREAM_PRIORITY_BYTES）在该时间内恢复满额，多路并发共享同一份
+# 可信反向代理（IP 或网段）：只有直连对端是本机回环地址或这里列出的代理时才采信 X-Forwarded-For
+TRUSTED_PROXIES = ()
+
+
+# 分片续传上传参数
+UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024  # 默认分片大小
+UPLOAD_MAX_CHUNK_SIZE = 64 * 1024 * 1024  # 客户端可申请的最大分片
+UPLOAD_EXPIRE_DAYS = 3  # 超过该天数仍未完成的上传会被清理
+
+# SQLite 连接池参数
+DB_BUSY_TIMEOUT_MS = 5000  # 写锁等待时间，避免 "database is locked"
+DB_SYNCHRONOUS = "NORMAL"  # WAL 模式下 NORMAL 即可保证崩溃一致性
+DB_CACHE_SIZE_KB = 16 * 1024  # 每条连接的页缓存（KB）
+DB_MMAP_SIZE = 256 * 1024 * 1024  # 内存映射读取上限（字节）
+DB_CACHED_STATEMENTS = 256  # 每条连接缓存的预编译语句数
+
+# 异步数据访问层（False 时路由直接同步调用数据库函数）
+DB_ASYNC = True
+DB_READ_THREADS = 8  # 读线程数；写操作固定由单个写线程串行执行
+
+# 观看进度写缓冲（False 时每次上报立即写库；WORKERS > 1 时自动按 False 处理）
+PROGRESS_WRITE_BEHIND = True
+PROGRESS_FLUSH_INTERVAL = 5  # 定时落盘间隔（秒）
+PROGRESS_FLUSH_MAX = 1000  # 缓冲条数达到该值时立即落盘
+
+# 批量交答案：单次请求允许的最大答案条数
+MAX_BATCH_ANSWERS = 500
+
+# 账号管理页分页
+ADMIN_PAGE_SIZE = 50
+ADMIN_PAGE_SIZE_MAX = 200
+
+# 批量导入账号
+USER_IMPORT_CHUNK = 1000  # 每个事务插入的行数
+USER_IMPORT_MAX_ROWS = 20000  # 单次导入上限
+
+# 会话存储："memory" 为进程内字典（单 worker）；多 worker 部署需改为 "sqlite"
+SESSION_BACKEND = "memory"
+SESSION_DB = "sessions.db"
+SESSION_CACHE_TTL = 2.0  # sqlite 模式下每个进程本地读缓存的有效期（秒），0 表示不缓存
+SESSION_ABSOLUTE_TTL = 7 * 24 * 3600  # 登录后最长有效期（秒）
+SESSION_IDLE_TTL = 2 * 3600  # 超过该时长无任何请求即失效（秒）
+SESSION_MAX = 20000  # 会话总数上限，超出时淘汰最久未访问的
+SESSION_SWEEP_INTERVAL = 30  # 后台清理过期会话的间隔（秒）
+SESSION_TOUCH_INTERVAL = 60  # sqlite 模式下回写最近访问时刻的最小间隔（秒）
+QUESTION_VERSION_CHECK_INTERVAL = 1.0  # 多 worker 时检查其他进程是否修改了题库的间隔（秒）
+WORKERS = 1  # uvicorn worker 进程数，大于 1 时要求 SESSION_BACKEND = "sqlite"
+
+# 口令哈希（新哈希与登录时自动升级使用的算法）
+PASSWORD_KDF = "pbkdf2_sha256"  # 或 "scrypt"
+PASSWORD_PBKDF2_ITERATIONS = 200000
+PASSWORD_SCRYPT_N, PASSWORD_SCRYPT_R, PASSWORD_SCRYPT_P = 2 ** 14, 8, 1
+PASSWORD_IMPORT_PBKDF2_ITERATIONS = 1000  # 批量导入的初始口令用较轻的参数（同样加盐），首次登录时升级为上面的参数
+PASSWORD_WORKERS = 4  # 哈希线程数，建议不超过 CPU 核数
+PASSWORD_QUEUE_MAX = 200  # 在途 + 排队的哈希任务上限，超出直接返回 503
+
+# 交卷流水线：交卷请求只登记并立即返回，后台 worker 判分、生成并保存成绩单
+FINISH_WORKERS = 4
+FINISH_POLL_INTERVAL = 5  # 扫描遗留 / 其他进程待处理提交的间隔（秒）
+FINISH_STALE_SECONDS = 300  # 处理中超过该时长视为 worker 已退出，允许重新认领
+FINISH_MAX_TRIES = 3  # 生成失败的重试次数，超过后标记为 failed
+
+# 题目分析：每次从数据库折叠的 attempt 数（控制首次全量构建时的内存峰值）
+ITEM_ANALYSIS_BATCH = 5000
@@ -1,87 +1,72 @@
-import sqlite3, hashlib, os, random, string
+import os, random, string, asyncio, functools, json, time
+from itertools import islice
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from contextlib import contextmanager
+from .db_pool import ConnectionPool
+from .migrations import migrate, USER_MIGRATIONS, RES_MIGRATIONS
+from .progress_buffer import ProgressBuffer
+from .question_bank import question_bank
+from .passwords import password_pool, hash_password, hash_import_password, check_password, DUMMY_HASH
+from .item_analysis import item_analysis
+from .transcript_archive import transcript_archive
+from .config import DB_ASYNC, DB_READ_THREADS, PROGRESS_WRITE_BEHIND, PROGRESS_FLUSH_INTERVAL, PROGRESS_FLUSH_MAX, \
+    USER_IMPORT_CHUNK, QUESTION_VERSION_CHECK_INTERVAL, DATA_DIR, RECORDS_ARCHIVE, WORKERS
 
 USER_DB = "users.db"
 RES_DB = "resources.db"
 
 
 def init_db():
-    """初始化双数据库：包含自动检查并补全字段逻辑"""
-    # 1. 用户数据库初始化
+    """初始化双数据库：按 user_version 依次执行尚未应用的迁移（见 migrations.py）"""
     with get_user_db() as conn:
-        conn.execute("""CREATE TABLE IF NOT EXISTS users (
-            id INTEGER PRIMARY KEY AUTOINCREMENT, 
-            username TEXT UNIQUE, 
-            password TEXT, 
-            nickname TEXT, 
-            avatar TEXT DEFAULT '/static/szu_logo.png', 
-            expires_at DATETIME)""")
-
-        # 🌟 自动修复逻辑：检查是否存在 role 字段，没有则添加
-        cursor = conn.execute("PRAGMA table_info(users)")
-        columns = [column[1] for column in cursor.fetchall()]
-        if 'role' not in columns:
-            conn.execute("ALTER TABLE users ADD COLUMN role TEXT DEFAULT 'student'")
-            print("🔧 已自动补全 users 表的 role 字段")
-
-        conn.execute("""CREATE TABLE IF NOT EXISTS user_answers (
-            username TEXT, 
-            question_id INTEGER, 
-            selected_option TEXT, 
-            is_correct BOOLEAN, 
-            UNIQUE(username, question_id))""")
-
-        conn.execute("""CREATE TABLE IF NOT EXISTS video_progress (
-            username TEXT, 
-            video_id INTEGER, 
-            progress TEXT, 
-            PRIMARY KEY(username, video_id))""")
-        conn.commit()
-
-    # 2. 资源数据库初始化
+        migrate(conn, USER_MIGRATIONS, USER_DB)
     with get_res_db() as conn:
-        conn.execute("""CREATE TABLE IF NOT EXISTS videos (
-            id INTEGER PRIMARY KEY AUTOINCREMENT, 
-            title TEXT, 
-            filename TEXT, 
-            uploaded_by TEXT, 
-            uploaded_at DATETIME DEFAULT CURRENT_TIMESTAMP)""")
-        conn.execute("""CREATE TABLE IF NOT EXISTS questions (
-            id INTEGER PRIMARY KEY AUTOINCREMENT, 
-            content TEXT, 
-            option_a TEXT, 
-            option_b TEXT, 
-            option_c TEXT, 
-            option_d TEXT, 
-            answer TEXT)""")
-        conn.commit()
+        migrate(conn, RES_MIGRATIONS, RES_DB)
+
+
+user_pool = ConnectionPool(USER_DB, attach={"res": RES_DB})
+res_pool = ConnectionPool(RES_DB)
+progress_buffer = ProgressBuffer(PROGRESS_FLUSH_MAX)
+# 写缓冲在进程内：多 worker 时别的进程读不到本进程尚未落盘的进度，只能每次上报直接写库
+PROGRESS_BUFFERED = PROGRESS_WRITE_BEHIND and WORKERS <= 1
 
 
-@contextmanager
 def get_user_db():
-    conn = sqlite3.connect(USER_DB)
-    conn.row_factory = sqlite3.Row
-    try:
-        yield conn
-    finally:
-        conn.close()
+    return user_pool.connection()
 
 
-@contextmanager
 def get_res_db():
-    conn = sqlite3.connect(RES_DB)
-    conn.row_factory = sqlite3.Row
+    return res_pool.connection()
+
+
+def close_db():
+    """关闭执行器、口令哈希线程池与两个连接池中的全部连接（lifespan 关闭阶段调用）。
+    先等执行器里的任务结束（含进行中的定时落盘，否则其快照未完成时 drain 取不到新进度），
+    再把写缓冲里剩余的进度全部落盘"""
+    global _read_executor, _write_executor
+    for ex in (_read_executor, _write_executor):
+        if ex is not None: ex.shutdown(wait=True)
+    _read_executor = _write_executor = None
     try:
-        yield conn
-    finally:
-        conn.close()
+        while db_flush_progress(): pass
+    except Exception as e:
+        print(f"⚠️ 关闭前进度落盘失败: {e}")
+    user_pool.close_all()
+    res_pool.close_all()
+    password_pool.shutdown()
+
+
+def _random_nickname():
+    return "学研员_" + ''.join(random.choices(string.ascii_letters + string.digits, k=4))
 
 
 def create_user(u, p):
-    ph = hashlib.sha256(p.encode()).hexdigest()
+    return _insert_user(u, hash_password(p))
+
+
+def _insert_user(u, ph):
     ex = datetime.now() + timedelta(days=60)
-    nk = "学研员_" + ''.join(random.choices(string.ascii_letters + string.digits, k=4))
+    nk = _random_nickname()
     try:
         with get_user_db() as c:
             c.execute("INSERT INTO users (username, password, nickname, expires_at, role) VALUES (?,?,?,?,?)",
@@ -93,12 +78,27 @@ def create_user(u, p):
         return False
 
 
-def verify_user(u, p):
-    ph = hashlib.sha256(p.encode()).hexdigest()
+def db_get_password_hash(u):
+    """未过期账号的口令哈希，不存在或已过期返回 None"""
     with get_user_db() as c:
         r = c.execute("SELECT password FROM users WHERE username = ? AND expires_at >= ?",
                       (u, datetime.now())).fetchone()
-        return r and r['password'] == ph
+        return r['password'] if r else None
+
+
+def db_upgrade_password(u, old_ph, new_ph):
+    """把旧哈希换成新 KDF 哈希；期间口令已被修改则不覆盖"""
+    with get_user_db() as c:
+        c.execute("UPDATE users SET password = ? WHERE username = ? AND password = ?", (new_ph, u, old_ph))
+        c.commit()
+
+
+def verify_user(u, p):
+    stored = db_get_password_hash(u)
+    ok, new_ph = check_password(p, stored or DUMMY_HASH)
+    if not stored: return False
+    if new_ph: db_upgrade_password(u, stored, new_ph)
+    return ok
 
 
 def get_user_info(u):
@@ -107,21 +107,111 @@ def get_user_info(u):
         return dict(r) if r else None
 
 
-def db_get_all_users():
+USER_SORT_COLUMNS = ("username", "nickname", "role", "expires_at")
+
+
+def _like_pattern(q):
+    """子串匹配的 LIKE 模式（配合 ESCAPE '\\'，转义用户输入中的通配符）"""
+    return "%" + q.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+
+
+def _has_users_fts(c):
+    return c.execute("SELECT 1 FROM sqlite_master WHERE name = 'users_fts'").fetchone() is not None
+
+
+def db_search_users(q="", sort="username", desc=False, after=None, limit=50):
+    """账号搜索 + 键集分页：按 (排序列, id) 定位下一页，翻页开销与页码无关。
+    after 为上一页最后一行的 (排序列值, id)；返回 (本页记录, 下一页游标 或 None)"""
+    if sort not in USER_SORT_COLUMNS: sort = "username"
+    op, order = ("<", "DESC") if desc else (">", "ASC")
+    where, params = [], []
     with get_user_db() as c:
-        rows = c.execute("SELECT username, nickname, avatar, role, expires_at FROM users").fetchall()
-        return [dict(r) for r in rows]
+        if q:
+            if len(q) >= 3 and _has_users_fts(c):
+                # trigram 支持任意 ≥3 字符的子串匹配；按短语转义用户输入
+                where.append("id IN (SELECT rowid FROM users_fts WHERE users_fts MATCH ?)")
+                params.append('"' + q.replace('"', '""') + '"')
+            else:
+                where.append("(username LIKE ? ESCAPE '\\' OR nickname LIKE ? ESCAPE '\\')")
+                params += [_like_pattern(q)] * 2
+        if after is not None:
+            where.append(f"({sort}, id) {op} (?, ?)")
+            params += list(after)
+        sql = (f"SELECT id, username, nickname, avatar, role, expires_at FROM users"
+               f"{' WHERE ' + ' AND '.join(where) if where else ''} ORDER BY {sort} {order}, id {order} LIMIT ?")
+        rows = [dict(r) for r in c.execute(sql, params + [limit + 1]).fetchall()]
+    next_after = (rows[limit - 1][sort], rows[limit - 1]["id"]) if len(rows) > limit else None
+    return rows[:limit], next_after
 
 
 def db_delete_user(u):
+    progress_buffer.discard_user(u)
     with get_user_db() as c:
         c.execute("DELETE FROM users WHERE username = ?", (u,))
         c.execute("DELETE FROM user_answers WHERE username = ?", (u,))
         c.execute("DELETE FROM video_progress WHERE username = ?", (u,))
+        c.execute("DELETE FROM exam_state WHERE username = ?", (u,))
+        c.commit()
+    return True
+
+
+def db_import_users(rows, chunk=USER_IMPORT_CHUNK):
+    """批量导入账号：rows 为 (行号, 用户名, 密码, 昵称) 的迭代器，每 chunk 行一个事务 executemany。
+    返回 (新建数, [{row, username, msg}])，已存在或文件内重复的用户名逐行报告，不影响其余行"""
+    created, errors, seen = 0, [], set()
+    ex = datetime.now() + timedelta(days=60)
+    rows = iter(rows)
+    with get_user_db() as c:
+        while True:
+            batch = list(islice(rows, chunk))
+            if not batch: break
+            existing = {r[0] for r in c.execute(
+                "SELECT username FROM users WHERE username IN (SELECT value FROM json_each(?))",
+                (json.dumps([r[1] for r in batch]),))}
+            fresh = []
+            for row_no, u, p, nk in batch:
+                if u in existing or u in seen:
+                    errors.append({"row": row_no, "username": u, "msg": "用户名已存在"})
+                    continue
+                seen.add(u)
+                fresh.append((u, p, nk))
+            # 初始密码在口令线程池里并行哈希（加盐的轻量 KDF），首次登录时自动升级为完整参数
+            hashes = password_pool.map(hash_import_password, [p for _, p, _ in fresh])
+            params = [(u, ph, nk or _random_nickname(), ex, 'student') for (u, _, nk), ph in zip(fresh, hashes)]
+            c.executemany("INSERT INTO users (username, password, nickname, expires_at, role) VALUES (?,?,?,?,?)",
+                          params)
+            c.commit()
+            created += len(params)
+    return created, errors
+
+
+def db_delete_users(usernames):
+    """批量注销：每张表一条集合删除语句，同一事务提交"""
+    names = json.dumps(list(usernames))
+    for u in usernames: progress_buffer.discard_user(u)
+    with get_user_db() as c:
+        for table in ("users", "user_answers", "video_progress", "exam_state"):
+            c.execute(f"DELETE FROM {table} WHERE username IN (SELECT value FROM json_each(?))", (names,))
         c.commit()
     return True
 
 
+def db_extend_users(usernames, days):
+    """批量延长有效期：已过期的从现在起算，未过期的在原到期时间上顺延"""
+    with get_user_db() as c:
+        cur = c.execute("""UPDATE users SET expires_at = strftime('%Y-%m-%d %H:%M:%f', max(ifnull(expires_at, ''), ?), ?)
+                           WHERE username IN (SELECT value FROM json_each(?))""",
+                        (datetime.now(), f"+{int(days)} days", json.dumps(list(usernames))))
+        c.commit()
+        return cur.rowcount
+
+
+def db_set_password(u, ph):
+    with get_user_db() as c:
+        c.execute("UPDATE users SET password=? WHERE username=?", (ph, u))
+        c.commit()
+
+
 def update_user_info(u, n=None, a=None):
     with get_user_db() as c:
         if n: c.execute("UPDATE users SET nickname = ? WHERE username = ?", (n, u))
@@ -129,9 +219,11 @@ def update_user_info(u, n=None, a=None):
         c.commit()
 
 
-def add_video(t, f, u):
+def add_video(t, f, u, meta=None):
+    m = meta or {}
     with get_res_db() as c:
-        c.execute("INSERT INTO videos (title, filename, uploaded_by) VALUES (?, ?, ?)", (t, f, u))
+        c.execute("INSERT INTO videos (title, filename, uploaded_by, duration, width, height, bitrate) VALUES (?,?,?,?,?,?,?)",
+                  (t, f, u, m.get("duration"), m.get("width"), m.get("height"), m.get("bitrate")))
         c.commit()
 
 
@@ -140,15 +232,87 @@ def get_all_videos():
         return [dict(r) for r in c.execute("SELECT * FROM videos ORDER BY uploaded_at DESC").fetchall()]
 
 
+def db_swap_videos(v1_id, v2_id):
+    """交换两个视频的标题与文件（用于排序），任一不存在时返回 False"""
+    with get_res_db() as conn:
+        v1 = conn.execute("SELECT title, filename FROM videos WHERE id=?", (v1_id,)).fetchone()
+        v2 = conn.execute("SELECT title, filename FROM videos WHERE id=?", (v2_id,)).fetchone()
+        if not (v1 and v2): return False
+        conn.execute("UPDATE videos SET title=?, filename=? WHERE id=?", (v2['title'], v2['filename'], v1_id))
+        conn.execute("UPDATE videos SET title=?, filename=? WHERE id=?", (v1['title'], v1['filename'], v2_id))
+        conn.commit()
+        return True
+
+
+def get_video_bitrate(fn):
+    with get_res_db() as c:
+        r = c.execute("SELECT bitrate FROM videos WHERE filename = ?", (fn,)).fetchone()
+        return r['bitrate'] if r else None
+
+
 def delete_video_by_id(vid):
+    """删除视频记录，返回其文件名（不存在时返回 None）"""
     with get_res_db() as c:
+        r = c.execute("SELECT filename FROM videos WHERE id = ?", (vid,)).fetchone()
         c.execute("DELETE FROM videos WHERE id = ?", (vid,))
         c.commit()
+        return r['filename'] if r else None
 
 
-def db_get_questions():
+def db_create_upload(uid, t, f, size, chunk, u):
+    with get_res_db() as c:
+        c.execute("INSERT INTO upload_sessions (upload_id, title, filename, total_size, chunk_size, created_by) VALUES (?,?,?,?,?,?)",
+                  (uid, t, f, size, chunk, u))
+        c.commit()
+
+
+def db_get_upload(uid):
+    with get_res_db() as c:
+        r = c.execute("SELECT * FROM upload_sessions WHERE upload_id = ?", (uid,)).fetchone()
+        return dict(r) if r else None
+
+
+def db_advance_upload(uid, idx, crc):
+    """记录已落盘的分片：只在 next_index 仍等于 idx 时推进，防止并发重复写入"""
+    with get_res_db() as c:
+        cur = c.execute("UPDATE upload_sessions SET next_index = ?, crc32 = ? WHERE upload_id = ? AND next_index = ?",
+                        (idx + 1, crc, uid, idx))
+        c.commit()
+        return cur.rowcount == 1
+
+
+def db_delete_upload(uid):
+    with get_res_db() as c:
+        c.execute("DELETE FROM upload_sessions WHERE upload_id = ?", (uid,))
+        c.commit()
+
+
+def db_expired_uploads(days):
+    with get_res_db() as c:
+        rows = c.execute("SELECT upload_id FROM upload_sessions WHERE created_at < datetime('now', ?)",
+                         (f"-{int(days)} days",)).fetchall()
+        return [r['upload_id'] for r in rows]
+
+
+def _load_questions():
+    with get_res_db() as c:
+        return c.execute("SELECT * FROM questions").fetchall()
+
+
+def _questions_version():
     with get_res_db() as c:
-        return [dict(r) for r in c.execute("SELECT * FROM questions").fetchall()]
+        return c.execute("SELECT version FROM data_versions WHERE name = 'questions'").fetchone()[0]
+
+
+def db_get_questions_snapshot():
+    """题库的不可变快照（只在题库变更后的首次访问时查询数据库；其他 worker 的修改最多延迟
+    QUESTION_VERSION_CHECK_INTERVAL 秒生效）"""
+    question_bank.sync(_questions_version, QUESTION_VERSION_CHECK_INTERVAL)
+    return question_bank.snapshot(_load_questions)
+
+
+def db_get_questions():
+    return list(db_get_questions_snapshot().questions)
 
 
 def db_add_question(c, a, b, co, d, ans):
@@ -157,26 +321,40 @@ def db_add_question(c, a, b, co, d, ans):
             "INSERT INTO questions (content, option_a, option_b, option_c, option_d, answer) VALUES (?,?,?,?,?,?)",
             (c, a, b, co, d, ans))
         conn.commit()
+    question_bank.invalidate()
+
+
+def db_edit_question(qid, c, a, b, co, d, ans):
+    with get_res_db() as conn:
+        conn.execute(
+            "UPDATE questions SET content=?, option_a=?, option_b=?, option_c=?, option_d=?, answer=? WHERE id=?",
+            (c, a, b, co, d, ans, qid))
+        conn.commit()
+    question_bank.invalidate()
 
 
 def db_delete_question(qid):
     with get_res_db() as conn:
         conn.execute("DELETE FROM questions WHERE id = ?", (qid,))
         conn.commit()
+    question_bank.invalidate()
 
 
 def db_submit_answer(u, qid, s):
-    with get_res_db() as r_conn:
-        q = r_conn.execute("SELECT answer FROM questions WHERE id = ?", (qid,)).fetchone()
-    if q:
-        is_c = (s == q['answer'])
+    return db_submit_answers(u, [(qid, s)]).get(qid, False)
+
+
+def db_submit_answers(u, items):
+    """批量判分并在一个事务里写入，返回 {题目 id: 是否正确}；题库中不存在的题目直接忽略"""
+    key = db_get_questions_snapshot().answer_key
+    graded = {qid: (s, s == key[qid]) for qid, s in items if qid in key}  # 同一题多次作答以最后一次为准
+    if graded:
         with get_user_db() as u_conn:
-            u_conn.execute(
+            u_conn.executemany(
                 "INSERT OR REPLACE INTO user_answers (username, question_id, selected_option, is_correct) VALUES (?,?,?,?)",
-                (u, qid, s, is_c))
+                [(u, qid, s, is_c) for qid, (s, is_c) in graded.items()])
             u_conn.commit()
-            return is_c
-    return False
+    return {qid: is_c for qid, (s, is_c) in graded.items()}
 
 
 def db_get_user_answers(u):
@@ -191,15 +369,358 @@ def db_update_progress(u, vid, prog):
         c.commit()
 
 
+def db_flush_progress():
+    """把写缓冲中的进度在一个事务里批量落盘，返回写入条数"""
+    rows = progress_buffer.drain()
+    if not rows: return 0
+    try:
+        with get_user_db() as c:
+            c.executemany("INSERT OR REPLACE INTO video_progress (username, video_id, progress) VALUES (?,?,?)", rows)
+            c.commit()
+    except Exception:
+        progress_buffer.done(False)
+        raise
+    progress_buffer.done(True)
+    return len(rows)
+
+
 def db_get_progress(u):
-    with get_user_db() as u_conn:
-        progs = u_conn.execute("SELECT video_id, progress FROM video_progress WHERE username = ?", (u,)).fetchall()
-    with get_res_db() as r_conn:
-        v_map = {row['id']: row['title'] for row in r_conn.execute("SELECT id, title FROM videos").fetchall()}
-    return [{"title": v_map.get(p['video_id'], "已删视频"), "progress": p['progress']} for p in progs]
+    """用户观看进度：users.db 连接上已 ATTACH resources.db，一次 JOIN 取标题，开销只与已看视频数有关"""
+    with get_user_db() as c:
+        rows = c.execute("""SELECT p.video_id, p.progress, v.title FROM video_progress p
+                            LEFT JOIN res.videos v ON v.id = p.video_id WHERE p.username = ?""", (u,)).fetchall()
+        progs = {r['video_id']: [r['title'], r['progress']] for r in rows}
+        buffered = progress_buffer.for_user(u)  # 叠加尚未落盘的最新进度
+        missing = [vid for vid in buffered if vid not in progs]
+        titles = {}
+        if missing:
+            titles = {r['id']: r['title'] for r in c.execute(
+                f"SELECT id, title FROM res.videos WHERE id IN ({','.join('?' * len(missing))})", missing).fetchall()}
+    for vid, p in buffered.items():
+        progs.setdefault(vid, [titles.get(vid), p])[1] = p
+    return [{"title": t or "已删视频", "progress": p} for t, p in progs.values()]
+
+
+# --- 成绩单索引 ---
+def _insert_record(c, owner, score, total, grade, created_at, size):
+    # 序号在同一条 INSERT 里按 MAX(seq)+1 分配，并发交卷也不会重号
+    return c.execute("""INSERT INTO records (owner, seq, score, total, grade, created_at, path, size)
+                        SELECT ?1, n, ?2, ?3, ?4, ?5, ?1 || '_成绩单_' || n || '.txt', ?6
+                        FROM (SELECT COALESCE(MAX(seq), 0) + 1 AS n FROM records WHERE owner = ?1)
+                        RETURNING id, seq, path""", (owner, score, total, grade, created_at, size)).fetchone()
+
+
+def _save_report(c, rec, owner, data):
+    # 在调用方的写事务内保存成绩单内容：归档模式追加到段文件并登记位置（持有写锁，多进程追加也是串行的），
+    # 否则写临时文件后改名为 Data/ 下的 TXT；提交前崩溃只会留下一条无索引的内容
+    if RECORDS_ARCHIVE:
+        seg, off, length = transcript_archive.append(owner, rec["seq"], data)
+        c.execute("UPDATE records SET segment = ?, seg_offset = ?, seg_length = ? WHERE id = ?",
+                  (seg, off, length, rec["id"]))
+        return
+    tmp_path = os.path.join(DATA_DIR, f".{owner}_{rec['seq']}.tmp")
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, os.path.join(DATA_DIR, rec["path"]))
+
+
+def db_archive_existing(rid, owner, seq, data):
+    """迁移工具用：把已有 TXT 的内容追加到归档并登记位置"""
+    with get_user_db() as c:
+        c.execute("BEGIN IMMEDIATE")
+        seg, off, length = transcript_archive.append(owner, seq, data)
+        c.execute("UPDATE records SET segment = ?, seg_offset = ?, seg_length = ?, size = ? WHERE id = ?",
+                  (seg, off, length, len(data), rid))
+        c.commit()
 
 
-def db_reset_all_answers():
-    with get_user_db() as conn:
-        conn.execute("DELETE FROM user_answers")
-        conn.commit()
\ No newline at end of file
+def db_read_record(rec):
+    """读取一份成绩单的原始字节：已归档的按 (段号, 偏移, 长度) 随机读取，否则读 Data/ 下的 TXT；不存在返回 None"""
+    if rec["segment"] is not None:
+        return transcript_archive.read(rec["segment"], rec["seg_offset"], rec["seg_length"])
+    path = os.path.join(DATA_DIR, rec["path"])
+    if not os.path.exists(path): return None
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def db_list_records(owner=None, q=""):
+    """成绩单列表：学生只看自己的（走 UNIQUE(owner, seq) 索引），管理员看全部；q 按文件名关键字过滤"""
+    where, params = [], []
+    with get_user_db() as c:
+        if owner is not None:
+            where.append("owner = ?")
+            params.append(owner)
+        if q:
+            if len(q) >= 3 and c.execute("SELECT 1 FROM sqlite_master WHERE name = 'records_fts'").fetchone():
+                where.append("id IN (SELECT rowid FROM records_fts WHERE records_fts MATCH ?)")
+                params.append('"' + q.replace('"', '""') + '"')
+            else:
+                where.append("path LIKE ? ESCAPE '\\'")
+                params.append(_like_pattern(q))
+        order = "seq DESC" if owner is not None else "created_at DESC, id DESC"
+        sql = f"SELECT * FROM records{' WHERE ' + ' AND '.join(where) if where else ''} ORDER BY {order}"
+        return [dict(r) for r in c.execute(sql, params).fetchall()]
+
+
+def db_get_record(path):
+    with get_user_db() as c:
+        r = c.execute("SELECT * FROM records WHERE path = ?", (path,)).fetchone()
+        return dict(r) if r else None
+
+
+def db_get_records(paths):
+    with get_user_db() as c:
+        return [dict(r) for r in c.execute("SELECT * FROM records WHERE path IN (SELECT value FROM json_each(?))",
+                                           (json.dumps(list(paths)),)).fetchall()]
+
+
+def db_delete_records(paths):
+    with get_user_db() as c:
+        c.execute("DELETE FROM records WHERE path IN (SELECT value FROM json_each(?))", (json.dumps(list(paths)),))
+        c.commit()
+
+
+# --- 考试状态机：not_started → in_progress → submitted，重置后为 reset（可再次开始） ---
+EXAM_EEG = "eeg"
+EXAM_NOT_STARTED, EXAM_IN_PROGRESS, EXAM_SUBMITTED, EXAM_RESET = "not_started", "in_progress", "submitted", "reset"
+
+
+def db_get_exam_state(u, exam=EXAM_EEG):
+    with get_user_db() as c:
+        r = c.execute("SELECT * FROM exam_state WHERE username = ? AND exam = ?", (u, exam)).fetchone()
+        return dict(r) if r else {"username": u, "exam": exam, "state": EXAM_NOT_STARTED, "started_at": None,
+                                  "submitted_at": None, "updated_at": None}
+
+
+def db_start_exam(u, exam=EXAM_EEG):
+    """未开始 / 已重置 → 进行中（记录开始时刻）；其他状态保持不变，返回最新状态"""
+    now = time.time()
+    with get_user_db() as c:
+        c.execute("""INSERT INTO exam_state (username, exam, state, started_at, updated_at) VALUES (?1, ?2, ?3, ?4, ?4)
+                     ON CONFLICT(username, exam) DO UPDATE SET state = ?3, started_at = ?4, submitted_at = NULL,
+                     updated_at = ?4 WHERE state IN (?5, ?6)""",
+                  (u, exam, EXAM_IN_PROGRESS, now, EXAM_NOT_STARTED, EXAM_RESET))
+        c.commit()
+    return db_get_exam_state(u, exam)
+
+
+def db_submit_exam(u, exam, key=None):
+    """登记交卷（只做最少的工作，判分与生成成绩单交给后台流水线）：同一幂等键重复提交返回原提交 id；
+    否则在一个写事务内把状态比较并置为 submitted、快照当前作答到 submissions、清空当前作答。
+    已交过卷返回 None，重复点击不会产生第二份成绩单"""
+    with get_user_db() as c:
+        if key:
+            r = c.execute("SELECT id FROM submissions WHERE username = ? AND idem_key = ?", (u, key)).fetchone()
+            if r: return r["id"]
+        now = time.time()
+        claimed = c.execute("""INSERT INTO exam_state (username, exam, state, submitted_at, updated_at)
+                               VALUES (?1, ?2, ?3, ?4, ?4)
+                               ON CONFLICT(username, exam) DO UPDATE SET state = ?3, submitted_at = ?4, updated_at = ?4
+                               WHERE state != ?3""", (u, exam, EXAM_SUBMITTED, now)).rowcount
+        if not claimed: return None
+        sid = c.execute("""INSERT INTO submissions (username, exam, idem_key, status, answers, started_at, submitted_at)
+                           SELECT ?1, ?2, ?3, 'pending',
+                                  (SELECT json_group_object(question_id, json_array(selected_option, is_correct))
+                                   FROM user_answers WHERE username = ?1),
+                                  (SELECT started_at FROM exam_state WHERE username = ?1 AND exam = ?2), ?4
+                           RETURNING id""", (u, exam, key, now)).fetchone()["id"]
+        c.execute("DELETE FROM user_answers WHERE username = ?", (u,))
+        c.commit()
+        return sid
+
+
+def db_reset_exam(exam=EXAM_EEG):
+    """全员重置：清空当前作答，进行中 / 已交卷的状态一条 UPDATE 置为 reset"""
+    with get_user_db() as c:
+        c.execute("DELETE FROM user_answers")
+        c.execute("UPDATE exam_state SET state = ?, updated_at = ? WHERE exam = ? AND state IN (?, ?)",
+                  (EXAM_RESET, time.time(), exam, EXAM_IN_PROGRESS, EXAM_SUBMITTED))
+        c.commit()
+
+
+# --- 交卷流水线（见 submissions.py）：pending → processing → done / failed ---
+def db_claim_submission(sid, stale_before):
+    """认领一条待处理的提交（处理中但认领时刻早于 stale_before 的视为 worker 已崩溃，可重新认领）；
+    多个 worker / 进程同时认领时只有一个成功，返回提交内容或 None"""
+    with get_user_db() as c:
+        r = c.execute("""UPDATE submissions SET status = 'processing', claimed_at = ?, tries = tries + 1
+                         WHERE id = ? AND (status = 'pending' OR (status = 'processing' AND claimed_at < ?))
+                         RETURNING *""", (time.time(), sid, stale_before)).fetchone()
+        c.commit()
+        return dict(r) if r else None
+
+
+def db_complete_submission(sid, u, started_at, finished_at, score, total, grade, report, rows):
+    """一个写事务内：标记提交完成、登记并保存成绩单、写入作答历史（rows 为 (题号, 选项, 是否正确)），
+    返回成绩单文件名；提交已被其他 worker 完成时返回 None"""
+    with get_user_db() as c:
+        if not c.execute("UPDATE submissions SET status = 'done', error = NULL WHERE id = ? AND status = 'processing'",
+                         (sid,)).rowcount:
+            return None
+        rec = _insert_record(c, u, score, total, grade, finished_at, len(report))
+        _save_report(c, rec, u, report)
+        c.execute("UPDATE submissions SET record = ? WHERE id = ?", (rec["path"], sid))
+        aid = c.execute("""INSERT INTO attempts (username, started_at, finished_at, score, total, grade, record)
+                           VALUES (?,?,?,?,?,?,?)""",
+                        (u, started_at, finished_at, score, total, grade, rec["path"])).lastrowid
+        c.executemany("INSERT INTO responses (attempt_id, question_id, selected_option, is_correct) VALUES (?,?,?,?)",
+                      [(aid, qid, opt, 1 if ok else 0) for qid, opt, ok in rows])
+        c.commit()
+        return rec["path"]
+
+
+def db_fail_submission(sid, error, max_tries):
+    """处理失败：未超过重试次数的放回 pending 等待下一轮扫描，否则标记为 failed"""
+    with get_user_db() as c:
+        c.execute("""UPDATE submissions SET status = CASE WHEN tries >= ? THEN 'failed' ELSE 'pending' END, error = ?
+                     WHERE id = ? AND status = 'processing'""", (max_tries, error, sid))
+        c.commit()
+
+
+def db_pending_submissions(stale_before, limit=1000):
+    with get_user_db() as c:
+        return [r[0] for r in c.execute("""SELECT id FROM submissions
+            WHERE status = 'pending' OR (status = 'processing' AND claimed_at < ?) ORDER BY id LIMIT ?""",
+                                        (stale_before, limit)).fetchall()]
+
+
+def db_list_submissions(owner=None):
+    """尚未生成成绩单的提交（个人中心显示“生成中”），学生只看自己的"""
+    with get_user_db() as c:
+        # 列出未完成的状态（而不是 != 'done'），才能走 idx_submissions_status，不随历史提交数增长
+        sql = """SELECT id, username, status, submitted_at, error FROM submissions
+                 WHERE status IN ('pending', 'processing', 'failed')"""
+        if owner is None: return [dict(r) for r in c.execute(sql + " ORDER BY id").fetchall()]
+        return [dict(r) for r in c.execute(sql + " AND username = ? ORDER BY id", (owner,)).fetchall()]
+
+
+# --- 作答历史与题目分析 ---
+def db_attempts_since(after_id, limit):
+    """id 大于 after_id 的前 limit 次交卷：[(id, 得分)] 与它们的 [(attempt_id, 题号, 选项, 是否正确)]"""
+    with get_user_db() as c:
+        attempts = c.execute("SELECT id, score FROM attempts WHERE id > ? ORDER BY id LIMIT ?",
+                             (after_id, limit)).fetchall()
+        if not attempts: return [], []
+        responses = c.execute("""SELECT attempt_id, question_id, selected_option, is_correct FROM responses
+                                 WHERE attempt_id BETWEEN ? AND ?""", (attempts[0][0], attempts[-1][0])).fetchall()
+        return [tuple(a) for a in attempts], [tuple(r) for r in responses]
+
+
+def db_item_analysis():
+    """题目分析报告：先增量折叠新的交卷，再按当前题库输出（两者未变时直接返回缓存）"""
+    item_analysis.refresh(db_attempts_since)
+    return item_analysis.report(db_get_questions_snapshot().questions)
+
+
+# --- 异步数据访问层 ---
+# 🌟 路由都是 async def，直接调用上面的同步函数会卡住事件循环（连带卡住所有视频流）。
+# 写操作统一交给单个写线程串行执行（不再互相抢写锁），读操作交给有界的读线程池；
+# config.DB_ASYNC = False 时退回原来的同步直调。
+_read_executor = None
+_write_executor = None
+
+
+def _executor(write):
+    global _read_executor, _write_executor
+    if write:
+        if _write_executor is None:
+            _write_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db-write")
+        return _write_executor
+    if _read_executor is None:
+        _read_executor = ThreadPoolExecutor(max_workers=DB_READ_THREADS, thread_name_prefix="db-read")
+    return _read_executor
+
+
+def _async(fn, write=False):
+    @functools.wraps(fn)
+    async def wrapper(*args, **kwargs):
+        if not DB_ASYNC: return fn(*args, **kwargs)
+        return await asyncio.get_running_loop().run_in_executor(
+            _executor(write), functools.partial(fn, *args, **kwargs))
+    return wrapper
+
+
+# 读
+db_get_password_hash_async = _async(db_get_password_hash)
+get_user_info_async = _async(get_user_info)
+db_search_users_async = _async(db_search_users)
+get_all_videos_async = _async(get_all_videos)
+get_video_bitrate_async = _async(get_video_bitrate)
+db_get_upload_async = _async(db_get_upload)
+db_expired_uploads_async = _async(db_expired_uploads)
+db_get_questions_async = _async(db_get_questions)
+db_get_questions_snapshot_async = _async(db_get_questions_snapshot)
+db_get_user_answers_async = _async(db_get_user_answers)
+db_get_progress_async = _async(db_get_progress)
+db_list_records_async = _async(db_list_records)
+db_item_analysis_async = _async(db_item_analysis)
+db_get_record_async = _async(db_get_record)
+db_get_records_async = _async(db_get_records)
+db_get_exam_state_async = _async(db_get_exam_state)
+db_pending_submissions_async = _async(db_pending_submissions)
+db_list_submissions_async = _async(db_list_submissions)
+db_read_record_async = _async(db_read_record)
+
+# 写
+_insert_user_async = _async(_insert_user, write=True)
+db_upgrade_password_async = _async(db_upgrade_password, write=True)
+db_delete_user_async = _async(db_delete_user, write=True)
+db_import_users_async = _async(db_import_users, write=True)
+db_delete_users_async = _async(db_delete_users, write=True)
+db_extend_users_async = _async(db_extend_users, write=True)
+db_set_password_async = _async(db_set_password, write=True)
+update_user_info_async = _async(update_user_info, write=True)
+add_video_async = _async(add_video, write=True)
+db_swap_videos_async = _async(db_swap_videos, write=True)
+delete_video_by_id_async = _async(delete_video_by_id, write=True)
+db_create_upload_async = _async(db_create_upload, write=True)
+db_advance_upload_async = _async(db_advance_upload, write=True)
+db_delete_upload_async = _async(db_delete_upload, write=True)
+db_add_question_async = _async(db_add_question, write=True)
+db_edit_question_async = _async(db_edit_question, write=True)
+db_delete_question_async = _async(db_delete_question, write=True)
+db_submit_answer_async = _async(db_submit_answer, write=True)
+db_submit_answers_async = _async(db_submit_answers, write=True)
+db_flush_progress_async = _async(db_flush_progress, write=True)
+_db_update_progress_direct = _async(db_update_progress, write=True)
+db_delete_records_async = _async(db_delete_records, write=True)
+db_start_exam_async = _async(db_start_exam, write=True)
+db_submit_exam_async = _async(db_submit_exam, write=True)
+db_claim_submission_async = _async(db_claim_submission, write=True)
+db_complete_submission_async = _async(db_complete_submission, write=True)
+db_fail_submission_async = _async(db_fail_submission, write=True)
+db_reset_exam_async = _async(db_reset_exam, write=True)
+
+
+async def db_update_progress_async(u, vid, prog):
+    """开启写缓冲时只在事件循环里写内存，攒满阈值后再交给写线程批量落盘"""
+    if not PROGRESS_BUFFERED:
+        return await _db_update_progress_direct(u, vid, prog)
+    if progress_buffer.put(u, vid, prog):
+        asyncio.ensure_future(db_flush_progress_async())
+
+
+async def verify_user_async(u, p):
+    """登录校验：读哈希走读线程，KDF 计算走有界的口令线程池（排满时抛出 PasswordPoolFull），
+    旧格式哈希校验通过后交给写线程升级"""
+    stored = await db_get_password_hash_async(u)
+    # 未知账号也跑一次同样代价的 KDF，响应时间不暴露账号是否存在
+    ok, new_ph = await password_pool.run(check_password, p, stored or DUMMY_HASH)
+    if not stored: return False
+    if new_ph: await db_upgrade_password_async(u, stored, new_ph)
+    return ok
+
+
+async def create_user_async(u, p):
+    return await _insert_user_async(u, await password_pool.run(hash_password, p))
+
+
+async def progress_flush_loop():
+    """后台定时落盘任务，由 lifespan 启动与取消"""
+    while True:
+        await asyncio.sleep(PROGRESS_FLUSH_INTERVAL)
+        try:
+            await db_flush_progress_async()
+        except Exception as e:
+            print(f"⚠️ 进度批量落盘失败，稍后重试: {e}")
@@ -0,0 +1,64 @@
+# modules/db_pool.py
+import sqlite3, threading
+from contextlib import contextmanager
+from .config import DB_BUSY_TIMEOUT_MS, DB_CACHE_SIZE_KB, DB_MMAP_SIZE, DB_SYNCHRONOUS, DB_CACHED_STATEMENTS
+
+# 🌟 SQLite 连接池：每个线程复用一条长连接（WAL + 调优 pragma + 语句缓存），
+# 不再每次函数调用都 connect/close；关闭服务时由 lifespan 统一关闭
+
+
+class ConnectionPool:
+    def __init__(self, path: str, attach: dict = None):
+        self.path = path
+        self.attach = attach or {}  # {别名: 数据库文件}，每条连接都 ATTACH，便于跨库 JOIN
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.conns = set()
+        self.generation = 0  # close_all 后递增，线程里的旧连接随之作废
+        self.opened = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        # check_same_thread=False 仅为了能在关闭时跨线程 close；每条连接实际只被一个线程使用
+        conn = sqlite3.connect(self.path, timeout=DB_BUSY_TIMEOUT_MS / 1000, check_same_thread=False,
+                               cached_statements=DB_CACHED_STATEMENTS)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(f"PRAGMA synchronous={DB_SYNCHRONOUS}")
+        conn.execute(f"PRAGMA busy_timeout={int(DB_BUSY_TIMEOUT_MS)}")
+        conn.execute(f"PRAGMA cache_size=-{int(DB_CACHE_SIZE_KB)}")
+        conn.execute(f"PRAGMA mmap_size={int(DB_MMAP_SIZE)}")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        for alias, path in self.attach.items():
+            conn.execute(f"ATTACH DATABASE ? AS {alias}", (path,))
+        with self.lock:
+            self.conns.add(conn)
+            self.opened += 1
+        return conn
+
+    @contextmanager
+    def connection(self):
+        """取当前线程的连接；最外层退出时回滚未提交的事务，语义与原来的 close() 一致"""
+        local = self.local
+        if getattr(local, "generation", None) != self.generation:
+            local.conn, local.depth, local.generation = self._connect(), 0, self.generation
+        conn = local.conn
+        local.depth += 1
+        try:
+            yield conn
+        finally:
+            local.depth -= 1
+            if local.depth == 0 and conn.in_transaction:
+                conn.rollback()
+
+    def close_all(self):
+        with self.lock:
+            self.generation += 1
+            conns, self.conns = self.conns, set()
+        for conn in conns:
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+
+    def stats(self) -> dict:
+        return {"path": self.path, "open_connections": len(self.conns), "opened_total": self.opened}
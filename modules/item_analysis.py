@@ -0,0 +1,124 @@
+# modules/item_analysis.py
+import math, threading
+from .config import ITEM_ANALYSIS_BATCH
+
+try:
+    import numpy as np
+except ImportError:  # 未安装 numpy 时退回纯 Python 累加，结果相同，只是首次全量构建更慢
+    np = None
+
+# 🌟 题目分析引擎：按 attempts.id 水位线增量读取新的作答，只维护每道题的充分统计量
+# （出现次数、答对次数、Σ总分、Σ总分²、Σ答对×总分、各选项人次）和全体作答的 Σ总分、Σ总分²，
+# 难度、题目-剩余分点二列相关、干扰项频率与 Cronbach α 都能由这些量 O(题数) 算出；
+# 批量折叠时用 numpy 构造 作答 × 题目 矩阵一次性求和
+
+OPTIONS = ("A", "B", "C", "D")
+# 每题的累加量：[出现次数, 答对次数, Σ总分, Σ总分², Σ答对×总分, A, B, C, D, 未作答]
+_N, _CORRECT, _SUM_T, _SUM_T2, _SUM_XT, _OPT = 0, 1, 2, 3, 4, 5
+_WIDTH = _OPT + len(OPTIONS) + 1
+
+
+class ItemAnalysis:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.items = {}  # question_id -> list[float]（见 _WIDTH 的各列）
+        self.attempts = 0
+        self.sum_t = self.sum_t2 = 0.0
+        self.watermark = 0  # 已折叠的最大 attempts.id
+        self.cache_key, self.cache = None, None
+
+    def _fold_numpy(self, totals: dict, responses: list):
+        aids = np.fromiter((r[0] for r in responses), dtype=np.int64, count=len(responses))
+        qids = np.fromiter((r[1] for r in responses), dtype=np.int64, count=len(responses))
+        correct = np.fromiter((1.0 if r[3] else 0.0 for r in responses), dtype=np.float64, count=len(responses))
+        opt_map = {o: i for i, o in enumerate(OPTIONS)}
+        opts = np.fromiter((opt_map.get(r[2], len(OPTIONS)) for r in responses), dtype=np.int64, count=len(responses))
+        # 作答 × 题目 矩阵：行为本批 attempt，列为本批出现的题目，未出现的格子为 NaN
+        rows, row_idx = np.unique(aids, return_inverse=True)
+        cols, col_idx = np.unique(qids, return_inverse=True)
+        t = np.array([totals[a] for a in rows.tolist()], dtype=np.float64)
+        x = np.full((len(rows), len(cols)), np.nan)
+        x[row_idx, col_idx] = correct
+        shown = ~np.isnan(x)
+        xz = np.where(shown, x, 0.0)
+        t_col = t[:, None]
+        sums = np.stack([shown.sum(0), xz.sum(0), (shown * t_col).sum(0), (shown * t_col ** 2).sum(0),
+                         (xz * t_col).sum(0)], axis=1)
+        opt_counts = np.zeros((len(cols), len(OPTIONS) + 1))
+        np.add.at(opt_counts, (col_idx, opts), 1)
+        for qid, acc, oc in zip(cols.tolist(), sums.tolist(), opt_counts.tolist()):
+            item = self.items.setdefault(qid, [0.0] * _WIDTH)
+            for i, v in enumerate(acc + oc): item[i] += v
+
+    def _fold_python(self, totals: dict, responses: list):
+        for aid, qid, opt, ok in responses:
+            t = totals[aid]
+            item = self.items.setdefault(qid, [0.0] * _WIDTH)
+            item[_N] += 1
+            item[_SUM_T] += t
+            item[_SUM_T2] += t * t
+            if ok:
+                item[_CORRECT] += 1
+                item[_SUM_XT] += t
+            item[_OPT + (OPTIONS.index(opt) if opt in OPTIONS else len(OPTIONS))] += 1
+
+    def refresh(self, loader):
+        """loader(水位线, 批大小) -> (新 attempts 的 [(id, 总分)], 这些 attempts 的 [(attempt_id, 题号, 选项, 是否正确)])；
+        把水位线之后的作答分批折叠进累加量"""
+        with self.lock:
+            while True:
+                attempts, responses = loader(self.watermark, ITEM_ANALYSIS_BATCH)
+                if not attempts: return
+                totals = {aid: float(score or 0) for aid, score in attempts}
+                if responses:
+                    (self._fold_numpy if np is not None else self._fold_python)(totals, responses)
+                self.attempts += len(totals)
+                self.sum_t += sum(totals.values())
+                self.sum_t2 += sum(v * v for v in totals.values())
+                self.watermark = max(totals)
+
+    def report(self, questions) -> dict:
+        """按当前题库输出各题指标；结果按 (水位线, 题库内容) 缓存。
+        α 用当前题库中有作答的题目与全部交卷的总分方差计算，题库中途增删题时为近似值"""
+        key = (self.watermark, tuple((q["id"], q["content"], q["answer"]) for q in questions))
+        with self.lock:
+            if key == self.cache_key: return self.cache
+            items, pq_sum, k = [], 0.0, 0
+            for q in questions:
+                acc = self.items.get(q["id"])
+                n = acc[_N] if acc else 0
+                entry = {"id": q["id"], "content": q["content"], "answer": q["answer"], "responses": int(n),
+                         "difficulty": None, "discrimination": None,
+                         "options": {o: 0 for o in OPTIONS + ("未作答",)}}
+                if n:
+                    p = acc[_CORRECT] / n
+                    entry["difficulty"] = round(p, 4)
+                    entry["discrimination"] = _item_rest_corr(acc)
+                    entry["options"] = {o: int(c) for o, c in zip(OPTIONS + ("未作答",), acc[_OPT:])}
+                    pq_sum += p * (1 - p)
+                    k += 1
+                items.append(entry)
+            alpha = None
+            if k >= 2 and self.attempts:
+                var_t = self.sum_t2 / self.attempts - (self.sum_t / self.attempts) ** 2
+                if var_t > 0: alpha = round(k / (k - 1) * (1 - pq_sum / var_t), 4)
+            self.cache_key = key
+            self.cache = {"attempts": self.attempts, "cronbach_alpha": alpha, "engine": "numpy" if np else "python",
+                          "items": items}
+            return self.cache
+
+
+def _item_rest_corr(acc):
+    """题目得分与“其余题目总分”的点二列相关（校正后的区分度），方差为 0 时返回 None"""
+    n = acc[_N]
+    sx, sr = acc[_CORRECT], acc[_SUM_T] - acc[_CORRECT]
+    # 二值作答 x² = x，因此 Σ(T-x)² = ΣT² - 2ΣxT + Σx，Σx(T-x) = ΣxT - Σx
+    srr = acc[_SUM_T2] - 2 * acc[_SUM_XT] + acc[_CORRECT]
+    sxr = acc[_SUM_XT] - acc[_CORRECT]
+    var_x = sx / n - (sx / n) ** 2
+    var_r = srr / n - (sr / n) ** 2
+    if var_x <= 1e-12 or var_r <= 1e-12: return None
+    return round((sxr / n - (sx / n) * (sr / n)) / math.sqrt(var_x * var_r), 4)
+
+
+item_analysis = ItemAnalysis()
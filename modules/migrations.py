@@ -0,0 +1,309 @@
+# modules/migrations.py
+
+import sqlite3, os, re
+from datetime import datetime
+from .config import DATA_DIR
+
+# 🌟 版本化迁移：每个数据库文件用 PRAGMA user_version 记录已应用的版本，
+# 启动时按顺序在事务中执行尚未应用的迁移；旧库（user_version=0 但表已存在）由幂等的基线迁移接管
+
+
+def _columns(conn, table):
+    return [column[1] for column in conn.execute(f"PRAGMA table_info({table})").fetchall()]
+
+
+def _add_column(conn, table, col, col_type):
+    if col not in _columns(conn, table):
+        conn.execute(f"ALTER TABLE {table} ADD COLUMN {col} {col_type}")
+        print(f"🔧 已自动补全 {table} 表的 {col} 字段")
+
+
+# --- users.db ---
+def _user_baseline(conn):
+    conn.execute("""CREATE TABLE IF NOT EXISTS users (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        username TEXT UNIQUE,
+        password TEXT,
+        nickname TEXT,
+        avatar TEXT DEFAULT '/static/szu_logo.png',
+        expires_at DATETIME)""")
+    _add_column(conn, "users", "role", "TEXT DEFAULT 'student'")
+    conn.execute("""CREATE TABLE IF NOT EXISTS user_answers (
+        username TEXT,
+        question_id INTEGER,
+        selected_option TEXT,
+        is_correct BOOLEAN,
+        UNIQUE(username, question_id))""")
+    conn.execute("""CREATE TABLE IF NOT EXISTS video_progress (
+        username TEXT,
+        video_id INTEGER,
+        progress TEXT,
+        PRIMARY KEY(username, video_id))""")
+
+
+def _user_hot_indexes(conn):
+    # verify_user 按 username 等值查询，已由 UNIQUE 自动索引命中（实测规划器不会改选复合索引）；
+    # 过期账号清理 / 按有效期筛选走 expires_at
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_users_expires_at ON users(expires_at)")
+
+
+def _user_search_index(conn):
+    # 账号管理页按列排序 + 键集分页：ORDER BY 列, id
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_users_nickname ON users(nickname)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_users_role ON users(role)")
+    # 用户名 / 昵称子串搜索：FTS5 trigram 外部内容表，由触发器与 users 保持同步
+    try:
+        conn.execute("""CREATE VIRTUAL TABLE IF NOT EXISTS users_fts USING fts5(
+            username, nickname, content='users', content_rowid='id', tokenize='trigram')""")
+    except sqlite3.OperationalError as e:
+        print(f"⚠️ 当前 SQLite 不支持 FTS5 trigram（{e}），账号搜索将退回 LIKE 扫描")
+        return
+    conn.execute("""CREATE TRIGGER IF NOT EXISTS users_fts_ai AFTER INSERT ON users BEGIN
+        INSERT INTO users_fts(rowid, username, nickname) VALUES (new.id, new.username, new.nickname); END""")
+    conn.execute("""CREATE TRIGGER IF NOT EXISTS users_fts_ad AFTER DELETE ON users BEGIN
+        INSERT INTO users_fts(users_fts, rowid, username, nickname) VALUES ('delete', old.id, old.username, old.nickname); END""")
+    conn.execute("""CREATE TRIGGER IF NOT EXISTS users_fts_au AFTER UPDATE OF username, nickname ON users BEGIN
+        INSERT INTO users_fts(users_fts, rowid, username, nickname) VALUES ('delete', old.id, old.username, old.nickname);
+        INSERT INTO users_fts(rowid, username, nickname) VALUES (new.id, new.username, new.nickname); END""")
+    conn.execute("INSERT INTO users_fts(users_fts) VALUES ('rebuild')")
+
+
+def _user_records(conn):
+    # 成绩单索引：Data/ 下每个 TXT 存档一行，(owner, seq) 唯一，序号由数据库分配
+    conn.execute("""CREATE TABLE IF NOT EXISTS records (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        owner TEXT NOT NULL,
+        seq INTEGER NOT NULL,
+        score INTEGER,
+        total INTEGER,
+        grade TEXT,
+        created_at DATETIME,
+        path TEXT NOT NULL UNIQUE,
+        size INTEGER,
+        UNIQUE(owner, seq))""")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_records_created_at ON records(created_at)")
+    # 一次性回填已有存档：文件名给出 账号 / 序号，报告头部给出成绩、评级与考核时间
+    if not os.path.isdir(DATA_DIR): return
+    name_re = re.compile(r"(.+)_成绩单_(\d+)\.txt")
+    rows = []
+    for name in os.listdir(DATA_DIR):
+        m = name_re.fullmatch(name)
+        if not m: continue
+        path = os.path.join(DATA_DIR, name)
+        with open(path, "r", encoding="utf-8", errors="replace") as f:
+            head = f.read(2048)
+        score = re.search(r"最终成绩: (\d+)/(\d+) \| 评级: (\w)", head)
+        ts = re.search(r"考核时间: (\d{4}-\d\d-\d\d \d\d:\d\d:\d\d)", head)
+        created = datetime.strptime(ts.group(1), "%Y-%m-%d %H:%M:%S") if ts else \
+            datetime.fromtimestamp(os.path.getmtime(path)).replace(microsecond=0)
+        rows.append((m.group(1), int(m.group(2)), int(score.group(1)) if score else None,
+                     int(score.group(2)) if score else None, score.group(3) if score else None,
+                     created, name, os.path.getsize(path)))
+    conn.executemany("""INSERT OR IGNORE INTO records (owner, seq, score, total, grade, created_at, path, size)
+                        VALUES (?,?,?,?,?,?,?,?)""", rows)
+    if rows: print(f"📑 已从 {DATA_DIR}/ 回填 {len(rows)} 份成绩单索引")
+
+
+def _user_records_search(conn):
+    # 成绩单按文件名关键字搜索：与账号搜索相同的 trigram 外部内容表
+    try:
+        conn.execute("""CREATE VIRTUAL TABLE IF NOT EXISTS records_fts USING fts5(
+            path, content='records', content_rowid='id', tokenize='trigram')""")
+    except sqlite3.OperationalError as e:
+        print(f"⚠️ 当前 SQLite 不支持 FTS5 trigram（{e}），成绩单搜索将退回 LIKE 扫描")
+        return
+    conn.execute("""CREATE TRIGGER IF NOT EXISTS records_fts_ai AFTER INSERT ON records BEGIN
+        INSERT INTO records_fts(rowid, path) VALUES (new.id, new.path); END""")
+    conn.execute("""CREATE TRIGGER IF NOT EXISTS records_fts_ad AFTER DELETE ON records BEGIN
+        INSERT INTO records_fts(records_fts, rowid, path) VALUES ('delete', old.id, old.path); END""")
+    conn.execute("""CREATE TRIGGER IF NOT EXISTS records_fts_au AFTER UPDATE OF path ON records BEGIN
+        INSERT INTO records_fts(records_fts, rowid, path) VALUES ('delete', old.id, old.path);
+        INSERT INTO records_fts(rowid, path) VALUES (new.id, new.path); END""")
+    conn.execute("INSERT INTO records_fts(records_fts) VALUES ('rebuild')")
+
+
+def _user_attempts(conn):
+    # 作答历史：每次交卷一行 attempts，题目级作答存 responses（含未作答的题），供题目分析使用
+    conn.execute("""CREATE TABLE IF NOT EXISTS attempts (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        username TEXT NOT NULL,
+        started_at DATETIME,
+        finished_at DATETIME,
+        score INTEGER,
+        total INTEGER,
+        grade TEXT,
+        record TEXT)""")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_attempts_username ON attempts(username)")
+    conn.execute("""CREATE TABLE IF NOT EXISTS responses (
+        attempt_id INTEGER NOT NULL,
+        question_id INTEGER NOT NULL,
+        selected_option TEXT,
+        is_correct INTEGER NOT NULL,
+        PRIMARY KEY(attempt_id, question_id)) WITHOUT ROWID""")
+
+
+def _user_records_archive(conn):
+    # 成绩单归档位置：segment 为空表示仍是 Data/ 下的独立 TXT（见 transcript_archive.py）
+    for col in ("segment", "seg_offset", "seg_length"):
+        _add_column(conn, "records", col, "INTEGER")
+
+
+def _user_exam_state(conn):
+    # 考试状态机：每个 (账号, 考试) 一行，取代 Data/{账号}.lock；没有行等同于 not_started
+    conn.execute("""CREATE TABLE IF NOT EXISTS exam_state (
+        username TEXT NOT NULL,
+        exam TEXT NOT NULL,
+        state TEXT NOT NULL,
+        started_at REAL,
+        submitted_at REAL,
+        updated_at REAL,
+        PRIMARY KEY(username, exam)) WITHOUT ROWID""")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_exam_state_state ON exam_state(exam, state)")
+    # 一次性导入已有的 .lock 文件（之后不再读取，可手动删除）
+    if not os.path.isdir(DATA_DIR): return
+    rows = [(name[:-len(".lock")], os.path.getmtime(os.path.join(DATA_DIR, name)))
+            for name in os.listdir(DATA_DIR) if name.endswith(".lock")]
+    conn.executemany("""INSERT OR IGNORE INTO exam_state (username, exam, state, submitted_at, updated_at)
+                        VALUES (?1, 'eeg', 'submitted', ?2, ?2)""", rows)
+    if rows: print(f"🔒 已从 {DATA_DIR}/ 导入 {len(rows)} 个交卷锁定状态")
+
+
+def _user_submissions(conn):
+    # 交卷流水线：交卷时快照作答（{题号: [选项, 是否正确]}），后台 worker 判分并生成成绩单；
+    # (username, idem_key) 唯一，客户端重试同一次交卷不会重复登记
+    conn.execute("""CREATE TABLE IF NOT EXISTS submissions (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        username TEXT NOT NULL,
+        exam TEXT NOT NULL,
+        idem_key TEXT,
+        status TEXT NOT NULL,
+        answers TEXT,
+        started_at REAL,
+        submitted_at REAL,
+        claimed_at REAL,
+        tries INTEGER NOT NULL DEFAULT 0,
+        record TEXT,
+        error TEXT,
+        UNIQUE(username, idem_key))""")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_submissions_status ON submissions(status)")
+
+
+USER_MIGRATIONS = [
+    (1, "基线：users / user_answers / video_progress", _user_baseline),
+    (2, "热点查询覆盖索引", _user_hot_indexes),
+    (3, "账号搜索全文索引与排序索引", _user_search_index),
+    (4, "成绩单索引表（回填 Data/ 下已有存档）", _user_records),
+    (5, "成绩单全文索引", _user_records_search),
+    (6, "作答历史 attempts / responses", _user_attempts),
+    (7, "成绩单归档位置（段号 / 偏移 / 长度）", _user_records_archive),
+    (8, "考试状态表（导入已有 .lock 文件）", _user_exam_state),
+    (9, "交卷流水线 submissions", _user_submissions),
+]
+
+
+# --- resources.db ---
+def _res_baseline(conn):
+    conn.execute("""CREATE TABLE IF NOT EXISTS videos (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        title TEXT,
+        filename TEXT,
+        uploaded_by TEXT,
+        uploaded_at DATETIME DEFAULT CURRENT_TIMESTAMP)""")
+    conn.execute("""CREATE TABLE IF NOT EXISTS questions (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        content TEXT,
+        option_a TEXT,
+        option_b TEXT,
+        option_c TEXT,
+        option_d TEXT,
+        answer TEXT)""")
+
+
+def _res_video_meta(conn):
+    # 视频元数据（时长/分辨率/码率，由上传时的 MP4 解析写入）
+    for col, col_type in (("duration", "REAL"), ("width", "INTEGER"), ("height", "INTEGER"), ("bitrate", "INTEGER")):
+        _add_column(conn, "videos", col, col_type)
+
+
+def _res_upload_sessions(conn):
+    conn.execute("""CREATE TABLE IF NOT EXISTS upload_sessions (
+        upload_id TEXT PRIMARY KEY,
+        title TEXT,
+        filename TEXT,
+        total_size INTEGER,
+        chunk_size INTEGER,
+        next_index INTEGER DEFAULT 0,
+        crc32 INTEGER DEFAULT 0,
+        created_by TEXT,
+        created_at DATETIME DEFAULT CURRENT_TIMESTAMP)""")
+
+
+def _res_hot_indexes(conn):
+    # get_all_videos: ORDER BY uploaded_at DESC
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_videos_uploaded_at ON videos(uploaded_at)")
+    # get_video_bitrate: WHERE filename = ?，只取 bitrate
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_videos_filename ON videos(filename, bitrate)")
+    # db_expired_uploads: WHERE created_at < ?
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_upload_sessions_created_at ON upload_sessions(created_at)")
+
+
+def _res_question_version(conn):
+    # 题库版本号：增 / 改 / 删题时由触发器递增，多个 worker 据此发现别的进程改了题库
+    conn.execute("CREATE TABLE IF NOT EXISTS data_versions (name TEXT PRIMARY KEY, version INTEGER NOT NULL)")
+    conn.execute("INSERT OR IGNORE INTO data_versions VALUES ('questions', 0)")
+    for event in ("INSERT", "UPDATE", "DELETE"):
+        conn.execute(f"""CREATE TRIGGER IF NOT EXISTS questions_version_{event.lower()} AFTER {event} ON questions BEGIN
+            UPDATE data_versions SET version = version + 1 WHERE name = 'questions'; END""")
+
+
+RES_MIGRATIONS = [
+    (1, "基线：videos / questions", _res_baseline),
+    (2, "videos 元数据字段", _res_video_meta),
+    (3, "分片上传会话表", _res_upload_sessions),
+    (4, "热点查询索引", _res_hot_indexes),
+    (5, "题库版本号", _res_question_version),
+]
+
+
+# --- sessions.db（SESSION_BACKEND = "sqlite" 时使用）---
+def _session_baseline(conn):
+    conn.execute("""CREATE TABLE IF NOT EXISTS sessions (
+        sid TEXT PRIMARY KEY,
+        data TEXT NOT NULL,
+        created_at REAL) WITHOUT ROWID""")
+
+
+def _session_ttl(conn):
+    _add_column(conn, "sessions", "expires_at", "REAL")
+    _add_column(conn, "sessions", "last_seen", "REAL")
+    conn.execute("DELETE FROM sessions WHERE expires_at IS NULL")  # 升级前的会话没有有效期，直接作废
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_sessions_expires_at ON sessions(expires_at)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_sessions_last_seen ON sessions(last_seen)")
+
+
+SESSION_MIGRATIONS = [
+    (1, "基线：sessions", _session_baseline),
+    (2, "会话有效期与空闲超时", _session_ttl),
+]
+
+
+def migrate(conn, migrations, name):
+    """把 conn 对应的数据库升级到最新版本，每个迁移一个事务，失败则整体回滚该迁移"""
+    current = conn.execute("PRAGMA user_version").fetchone()[0]
+    for version, desc, apply in migrations:
+        if version <= current: continue
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # 拿到写锁后再确认一次版本，防止多个进程同时启动时重复执行
+            if conn.execute("PRAGMA user_version").fetchone()[0] >= version:
+                conn.rollback(); current = version
+                continue
+            apply(conn)
+            conn.execute(f"PRAGMA user_version = {int(version)}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        print(f"🧱 {name} 已迁移到 v{version}：{desc}")
+        current = version
+    return current
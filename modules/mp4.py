@@ -0,0 +1,179 @@
+# modules/mp4.py
+import os, struct
+from typing import List, Optional, Tuple
+
+# 🌟 纯 Python MP4 Box 解析与 faststart 重写：
+# 把 moov 挪到 mdat 之前并修正 stco/co64 偏移，播放器第一次 Range 请求即可拿到索引开始播放
+
+CONTAINERS = {b"moov", b"trak", b"mdia", b"minf", b"stbl", b"edts", b"dinf", b"mvex", b"udta"}
+COPY_BUF = 1024 * 1024
+
+
+class MP4Error(Exception):
+    pass
+
+
+def _read_header(f, file_size: int) -> Optional[Tuple[bytes, int, int, int]]:
+    """读取一个 box 头，返回 (类型, 起始偏移, 头长度, box 总长度)"""
+    pos = f.tell()
+    head = f.read(8)
+    if len(head) < 8: return None
+    size, btype = struct.unpack(">I4s", head)
+    hlen = 8
+    if size == 1:
+        ext = f.read(8)
+        if len(ext) < 8: raise MP4Error("box 头不完整")
+        size = struct.unpack(">Q", ext)[0]; hlen = 16
+    elif size == 0:
+        size = file_size - pos
+    if size < hlen or pos + size > file_size: raise MP4Error(f"非法 box 长度: {btype!r}")
+    return btype, pos, hlen, size
+
+
+def scan_top_level(path: str) -> List[Tuple[bytes, int, int, int]]:
+    """扫描顶层 box 列表（只读头部，不读取 mdat 数据）"""
+    file_size = os.path.getsize(path)
+    boxes = []
+    with open(path, "rb") as f:
+        while f.tell() < file_size:
+            h = _read_header(f, file_size)
+            if not h: break
+            boxes.append(h)
+            f.seek(h[1] + h[3])
+    return boxes
+
+
+def _parse_children(data: bytes) -> list:
+    """把容器 box 的负载解析为 [[类型, 负载 或 子节点列表], ...]"""
+    nodes, pos = [], 0
+    while pos + 8 <= len(data):
+        size, btype = struct.unpack_from(">I4s", data, pos)
+        hlen = 8
+        if size == 1:
+            size = struct.unpack_from(">Q", data, pos + 8)[0]; hlen = 16
+        elif size == 0:
+            size = len(data) - pos
+        if size < hlen or pos + size > len(data): raise MP4Error(f"非法子 box 长度: {btype!r}")
+        payload = data[pos + hlen:pos + size]
+        nodes.append([btype, _parse_children(payload) if btype in CONTAINERS else payload])
+        pos += size
+    return nodes
+
+
+def _serialize(nodes: list) -> bytes:
+    out = []
+    for btype, body in nodes:
+        payload = _serialize(body) if isinstance(body, list) else body
+        if len(payload) + 8 > 0xFFFFFFFF:
+            out.append(struct.pack(">I4sQ", 1, btype, len(payload) + 16))
+        else:
+            out.append(struct.pack(">I4s", len(payload) + 8, btype))
+        out.append(payload)
+    return b"".join(out)
+
+
+def _walk(nodes: list, btypes):
+    for node in nodes:
+        if node[0] in btypes: yield node
+        if isinstance(node[1], list): yield from _walk(node[1], btypes)
+
+
+def _shift_offsets(moov: list, shift_fn, force_co64: bool):
+    """修正所有 stco/co64 块偏移；偏移超过 32 位或 force_co64 时把 stco 升级为 co64"""
+    for node in _walk(moov, (b"stco", b"co64")):
+        payload = node[1]
+        count = struct.unpack_from(">I", payload, 4)[0]
+        fmt = ">%dI" if node[0] == b"stco" else ">%dQ"
+        offsets = [shift_fn(o) for o in struct.unpack_from(fmt % count, payload, 8)]
+        if node[0] == b"stco" and not force_co64 and (not offsets or max(offsets) <= 0xFFFFFFFF):
+            node[1] = payload[:8] + struct.pack(f">{count}I", *offsets)
+        else:
+            node[0] = b"co64"
+            node[1] = payload[:8] + struct.pack(f">{count}Q", *offsets)
+
+
+def read_metadata(moov: list, file_size: int) -> dict:
+    """从 mvhd / tkhd 提取时长、分辨率，并按文件大小估算码率"""
+    meta = {"duration": None, "width": None, "height": None, "bitrate": None}
+    for node in _walk(moov, (b"mvhd",)):
+        p = node[1]
+        if p[0] == 1:
+            timescale, duration = struct.unpack_from(">IQ", p, 20)
+        else:
+            timescale, duration = struct.unpack_from(">II", p, 12)
+        if timescale: meta["duration"] = round(duration / timescale, 3)
+        break
+    for trak in _walk(moov, (b"trak",)):
+        handlers = [n[1][8:12] for n in _walk(trak[1], (b"hdlr",))]
+        if b"vide" not in handlers: continue
+        for tkhd in _walk(trak[1], (b"tkhd",)):
+            w, h = struct.unpack_from(">II", tkhd[1], len(tkhd[1]) - 8)
+            meta["width"], meta["height"] = w >> 16, h >> 16
+        break
+    if meta["duration"]:
+        meta["bitrate"] = int(file_size * 8 / meta["duration"])
+    return meta
+
+
+def _copy_range(src, dst, start: int, length: int):
+    src.seek(start)
+    while length > 0:
+        buf = src.read(min(COPY_BUF, length))
+        if not buf: raise MP4Error("源文件被截断")
+        dst.write(buf); length -= len(buf)
+
+
+def faststart(path: str) -> dict:
+    """原地把 moov 前置（已前置则只读取元数据），返回视频元数据；非 MP4 或解析失败时抛 MP4Error"""
+    try:
+        return _faststart(path)
+    except struct.error as e:
+        raise MP4Error(f"box 内容损坏: {e}")
+
+
+def _faststart(path: str) -> dict:
+    file_size = os.path.getsize(path)
+    boxes = scan_top_level(path)
+    types = [b[0] for b in boxes]
+    if b"moov" not in types or b"mdat" not in types: raise MP4Error("缺少 moov 或 mdat")
+    moov_box = boxes[types.index(b"moov")]
+    with open(path, "rb") as f:
+        f.seek(moov_box[1] + moov_box[2])
+        moov = _parse_children(f.read(moov_box[3] - moov_box[2]))
+    if any(True for _ in _walk(moov, (b"cmov",))): raise MP4Error("不支持压缩的 moov")
+
+    first_mdat = boxes[types.index(b"mdat")][1]
+    if moov_box[1] < first_mdat:
+        return read_metadata(moov, file_size)
+
+    # 新布局：mdat 之前的 box + moov + 其余 box；
+    # 位于 [first_mdat, moov 起点) 的数据后移 moov 新长度，原 moov 之后的数据只受长度差影响
+    moov_start, moov_end = moov_box[1], moov_box[1] + moov_box[3]
+
+    def build(new_size: int, force_co64: bool):
+        tree = _parse_children(_serialize(moov))  # 深拷贝，避免重复修正
+        _shift_offsets(tree, lambda o: o + new_size if first_mdat <= o < moov_start else
+                       o + new_size - moov_box[3] if o >= moov_end else o, force_co64)
+        return tree, _serialize([[b"moov", tree]])
+
+    new_size = len(_serialize([[b"moov", moov]]))
+    trial, moov_bytes = build(new_size, False)
+    if len(moov_bytes) != new_size:
+        # stco 升级为 co64 后 moov 变长：全部强制 co64，长度即固定，再按新长度重算一次
+        _, sized = build(new_size, True)
+        trial, moov_bytes = build(len(sized), True)
+
+    tmp_path = path + ".faststart"
+    try:
+        with open(path, "rb") as src, open(tmp_path, "wb") as dst:
+            for btype, start, _, size in boxes:
+                if start >= first_mdat: break
+                _copy_range(src, dst, start, size)
+            dst.write(moov_bytes)
+            for btype, start, _, size in boxes:
+                if start < first_mdat or start == moov_start: continue
+                _copy_range(src, dst, start, size)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path): os.remove(tmp_path)
+    return read_metadata(trial, os.path.getsize(path))
@@ -0,0 +1,83 @@
+# modules/page_cache.py
+import hashlib, os, threading
+import jinja2
+from jinja2 import meta
+from fastapi.templating import Jinja2Templates
+from starlette.responses import Response
+from .assets import assets, asset_url
+from .config import TEMPLATE_DIR, TEMPLATE_BYTECODE_DIR, PAGE_CACHE
+
+# 🌟 模板与页面缓存：Jinja2 编译结果写入字节码缓存目录（重启后免重新编译），启动时预编译全部模板；
+# 首页、登录 / 注册页、课程目录等与用户无关的页面按 (模板, 角色, 路径) 缓存渲染结果，
+# 带强 ETag，浏览器重新验证时直接回 304。模板或其继承的父模板修改时间变化、静态资源重新构建（指纹变化）即自动失效
+
+
+def make_templates(directory: str) -> Jinja2Templates:
+    os.makedirs(TEMPLATE_BYTECODE_DIR, exist_ok=True)
+    env = jinja2.Environment(loader=jinja2.FileSystemLoader(directory), autoescape=True,
+                             bytecode_cache=jinja2.FileSystemBytecodeCache(TEMPLATE_BYTECODE_DIR))
+    env.globals["asset_url"] = asset_url
+    return Jinja2Templates(env=env)
+
+
+class PageCache:
+    def __init__(self, templates: Jinja2Templates, enabled: bool = True):
+        self.templates, self.enabled = templates, enabled
+        self.lock = threading.Lock()
+        self.pages = {}  # (模板, 角色, 路径) -> (依赖文件的 (路径, mtime) 元组 + 资源版本, 正文, ETag)
+        self.hits = self.misses = 0
+
+    def precompile(self) -> int:
+        """编译全部模板（命中字节码缓存时只做反序列化），首个请求不再承担编译开销"""
+        env = self.templates.env
+        names = env.list_templates(filter_func=lambda n: n.endswith(".html"))
+        for name in names: env.get_template(name)
+        return len(names)
+
+    def _deps(self, name: str) -> tuple:
+        """模板自身及其 extends / include 的全部文件与修改时间"""
+        env, seen, stack = self.templates.env, {}, [name]
+        while stack:
+            n = stack.pop()
+            if n in seen: continue
+            source, filename, _ = env.loader.get_source(env, n)
+            seen[n] = (filename, os.path.getmtime(filename))
+            stack.extend(r for r in meta.find_referenced_templates(env.parse(source)) if r)
+        return tuple(sorted(seen.values())), assets.current_version()
+
+    @staticmethod
+    def _fresh(deps: tuple) -> bool:
+        files, version = deps
+        try:
+            return version == assets.current_version() and all(os.path.getmtime(f) == m for f, m in files)
+        except OSError:
+            return False
+
+    def render(self, request, name: str, role=None, private: bool = False) -> Response:
+        """渲染（或取缓存的）页面；If-None-Match 命中时回 304。private=True 用于需要登录的页面"""
+        headers = {"Cache-Control": "private, no-cache" if private else "no-cache"}
+        if not self.enabled:
+            return self.templates.TemplateResponse(request, name, {"role": role}, headers=headers)
+        key = (name, role, request.url.path)
+        entry = self.pages.get(key)
+        if entry is not None and self._fresh(entry[0]):
+            self.hits += 1
+        else:
+            self.misses += 1
+            deps = self._deps(name)
+            body = self.templates.get_template(name).render({"request": request, "role": role}).encode("utf-8")
+            entry = (deps, body, '"' + hashlib.sha1(body).hexdigest() + '"')
+            with self.lock:
+                self.pages[key] = entry
+        headers["ETag"] = entry[2]
+        inm = request.headers.get("if-none-match")
+        if inm and entry[2] in [t.strip() for t in inm.split(",")]:
+            return Response(status_code=304, headers=headers)
+        return Response(entry[1], media_type="text/html; charset=utf-8", headers=headers)
+
+    def stats(self) -> dict:
+        return {"pages": len(self.pages), "hits": self.hits, "misses": self.misses}
+
+
+templates = make_templates(TEMPLATE_DIR)
+page_cache = PageCache(templates, PAGE_CACHE)
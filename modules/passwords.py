@@ -0,0 +1,135 @@
+# modules/passwords.py
+import asyncio, base64, hashlib, hmac, math, os, re, threading, time
+from concurrent.futures import ThreadPoolExecutor
+from .config import (PASSWORD_KDF, PASSWORD_PBKDF2_ITERATIONS, PASSWORD_SCRYPT_N, PASSWORD_SCRYPT_R,
+                     PASSWORD_SCRYPT_P, PASSWORD_IMPORT_PBKDF2_ITERATIONS, PASSWORD_WORKERS, PASSWORD_QUEUE_MAX)
+
+# 🌟 口令哈希：慢 KDF（PBKDF2 / scrypt）放到有界线程池里算（hashlib 计算期间释放 GIL，可真正并行），
+# 排队超过上限立即拒绝（503 + Retry-After），考试开场集中登录时不会把事件循环和数据库线程拖死。
+# 旧库中的裸 SHA-256 哈希在下次登录成功时透明升级
+
+_LEGACY = re.compile(r"[0-9a-f]{64}")
+
+
+def _b64(b: bytes) -> str:
+    return base64.b64encode(b).decode().rstrip("=")
+
+
+def _unb64(s: str) -> bytes:
+    return base64.b64decode(s + "=" * (-len(s) % 4))
+
+
+def _derive(kdf: str, params: list, p: str, salt: bytes) -> bytes:
+    if kdf == "pbkdf2_sha256":
+        return hashlib.pbkdf2_hmac("sha256", p.encode(), salt, params[0])
+    if kdf == "scrypt":
+        n, r, par = params
+        return hashlib.scrypt(p.encode(), salt=salt, n=n, r=r, p=par, maxmem=256 * n * r + 1024 * 1024, dklen=32)
+    raise ValueError(f"未知的口令哈希算法: {kdf}")
+
+
+def _current_params() -> list:
+    if PASSWORD_KDF == "scrypt": return [PASSWORD_SCRYPT_N, PASSWORD_SCRYPT_R, PASSWORD_SCRYPT_P]
+    return [PASSWORD_PBKDF2_ITERATIONS]
+
+
+def _hash(kdf: str, params: list, p: str) -> str:
+    salt = os.urandom(16)
+    return "$".join([kdf, ",".join(map(str, params)), _b64(salt), _b64(_derive(kdf, params, p, salt))])
+
+
+def hash_password(p: str) -> str:
+    """生成 "算法$参数$盐$哈希" 格式的口令哈希"""
+    return _hash(PASSWORD_KDF, _current_params(), p)
+
+
+def hash_import_password(p: str) -> str:
+    """名单导入的初始口令：加盐 PBKDF2，迭代次数较少（上万行逐个跑完整 KDF 要几十分钟）；
+    参数与当前配置不同，首次登录成功时按 check_password 的规则自动升级"""
+    return _hash("pbkdf2_sha256", [PASSWORD_IMPORT_PBKDF2_ITERATIONS], p)
+
+
+def legacy_hash(p: str) -> str:
+    return hashlib.sha256(p.encode()).hexdigest()
+
+
+# 账号不存在或没有口令时拿它代替做一次同样代价的校验（摘要是随机值，任何口令都不匹配），
+# 登录耗时不会暴露账号是否存在
+DUMMY_HASH = "$".join([PASSWORD_KDF, ",".join(map(str, _current_params())), _b64(os.urandom(16)), _b64(os.urandom(32))])
+
+
+def check_password(p: str, stored: str):
+    """校验口令，返回 (是否正确, 需要升级时的新哈希 / None)；旧格式或参数已调整的哈希在校验通过后重新计算"""
+    if not stored: return False, None
+    if _LEGACY.fullmatch(stored):
+        ok = hmac.compare_digest(legacy_hash(p), stored)
+        return ok, (hash_password(p) if ok else None)
+    try:
+        kdf, params, salt, digest = stored.split("$")
+        params = [int(x) for x in params.split(",")]
+        ok = hmac.compare_digest(_derive(kdf, params, p, _unb64(salt)), _unb64(digest))
+    except (ValueError, TypeError):
+        return False, None
+    stale = kdf != PASSWORD_KDF or params != _current_params()
+    return ok, (hash_password(p) if ok and stale else None)
+
+
+class PasswordPoolFull(Exception):
+    def __init__(self, retry_after: int):
+        super().__init__("口令校验队列已满")
+        self.retry_after = retry_after
+
+
+class PasswordPool:
+    """有界的哈希线程池：在途任务数只在事件循环线程里增减，无需加锁"""
+
+    def __init__(self, workers: int, max_pending: int):
+        self.workers, self.max_pending = workers, max_pending
+        self.executor = None
+        self.executor_lock = threading.Lock()  # 事件循环与数据库线程（map）都可能首次创建线程池
+        self.pending = self.completed = self.rejected = 0
+        self.avg_seconds = 0.1  # 单次哈希耗时的滑动平均，用于估算 Retry-After
+
+    def retry_after(self) -> int:
+        return max(1, math.ceil((self.pending + 1) * self.avg_seconds / self.workers))
+
+    def _timed(self, fn, args):
+        start = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            self.avg_seconds = 0.9 * self.avg_seconds + 0.1 * (time.perf_counter() - start)
+
+    def _executor(self) -> ThreadPoolExecutor:
+        with self.executor_lock:
+            if self.executor is None:
+                self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="pw-hash")
+            return self.executor
+
+    async def run(self, fn, *args):
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise PasswordPoolFull(self.retry_after())
+        executor = self._executor()
+        self.pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(executor, self._timed, fn, args)
+        finally:
+            self.pending -= 1
+            self.completed += 1
+
+    def map(self, fn, items) -> list:
+        """批量哈希（名单导入）：在调用线程里阻塞等待，各项在同一线程池中并行计算，不受排队上限约束"""
+        return list(self._executor().map(fn, items))
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+            self.executor = None
+
+    def stats(self) -> dict:
+        return {"kdf": PASSWORD_KDF, "workers": self.workers, "pending": self.pending, "max_pending": self.max_pending,
+                "completed": self.completed, "rejected": self.rejected, "avg_ms": round(self.avg_seconds * 1000, 1)}
+
+
+password_pool = PasswordPool(PASSWORD_WORKERS, PASSWORD_QUEUE_MAX)
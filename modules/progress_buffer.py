@@ -0,0 +1,60 @@
+# modules/progress_buffer.py
+import threading
+
+# 🌟 观看进度写缓冲：ontimeupdate 频繁上报，同一 (用户, 视频) 只保留最新值，
+# 定时或攒满后一次事务批量落盘；读取时叠加缓冲区，用户永远看不到旧进度
+
+
+class ProgressBuffer:
+    def __init__(self, max_pending: int):
+        self.max_pending = max_pending
+        self.lock = threading.Lock()
+        self.pending = {}  # username -> {video_id: progress}
+        self.flushing = {}  # 正在落盘的快照，提交完成前仍对读者可见
+        self.count = 0
+        self.puts = self.flushed = 0
+
+    def put(self, u, vid, prog) -> bool:
+        """写入最新进度，返回是否已达到批量落盘阈值"""
+        with self.lock:
+            user = self.pending.setdefault(u, {})
+            if vid not in user: self.count += 1
+            user[vid] = prog
+            self.puts += 1
+            return self.count >= self.max_pending
+
+    def drain(self) -> list:
+        """取出全部待写记录并转入 flushing；上一批尚未结束时返回空列表"""
+        with self.lock:
+            if self.flushing or not self.pending: return []
+            self.flushing, self.pending, self.count = self.pending, {}, 0
+            return [(u, vid, p) for u, vids in self.flushing.items() for vid, p in vids.items()]
+
+    def done(self, ok: bool):
+        """落盘结束：失败时把快照放回（缓冲区里更新的值优先）"""
+        with self.lock:
+            if ok:
+                self.flushed += sum(len(v) for v in self.flushing.values())
+            else:
+                for u, vids in self.flushing.items():
+                    user = self.pending.setdefault(u, {})
+                    for vid, p in vids.items():
+                        if vid not in user:
+                            user[vid] = p; self.count += 1
+            self.flushing = {}
+
+    def for_user(self, u) -> dict:
+        with self.lock:
+            merged = dict(self.flushing.get(u, {}))
+            merged.update(self.pending.get(u, {}))
+            return merged
+
+    def discard_user(self, u):
+        """注销账号时丢弃其缓冲进度，避免落盘后“复活”"""
+        with self.lock:
+            self.count -= len(self.pending.pop(u, {}))
+            self.flushing.pop(u, None)
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {"pending": self.count, "puts": self.puts, "flushed": self.flushed}
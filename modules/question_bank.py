@@ -0,0 +1,59 @@
+# modules/question_bank.py
+import threading, json, hashlib, time
+from types import MappingProxyType
+
+# 🌟 题库版本化快照：考试期间题库几乎不变，只在增 / 改 / 删题时 invalidate() 递增版本，
+# 下次访问重建一份不可变快照（题目列表、答案索引、/questions.json 的响应体与 ETag）
+
+
+class Snapshot:
+    __slots__ = ("version", "questions", "answer_key", "body", "etag")
+
+    def __init__(self, version: int, rows: list):
+        self.version = version
+        self.questions = tuple(MappingProxyType(dict(r)) for r in rows)
+        self.answer_key = MappingProxyType({q["id"]: q["answer"] for q in self.questions})
+        # 对外的 JSON 不含正确答案
+        public = [{k: v for k, v in q.items() if k != "answer"} for q in self.questions]
+        self.body = json.dumps({"questions": public}, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        # ETag 只取决于内容，多进程、重启后仍一致
+        self.etag = '"' + hashlib.sha256(self.body).hexdigest()[:32] + '"'
+
+
+class QuestionBank:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.version = 0
+        self.current = None
+        self.db_version = None  # 上次看到的数据库题库版本号（由触发器维护，跨进程可见）
+        self.next_check = 0.0
+
+    def invalidate(self):
+        with self.lock:
+            self.version += 1
+
+    def sync(self, version_loader, interval: float):
+        """多 worker 部署：每隔 interval 秒读一次数据库中的题库版本号，变化说明别的进程改了题库，作废本地快照"""
+        now = time.monotonic()
+        if now < self.next_check: return
+        self.next_check = now + interval
+        db_version = version_loader()
+        with self.lock:
+            if db_version != self.db_version:
+                self.db_version = db_version
+                self.version += 1
+
+    def snapshot(self, loader) -> Snapshot:
+        """返回当前版本的快照；加载期间若题库又被修改则重新加载，保证不缓存旧版本"""
+        while True:
+            with self.lock:
+                if self.current is not None and self.current.version == self.version: return self.current
+                version = self.version
+            snap = Snapshot(version, loader())
+            with self.lock:
+                if version == self.version:
+                    self.current = snap
+                    return snap
+
+
+question_bank = QuestionBank()
@@ -0,0 +1,114 @@
+# modules/roster.py
+import csv, io, re, zipfile
+import xml.etree.ElementTree as ET
+from .config import USER_IMPORT_MAX_ROWS
+
+# 🌟 学生名单解析：逐行流式读取 CSV / XLSX（XLSX 只用标准库 zipfile + iterparse，无需 openpyxl），
+# 校验后产出 (行号, 用户名, 密码, 昵称)，格式错误记入 errors 由调用方一并返回
+
+HEADER_ALIASES = {
+    "username": ("username", "user", "学号", "账号", "用户名"),
+    "password": ("password", "pwd", "密码", "初始密码"),
+    "nickname": ("nickname", "name", "昵称", "姓名"),
+}
+_NS = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+
+
+class RosterError(ValueError):
+    pass
+
+
+def _cell(v) -> str:
+    v = str(v).strip() if v is not None else ""
+    # Excel 里的纯数字学号可能以 2021001.0 的形式存储
+    return v[:-2] if re.fullmatch(r"\d+\.0", v) else v
+
+
+def _csv_rows(fileobj):
+    # 中文 Windows 下 Excel 另存的 CSV 默认是 GBK：先试探开头一段，不是 UTF-8 就按 GB18030 读
+    head = fileobj.read(64 * 1024)
+    fileobj.seek(0)
+    try:
+        head.decode("utf-8-sig")
+        encoding = "utf-8-sig"
+    except UnicodeDecodeError as e:
+        encoding = "utf-8-sig" if e.start >= len(head) - 3 else "gb18030"
+    text = io.TextIOWrapper(fileobj, encoding=encoding, errors="replace", newline="")
+    try:
+        yield from csv.reader(text)
+    finally:
+        text.detach()
+
+
+def _col_index(ref: str) -> int:
+    n = 0
+    for ch in ref:
+        if not ch.isalpha(): break
+        n = n * 26 + ord(ch.upper()) - 64
+    return n - 1
+
+
+def _xlsx_rows(fileobj):
+    try:
+        zf = zipfile.ZipFile(fileobj)
+    except zipfile.BadZipFile:
+        raise RosterError("不是有效的 XLSX 文件")
+    with zf:
+        names = zf.namelist()
+        shared = []
+        if "xl/sharedStrings.xml" in names:
+            with zf.open("xl/sharedStrings.xml") as f:
+                for _, el in ET.iterparse(f):
+                    if el.tag == _NS + "si":
+                        shared.append("".join(t.text or "" for t in el.iter(_NS + "t")))
+                        el.clear()
+        sheets = sorted(n for n in names if re.fullmatch(r"xl/worksheets/sheet\d+\.xml", n))
+        if not sheets: raise RosterError("XLSX 中没有工作表")
+        sheet = "xl/worksheets/sheet1.xml" if "xl/worksheets/sheet1.xml" in sheets else sheets[0]
+        with zf.open(sheet) as f:
+            for _, el in ET.iterparse(f):
+                if el.tag != _NS + "row": continue
+                row = []
+                for c in el.iter(_NS + "c"):
+                    kind, v = c.get("t"), c.find(_NS + "v")
+                    if kind == "inlineStr":
+                        value = "".join(t.text or "" for t in c.iter(_NS + "t"))
+                    elif v is None:
+                        value = ""
+                    elif kind == "s":
+                        value = shared[int(v.text)]
+                    else:
+                        value = v.text or ""
+                    idx = _col_index(c.get("r", "")) if c.get("r") else len(row)
+                    row.extend([""] * (idx - len(row)))
+                    row.append(value)
+                el.clear()
+                yield row
+
+
+def parse_roster(fileobj, filename: str, errors: list):
+    """产出合法的 (行号, 用户名, 密码, 昵称)；首行含可识别的表头时按列名取值，否则依次视为 用户名,密码,昵称"""
+    rows = _xlsx_rows(fileobj) if filename.lower().endswith(".xlsx") else _csv_rows(fileobj)
+    cols = {"username": 0, "password": 1, "nickname": 2}
+    for row_no, row in enumerate(rows, 1):
+        row = [_cell(v) for v in row]
+        if row_no == 1:
+            lowered = [v.lower() for v in row]
+            found = {k: lowered.index(a) for k, aliases in HEADER_ALIASES.items() for a in aliases if a in lowered}
+            if found:
+                if "username" not in found or "password" not in found:
+                    raise RosterError("表头必须包含 用户名 与 密码 两列")
+                cols = found
+                continue
+        if not any(row): continue
+        if row_no > USER_IMPORT_MAX_ROWS + 1:
+            errors.append({"row": row_no, "username": "", "msg": f"超过单次导入上限 {USER_IMPORT_MAX_ROWS} 行，其余行已忽略"})
+            return
+        get = lambda k: row[cols[k]] if k in cols and cols[k] < len(row) else ""
+        u, p, nk = get("username"), get("password"), get("nickname")
+        if not u or len(u) > 64 or any(ch.isspace() for ch in u):
+            errors.append({"row": row_no, "username": u, "msg": "用户名为空、过长或含空白字符"})
+        elif not p:
+            errors.append({"row": row_no, "username": u, "msg": "密码为空"})
+        else:
+            yield row_no, u, p, nk[:64]
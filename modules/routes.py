@@ -1,165 +1,239 @@
 # modules/routes.py
 from fastapi import APIRouter, Request, Form, File, UploadFile, HTTPException, Header
-from fastapi.responses import HTMLResponse, RedirectResponse, JSONResponse, FileResponse, StreamingResponse
-from fastapi.templating import Jinja2Templates
-import secrets, os, glob, shutil, hashlib, mimetypes, time, zipfile, io
-from datetime import datetime
+from fastapi.responses import RedirectResponse, JSONResponse, StreamingResponse, Response
+from starlette.concurrency import run_in_threadpool
+import secrets, os, time, zlib, asyncio, base64, json, functools
+from typing import List
+from urllib.parse import quote
 from .database import *
+from .streaming import send_video_range
+from .segment_cache import segment_cache
+from .bandwidth import scheduler, client_ip
+from .mp4 import faststart, MP4Error
+from .roster import parse_roster, RosterError
+from .zipstream import zip_stream
+from .sessions import session_store
+from .passwords import password_pool, hash_password, PasswordPoolFull
+from .submissions import submission_pipeline
+from .page_cache import templates, page_cache
+from .assets import assets
+from .config import DATA_DIR, UPLOAD_CHUNK_SIZE, UPLOAD_MAX_CHUNK_SIZE, UPLOAD_EXPIRE_DAYS, MAX_BATCH_ANSWERS, \
+    ADMIN_PAGE_SIZE, ADMIN_PAGE_SIZE_MAX, ASSET_URL_PREFIX
 
 router = APIRouter()
-templates = Jinja2Templates(directory="templates")
 
-active_sessions = {}
-DATA_DIR = "Data"
 UPLOAD_DIR = "static/uploads"
 VIDEO_DIR = "static/videos"
 
 
-def check_session(request: Request):
+async def check_session(request: Request):
     sid = request.cookies.get("session_id")
-    return active_sessions.get(sid)
+    return await session_store.get_async(sid) if sid else None
 
 
 # --- [1. 视频流引擎] ---
-def send_video_range(file_path: str, range_header: str):
-    file_size = os.path.getsize(file_path)
-    start, end = 0, file_size - 1
-    if range_header:
-        range_str = range_header.replace("bytes=", "");
-        parts = range_str.split("-")
-        if parts[0]: start = int(parts[0])
-        if parts[1]: end = int(parts[1])
-    end = min(end, file_size - 1);
-    chunk_total_size = (end - start) + 1
-    mime_type = "video/mp4"
-
-    def iterfile():
-        with open(file_path, "rb") as f:
-            f.seek(start)
-            remaining = chunk_total_size
-            while remaining > 0:
-                data = f.read(min(remaining, 1024 * 1024))
-                if not data: break
-                remaining -= len(data);
-                yield data
-
-    headers = {
-        "Content-Range": f"bytes {start}-{end}/{file_size}",
-        "Accept-Ranges": "bytes",
-        "Content-Length": str(chunk_total_size),
-        "Content-Type": mime_type,
-        "Cache-Control": "public, max-age=31536000",
-        "X-Content-Type-Options": "nosniff",
-        "Content-Disposition": "inline",
-        "Connection": "keep-alive"
-    }
-    return StreamingResponse(iterfile(), status_code=206, headers=headers)
-
-
-@router.get("/video-stream/{filename}")
-async def video_stream(filename: str, range: str = Header(None)):
+@router.api_route("/video-stream/{filename}", methods=["GET", "HEAD"])
+async def video_stream(request: Request, filename: str):
     file_path = os.path.join(VIDEO_DIR, filename)
     if not os.path.exists(file_path): raise HTTPException(status_code=404)
-    return send_video_range(file_path, range)
+    client = None
+    if scheduler.enabled:
+        bitrate = await get_video_bitrate_async(filename) if scheduler.pacing_factor > 0 else None
+        s = await check_session(request)  # 按已校验的用户名限速：伪造 cookie 只会落到 IP 桶
+        client = (s["username"] if s else None, client_ip(request), bitrate)
+    return send_video_range(file_path, request.headers, request.method, client)
+
+
+@router.get("/admin/stream-stats")
+async def stream_stats(request: Request):
+    s = await check_session(request)
+    if not s or s["role"] != "admin": return JSONResponse({"status": "error", "msg": "权限不足"}, status_code=403)
+    return JSONResponse({"segment_cache": segment_cache.stats(), "scheduler": scheduler.stats()})
+
+
+@router.get("/admin/session-stats")
+async def session_stats(request: Request):
+    s = await check_session(request)
+    if not s or s["role"] != "admin": return JSONResponse({"status": "error", "msg": "权限不足"}, status_code=403)
+    return JSONResponse({"sessions": await run_in_threadpool(session_store.stats), "password_pool": password_pool.stats(),
+                         "submissions": submission_pipeline.stats(), "pages": page_cache.stats(),
+                         "assets": assets.stats()})
 
 
 # --- [2. 账号管理（新增搜索与批量功能）] ---
+def _encode_cursor(after):
+    return base64.urlsafe_b64encode(json.dumps(after, ensure_ascii=False).encode()).decode() if after else ""
+
+
+def _decode_cursor(cursor: str):
+    if not cursor: return None
+    try:
+        value, last_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return value, int(last_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="非法的分页游标")
+
+
+async def _user_page(q, sort, order, cursor, limit):
+    limit = max(1, min(limit, ADMIN_PAGE_SIZE_MAX))
+    users, after = await db_search_users_async(q.strip(), sort, order == "desc", _decode_cursor(cursor), limit)
+    return users, _encode_cursor(after)
+
+
 @router.get("/admin/users")
-async def admin_user_page(request: Request, q: str = ""):
-    s = check_session(request)
+async def admin_user_page(request: Request, q: str = "", sort: str = "username", order: str = "asc",
+                          limit: int = ADMIN_PAGE_SIZE):
+    s = await check_session(request)
     if not s or s["role"] != "admin": return RedirectResponse("/index")
-    users = db_get_all_users()
-    if q:
-        users = [u for u in users if q.lower() in u['username'].lower() or q.lower() in u['nickname'].lower()]
+    users, next_cursor = await _user_page(q, sort, order, "", limit)
     return templates.TemplateResponse("admin_users.html",
-                                      {"request": request, "users": users, "role": s["role"], "search_q": q})
+                                      {"request": request, "users": users, "role": s["role"], "search_q": q,
+                                       "sort": sort, "order": order, "next_cursor": next_cursor, "limit": limit})
+
+
+@router.get("/admin/users.json")
+async def admin_users_json(request: Request, q: str = "", sort: str = "username", order: str = "asc",
+                           cursor: str = "", limit: int = ADMIN_PAGE_SIZE):
+    """账号列表的 JSON 分页接口，供管理页滚动时懒加载"""
+    s = await check_session(request)
+    if not s or s["role"] != "admin": return JSONResponse({"status": "error", "msg": "权限不足"}, status_code=403)
+    users, next_cursor = await _user_page(q, sort, order, cursor, limit)
+    return JSONResponse({"status": "ok", "users": users, "next": next_cursor})
 
 
 @router.post("/admin/delete-user")
 async def handle_delete_user(request: Request, target_user: str = Form(...)):
-    s = check_session(request)
+    s = await check_session(request)
     if not s or s["role"] != "admin": return JSONResponse({"status": "error", "msg": "权限不足"}, status_code=403)
     if target_user == s["username"]: return JSONResponse({"status": "error", "msg": "不能注销自己"}, status_code=400)
-    db_delete_user(target_user)
-    lock_file = os.path.join(DATA_DIR, f"{target_user}.lock")
-    if os.path.exists(lock_file): os.remove(lock_file)
+    await db_delete_user_async(target_user)
     return JSONResponse({"status": "ok"})
 
 
 @router.post("/admin/batch-delete-users")
-async def batch_delete_users(request: Request, usernames: list = Form(...)):
-    s = check_session(request)
+async def batch_delete_users(request: Request, usernames: List[str] = Form(...)):
+    s = await check_session(request)
     if not s or s["role"] != "admin": raise HTTPException(status_code=403)
-    for u in usernames:
-        if u != s["username"]:
-            db_delete_user(u)
-            lock_f = os.path.join(DATA_DIR, f"{u}.lock")
-            if os.path.exists(lock_f): os.remove(lock_f)
+    targets = [u for u in set(usernames) if u != s["username"]]
+    if targets: await db_delete_users_async(targets)
     return RedirectResponse("/admin/users", 303)
 
 
+@router.post("/admin/extend-users")
+async def extend_users(request: Request, usernames: List[str] = Form(...), days: int = Form(60)):
+    s = await check_session(request)
+    if not s or s["role"] != "admin": return JSONResponse({"status": "error", "msg": "权限不足"}, status_code=403)
+    if not 1 <= days <= 3650: return JSONResponse({"status": "error", "msg": "延期天数需在 1~3650 之间"}, status_code=400)
+    return JSONResponse({"status": "ok", "updated": await db_extend_users_async(list(set(usernames)), days)})
+
+
+@router.post("/admin/import-users")
+async def import_users(request: Request, roster: UploadFile = File(...)):
+    """批量导入学生名单（CSV / XLSX），返回新建数量与逐行错误"""
+    s = await check_session(request)
+    if not s or s["role"] != "admin": return JSONResponse({"status": "error", "msg": "权限不足"}, status_code=403)
+    errors = []
+    try:
+        created, skipped = await db_import_users_async(parse_roster(roster.file, roster.filename or "", errors))
+    except RosterError as e:
+        return JSONResponse({"status": "error", "msg": str(e)}, status_code=400)
+    errors = sorted(errors + skipped, key=lambda e: e["row"])
+    return JSONResponse({"status": "ok", "created": created, "errors": errors})
+
+
 # --- [3. 成绩单管理与批量下载] ---
+async def _record_bytes(s, fname: str) -> bytes:
+    """按权限取出一份成绩单的内容（归档段文件或 Data/ 下的 TXT）：管理员可访问全部，学生只能访问自己的"""
+    fname = os.path.basename(fname)
+    rec = await db_get_record_async(fname)
+    if rec is None and s["role"] == "admin": rec = {"path": fname, "segment": None}  # 未入索引的旧文件
+    if rec is None or (s["role"] != "admin" and rec["owner"] != s["username"]): raise HTTPException(status_code=403)
+    data = await db_read_record_async(rec)
+    if data is None: raise HTTPException(status_code=404)
+    return data
+
+
 @router.get("/view-record/{fname}")
 async def view_record(request: Request, fname: str):
-    s = check_session(request);
+    s = await check_session(request);
     if not s: return RedirectResponse("/index")
-    if s["role"] != "admin" and not fname.startswith(s["username"]): raise HTTPException(status_code=403)
-    file_path = os.path.join(DATA_DIR, fname)
-    if not os.path.exists(file_path): raise HTTPException(status_code=404)
-    with open(file_path, "r", encoding="utf-8") as f:
-        content = f.read()
+    content = (await _record_bytes(s, fname)).decode("utf-8", errors="replace")
     return templates.TemplateResponse("view_record.html", {"request": request, "content": content, "filename": fname})
 
 
 @router.get("/download-record/{fname}")
 async def dl(request: Request, fname: str):
-    s = check_session(request)
+    s = await check_session(request)
     if not s: return RedirectResponse("/index")
-    if s["role"] == "admin" or fname.startswith(s["username"]):
-        file_path = os.path.join(DATA_DIR, fname)
-        if os.path.exists(file_path): return FileResponse(file_path, filename=fname)
-    raise HTTPException(status_code=403)
+    data = await _record_bytes(s, fname)
+    return Response(data, media_type="text/plain; charset=utf-8", headers={
+        "Content-Disposition": f"attachment; filename*=utf-8''{quote(os.path.basename(fname))}"})
 
 
 @router.post("/admin/batch-delete-records")
 async def batch_delete_records(request: Request, filenames: list = Form(...)):
-    s = check_session(request)
+    s = await check_session(request)
     if not s or s["role"] != "admin": raise HTTPException(status_code=403)
-    for f in filenames:
-        fpath = os.path.join(DATA_DIR, os.path.basename(f))
+    names = [os.path.basename(f) for f in filenames]
+    # 已归档的成绩单只删除索引行（段文件只追加不改写，数据随之不可达）
+    await db_delete_records_async(names)
+    for name in names:
+        fpath = os.path.join(DATA_DIR, name)
         if os.path.exists(fpath): os.remove(fpath)
     return RedirectResponse("/profile", 303)
 
 
+def _zip_records(recs):
+    """边压缩边发送（同步生成器由 Starlette 放到线程池迭代），内存占用与存档数量无关；
+    已归档的成绩单在迭代到它时才从段文件随机读取"""
+    entries = ((r["path"], functools.partial(db_read_record, r)) for r in recs)
+    return StreamingResponse(zip_stream(entries), media_type="application/x-zip-compressed", headers={
+        "Content-Disposition": f"attachment; filename=Batch_Records_{int(time.time())}.zip"})
+
+
 @router.post("/admin/batch-download-records")
 async def batch_download_records(request: Request, filenames: list = Form(...)):
-    s = check_session(request)
+    s = await check_session(request)
     if not s or s["role"] != "admin": raise HTTPException(status_code=403)
-    zip_buffer = io.BytesIO()
-    with zipfile.ZipFile(zip_buffer, "w", zipfile.ZIP_DEFLATED) as zip_file:
-        for fname in filenames:
-            safe_name = os.path.basename(fname)
-            fpath = os.path.join(DATA_DIR, safe_name)
-            if os.path.exists(fpath): zip_file.write(fpath, safe_name)
-    zip_buffer.seek(0)
-    return StreamingResponse(zip_buffer, media_type="application/x-zip-compressed", headers={
-        "Content-Disposition": f"attachment; filename=Batch_Records_{int(time.time())}.zip"})
+    return _zip_records(await db_get_records_async([os.path.basename(f) for f in filenames]))
+
+
+@router.get("/admin/export-records")
+async def export_records(request: Request, record_q: str = ""):
+    """按与个人中心相同的关键字筛选，导出全部匹配的成绩单（无需逐个勾选）"""
+    s = await check_session(request)
+    if not s or s["role"] != "admin": raise HTTPException(status_code=403)
+    return _zip_records(await db_list_records_async(None, record_q.strip()))
+
+
+@router.get("/admin/item-analysis")
+async def item_analysis_report(request: Request):
+    """题目分析：难度、区分度（题目-剩余分点二列相关）、干扰项分布与 Cronbach α"""
+    s = await check_session(request)
+    if not s or s["role"] != "admin": return JSONResponse({"status": "error", "msg": "权限不足"}, status_code=403)
+    return JSONResponse({"status": "ok", **await db_item_analysis_async()})
 
 
 # --- [4. 基础路由] ---
+@router.get(ASSET_URL_PREFIX + "/{path:path}")
+async def asset_file(request: Request, path: str):
+    """带指纹的静态资源（预压缩 + immutable 长期缓存），地址由模板中的 asset_url() 生成"""
+    return assets.response(request, path)
+
+
 @router.get("/")
 async def root_path(): return RedirectResponse(url="/index")
 
 
 @router.get("/index")
-async def welcome_page(request: Request): return templates.TemplateResponse("index.html", {"request": request})
+async def welcome_page(request: Request): return page_cache.render(request, "index.html")
 
 
 @router.get("/home")
 async def home_pg(request: Request):
-    s = check_session(request)
+    s = await check_session(request)
     if not s: return RedirectResponse("/index")
-    info = get_user_info(s["username"])
+    info = await get_user_info_async(s["username"])
     return templates.TemplateResponse("home.html",
                                       {"request": request, "nickname": info["nickname"], "user_avatar": info["avatar"],
                                        "role": s["role"]})
@@ -167,23 +241,30 @@ async def home_pg(request: Request):
 
 @router.get("/video-catalog")
 async def v_catalog(request: Request):
-    if not check_session(request): return RedirectResponse("/index")
-    return templates.TemplateResponse("video_catalog.html", {"request": request})
+    if not await check_session(request): return RedirectResponse("/index")
+    return page_cache.render(request, "video_catalog.html", private=True)
 
 
 @router.get("/test-catalog")
 async def t_catalog(request: Request):
-    if not check_session(request): return RedirectResponse("/index")
-    return templates.TemplateResponse("test_catalog.html", {"request": request})
+    if not await check_session(request): return RedirectResponse("/index")
+    return page_cache.render(request, "test_catalog.html", private=True)
 
 
 # --- [5. 鉴权与账号系统] ---
 @router.get("/login-page")
-async def lp(request: Request): return templates.TemplateResponse("login.html", {"request": request})
+async def lp(request: Request): return page_cache.render(request, "login.html")
 
 
 @router.get("/register-page")
-async def rp(request: Request): return templates.TemplateResponse("register.html", {"request": request})
+async def rp(request: Request): return page_cache.render(request, "register.html")
+
+
+def _busy(request: Request, template: str, e: PasswordPoolFull):
+    """口令校验排队已满：快速返回 503，让浏览器 / 客户端稍后重试"""
+    return templates.TemplateResponse(template, {"request": request,
+                                                 "error": f"登录人数较多，请 {e.retry_after} 秒后重试"},
+                                      status_code=503, headers={"Retry-After": str(e.retry_after)})
 
 
 @router.post("/login")
@@ -192,9 +273,12 @@ async def handle_login(request: Request, username: str = Form(...), password: st
     if role == "admin" and admin_serial != "123456": return templates.TemplateResponse("login.html",
                                                                                        {"request": request,
                                                                                         "error": "管理员验证码错误"})
-    if verify_user(username, password):
-        sid = secrets.token_urlsafe(32);
-        active_sessions[sid] = {"username": username, "role": role}
+    try:
+        ok = await verify_user_async(username, password)
+    except PasswordPoolFull as e:
+        return _busy(request, "login.html", e)
+    if ok:
+        sid = await session_store.create_async({"username": username, "role": role})
         res = RedirectResponse("/home", 303);
         res.set_cookie("session_id", sid, httponly=True);
         return res
@@ -203,14 +287,17 @@ async def handle_login(request: Request, username: str = Form(...), password: st
 
 @router.post("/register")
 async def handle_register(request: Request, username: str = Form(...), password: str = Form(...)):
-    if create_user(username, password): return RedirectResponse("/login-page", 303)
+    try:
+        if await create_user_async(username, password): return RedirectResponse("/login-page", 303)
+    except PasswordPoolFull as e:
+        return _busy(request, "register.html", e)
     return templates.TemplateResponse("register.html", {"request": request, "error": "注册失败：用户名可能已被占用"})
 
 
 @router.post("/logout")
 async def lo(request: Request):
     sid = request.cookies.get("session_id");
-    if sid in active_sessions: del active_sessions[sid]
+    if sid: await session_store.delete_async(sid)
     res = RedirectResponse("/index", 303);
     res.delete_cookie("session_id");
     return res
@@ -219,194 +306,284 @@ async def lo(request: Request):
 # --- [6. 个人中心与进度同步（含搜索）] ---
 @router.get("/profile")
 async def profile_page(request: Request, record_q: str = ""):
-    s = check_session(request);
+    s = await check_session(request);
     if not s: return RedirectResponse("/index")
-    info = get_user_info(s["username"])
-    path_pattern = os.path.join(DATA_DIR, "*_成绩单_*.txt") if s["role"] == "admin" else os.path.join(DATA_DIR,
-                                                                                                      f"{s['username']}_成绩单_*.txt")
-    recs = sorted([os.path.basename(x) for x in glob.glob(path_pattern)], reverse=True)
-    if record_q:
-        recs = [r for r in recs if record_q.lower() in r.lower()]
+    info = await get_user_info_async(s["username"])
+    rows = await db_list_records_async(None if s["role"] == "admin" else s["username"], record_q.strip())
+    recs = [r["path"] for r in rows]
+    pending = await db_list_submissions_async(None if s["role"] == "admin" else s["username"])
     return templates.TemplateResponse("profile.html",
                                       {"request": request, "nickname": info["nickname"], "avatar": info["avatar"],
-                                       "role": s["role"], "records": recs, "record_q": record_q})
+                                       "role": s["role"], "records": recs, "record_q": record_q, "pending": pending})
+
+
+@router.get("/submissions.json")
+async def submissions_json(request: Request):
+    """尚未生成成绩单的提交数，个人中心据此轮询，生成完毕后刷新"""
+    s = await check_session(request)
+    if not s: return JSONResponse({"status": "error"}, status_code=401)
+    pending = await db_list_submissions_async(None if s["role"] == "admin" else s["username"])
+    return JSONResponse({"status": "ok", "pending": sum(1 for p in pending if p["status"] != "failed")})
 
 
 @router.get("/change-password")
 async def cp_pg(request: Request):
-    if not check_session(request): return RedirectResponse("/index")
+    if not await check_session(request): return RedirectResponse("/index")
     return templates.TemplateResponse("change_password.html", {"request": request})
 
 
 @router.post("/change-password-action")
 async def handle_change_password(request: Request, old_password: str = Form(...), new_password: str = Form(...)):
-    s = check_session(request)
+    s = await check_session(request)
     if not s: return RedirectResponse("/index")
-    if verify_user(s["username"], old_password):
-        ph = hashlib.sha256(new_password.encode()).hexdigest()
-        with get_user_db() as conn:
-            conn.execute("UPDATE users SET password=? WHERE username=?", (ph, s["username"]))
-            conn.commit()
-        return templates.TemplateResponse("change_password.html",
-                                          {"request": request, "error": "密码修改成功！", "success": True})
+    try:
+        if await verify_user_async(s["username"], old_password):
+            ph = await password_pool.run(hash_password, new_password)
+            await db_set_password_async(s["username"], ph)
+            return templates.TemplateResponse("change_password.html",
+                                              {"request": request, "error": "密码修改成功！", "success": True})
+    except PasswordPoolFull as e:
+        return _busy(request, "change_password.html", e)
     return templates.TemplateResponse("change_password.html", {"request": request, "error": "原密码验证不正确"})
 
 
 @router.post("/update-profile")
 async def up_p(request: Request, nickname: str = Form(None), avatar_file: UploadFile = File(None)):
-    s = check_session(request);
+    s = await check_session(request);
     if not s: return RedirectResponse("/index")
     av = None
     if avatar_file and avatar_file.filename:
         fn = f"{s['username']}_av{os.path.splitext(avatar_file.filename)[1]}"
         with open(f"static/uploads/{fn}", "wb") as b: b.write(await avatar_file.read())
         av = f"/static/uploads/{fn}"
-    update_user_info(s["username"], nickname, av);
+    await update_user_info_async(s["username"], nickname, av);
     return RedirectResponse("/profile", 303)
 
 
 @router.get("/get-video-progress")
 async def g_progress(request: Request):
-    s = check_session(request);
-    return JSONResponse(db_get_progress(s["username"]) if s else [])
+    s = await check_session(request);
+    return JSONResponse(await db_get_progress_async(s["username"]) if s else [])
 
 
 @router.post("/update-progress")
 async def u_progress(request: Request, video_id: int = Form(...), progress: str = Form(...)):
-    s = check_session(request);
-    if s: db_update_progress(s["username"], video_id, progress)
+    s = await check_session(request);
+    if s: await db_update_progress_async(s["username"], video_id, progress)
     return {"status": "ok"}
 
 
 # --- [7. 视频管理：包含排序与AJAX] ---
 @router.get("/videos")
 async def v_list(request: Request):
-    s = check_session(request);
+    s = await check_session(request);
     if not s: return RedirectResponse("/index")
     return templates.TemplateResponse("videos.html",
-                                      {"request": request, "videos": get_all_videos(), "role": s["role"]})
+                                      {"request": request, "videos": await get_all_videos_async(), "role": s["role"]})
 
 
 @router.post("/swap-video-order")
 async def swap_v(request: Request, v1_id: int = Form(...), v2_id: int = Form(...)):
-    s = check_session(request)
+    s = await check_session(request)
     if s and s["role"] == "admin":
-        with get_res_db() as conn:
-            v1 = conn.execute("SELECT title, filename FROM videos WHERE id=?", (v1_id,)).fetchone()
-            v2 = conn.execute("SELECT title, filename FROM videos WHERE id=?", (v2_id,)).fetchone()
-            if v1 and v2:
-                conn.execute("UPDATE videos SET title=?, filename=? WHERE id=?", (v2['title'], v2['filename'], v1_id))
-                conn.execute("UPDATE videos SET title=?, filename=? WHERE id=?", (v1['title'], v1['filename'], v2_id))
-                conn.commit();
-                return JSONResponse({"status": "ok"})
+        if await db_swap_videos_async(v1_id, v2_id): return JSONResponse({"status": "ok"})
     return JSONResponse({"status": "error"}, status_code=403)
 
 
+async def probe_video(path: str):
+    """上传后把 moov 前置并读取元数据；非 MP4 或解析失败时保留原文件，仅不记录元数据"""
+    try:
+        return await run_in_threadpool(faststart, path)
+    except MP4Error as e:
+        print(f"⚠️ 视频元数据解析失败 {os.path.basename(path)}: {e}")
+        return None
+
+
 @router.post("/upload-video")
 async def uv(request: Request, title: str = Form(...), video_file: UploadFile = File(...)):
-    s = check_session(request);
+    s = await check_session(request);
     if s and s["role"] == "admin":
-        fn = f"{secrets.token_hex(4)}_{video_file.filename}"
-        with open(os.path.join(VIDEO_DIR, fn), "wb") as f: f.write(await video_file.read())
-        add_video(title, fn, s["username"])
+        fn = f"{secrets.token_hex(4)}_{os.path.basename(video_file.filename)}"
+        with open(os.path.join(VIDEO_DIR, fn), "wb") as f:
+            while True:
+                data = await video_file.read(UPLOAD_CHUNK_SIZE)
+                if not data: break
+                f.write(data)
+        segment_cache.invalidate(os.path.join(VIDEO_DIR, fn))
+        await add_video_async(title, fn, s["username"], await probe_video(os.path.join(VIDEO_DIR, fn)))
     return RedirectResponse("/videos", 303)
 
 
+# --- 分片续传：init -> PUT chunk/{i}（带 CRC32 校验）-> finalize ---
+upload_locks = {}
+
+
+def _part_path(uid: str):
+    return os.path.join(VIDEO_DIR, f"{uid}.part")
+
+
+async def _purge_stale_uploads():
+    for uid in await db_expired_uploads_async(UPLOAD_EXPIRE_DAYS):
+        if os.path.exists(_part_path(uid)): os.remove(_part_path(uid))
+        await db_delete_upload_async(uid)
+        upload_locks.pop(uid, None)
+
+
+async def _lost_upload(uid: str):
+    """.part 文件已不在（被清理或进程崩溃）：删除登记，让客户端重新开始"""
+    await db_delete_upload_async(uid)
+    upload_locks.pop(uid, None)
+    return JSONResponse({"status": "error", "msg": "上传的临时文件已丢失，请重新上传"}, status_code=404)
+
+
+def _upload_status(up):
+    return {"upload_id": up["upload_id"], "chunk_size": up["chunk_size"], "total_size": up["total_size"],
+            "next_index": up["next_index"], "received": min(up["next_index"] * up["chunk_size"], up["total_size"]),
+            "total_chunks": -(-up["total_size"] // up["chunk_size"])}
+
+
+@router.post("/upload-video/init")
+async def uv_init(request: Request, title: str = Form(...), filename: str = Form(...), total_size: int = Form(...),
+                  chunk_size: int = Form(UPLOAD_CHUNK_SIZE)):
+    s = await check_session(request)
+    if not s or s["role"] != "admin": return JSONResponse({"status": "error", "msg": "权限不足"}, status_code=403)
+    if total_size <= 0 or not 0 < chunk_size <= UPLOAD_MAX_CHUNK_SIZE:
+        return JSONResponse({"status": "error", "msg": "文件大小或分片大小不合法"}, status_code=400)
+    await _purge_stale_uploads()
+    uid = secrets.token_hex(16)
+    await db_create_upload_async(uid, title, os.path.basename(filename), total_size, chunk_size, s["username"])
+    open(_part_path(uid), "wb").close()
+    return JSONResponse({"status": "ok", **_upload_status(await db_get_upload_async(uid))})
+
+
+@router.get("/upload-video/{upload_id}")
+async def uv_status(request: Request, upload_id: str):
+    s = await check_session(request)
+    up = await db_get_upload_async(upload_id)
+    if not s or not up or up["created_by"] != s["username"]: raise HTTPException(status_code=404)
+    return JSONResponse({"status": "ok", **_upload_status(up)})
+
+
+@router.put("/upload-video/{upload_id}/chunk/{index}")
+async def uv_chunk(request: Request, upload_id: str, index: int, x_chunk_crc32: str = Header(...)):
+    s = await check_session(request)
+    up = await db_get_upload_async(upload_id)
+    if not s or not up or up["created_by"] != s["username"]: raise HTTPException(status_code=404)
+    lock = upload_locks.setdefault(upload_id, asyncio.Lock())
+    async with lock:
+        up = await db_get_upload_async(upload_id)
+        if not up or not os.path.exists(_part_path(upload_id)): return await _lost_upload(upload_id)
+        if index < up["next_index"]: return JSONResponse({"status": "ok", **_upload_status(up)})  # 重传的旧分片
+        if index > up["next_index"]:
+            return JSONResponse({"status": "error", "msg": "分片顺序错误", **_upload_status(up)}, status_code=409)
+        offset = index * up["chunk_size"]
+        expected = min(up["chunk_size"], up["total_size"] - offset)
+        crc, piece_crc, got = up["crc32"], 0, 0
+        # 请求体边收边写，内存中只保留网络层的小缓冲
+        with open(_part_path(upload_id), "r+b") as f:
+            f.truncate(offset); f.seek(offset)
+            async for data in request.stream():
+                got += len(data)
+                if got > expected: break
+                f.write(data)
+                piece_crc = zlib.crc32(data, piece_crc)
+                crc = zlib.crc32(data, crc)
+            if got != expected or f"{piece_crc:08x}" != x_chunk_crc32.lower().rjust(8, "0"):
+                f.truncate(offset)
+                return JSONResponse({"status": "error", "msg": "分片长度或校验和不匹配", **_upload_status(up)},
+                                    status_code=400)
+        await db_advance_upload_async(upload_id, index, crc)
+        return JSONResponse({"status": "ok", **_upload_status(await db_get_upload_async(upload_id))})
+
+
+@router.post("/upload-video/{upload_id}/finalize")
+async def uv_finalize(request: Request, upload_id: str, crc32: str = Form(...)):
+    s = await check_session(request)
+    up = await db_get_upload_async(upload_id)
+    if not s or not up or up["created_by"] != s["username"]: raise HTTPException(status_code=404)
+    part = _part_path(upload_id)
+    if not os.path.exists(part): return await _lost_upload(upload_id)
+    status = _upload_status(up)
+    if up["next_index"] != status["total_chunks"] or os.path.getsize(part) != up["total_size"] \
+            or f"{up['crc32']:08x}" != crc32.lower().rjust(8, "0"):
+        return JSONResponse({"status": "error", "msg": "文件不完整或整体校验失败", **status}, status_code=400)
+    fn = f"{secrets.token_hex(4)}_{up['filename']}"
+    os.replace(part, os.path.join(VIDEO_DIR, fn))
+    segment_cache.invalidate(os.path.join(VIDEO_DIR, fn))
+    await db_delete_upload_async(upload_id)
+    upload_locks.pop(upload_id, None)
+    await add_video_async(up["title"], fn, s["username"], await probe_video(os.path.join(VIDEO_DIR, fn)))
+    return JSONResponse({"status": "ok", "filename": fn})
+
+
 @router.post("/delete-video")
 async def dv(video_id: int = Form(...)):
-    delete_video_by_id(video_id);
+    fn = await delete_video_by_id_async(video_id)
+    if fn: segment_cache.invalidate(os.path.join(VIDEO_DIR, fn))
     return JSONResponse({"status": "ok"})
 
 
 # --- [8. 考核测试与三段式成绩导出] ---
 @router.get("/eeg-test")
 async def eeg_test_page(request: Request):
-    s = check_session(request);
+    s = await check_session(request);
     if not s: return RedirectResponse("/index")
-    if "test_start" not in s: s["test_start"] = time.time()
-    lock = os.path.exists(os.path.join(DATA_DIR, f"{s['username']}.lock"))
+    # 状态只在需要转换时才走写线程，进行中 / 已交卷时打开页面是一次读查询
+    st = await db_get_exam_state_async(s["username"])
+    if st["state"] in (EXAM_NOT_STARTED, EXAM_RESET): st = await db_start_exam_async(s["username"])
     return templates.TemplateResponse("eeg_test.html",
-                                      {"request": request, "questions": db_get_questions(), "role": s["role"],
-                                       "answered": db_get_user_answers(s["username"]), "already_finished": lock})
+                                      {"request": request, "questions": await db_get_questions_async(), "role": s["role"],
+                                       "answered": await db_get_user_answers_async(s["username"]),
+                                       "already_finished": st["state"] == EXAM_SUBMITTED,
+                                       "idem_key": secrets.token_urlsafe(16)})
+
+
+@router.get("/questions.json")
+async def questions_json(request: Request):
+    """题库 JSON（不含答案）：强 ETag，未变化时返回 304"""
+    if not await check_session(request): return JSONResponse({"status": "error"}, status_code=401)
+    snap = await db_get_questions_snapshot_async()
+    headers = {"ETag": snap.etag, "Cache-Control": "private, no-cache"}
+    inm = request.headers.get("if-none-match")
+    if inm and (inm.strip() == "*" or snap.etag in [t.strip() for t in inm.split(",")]):
+        return Response(status_code=304, headers=headers)
+    return Response(snap.body, media_type="application/json", headers=headers)
 
 
 @router.post("/submit-answer")
 async def s_ans(request: Request, qid: int = Form(...), opt: str = Form(...)):
-    s = check_session(request);
-    if s: db_submit_answer(s["username"], qid, opt);
+    s = await check_session(request);
+    if s: await db_submit_answer_async(s["username"], qid, opt);
     return {"status": "ok"}
 
 
+@router.post("/submit-answers")
+async def s_answers(request: Request, qid: List[int] = Form(...), opt: List[str] = Form(...)):
+    """整页批量提交：一次判分、一次事务写入"""
+    s = await check_session(request)
+    if not s: return JSONResponse({"status": "error"}, status_code=401)
+    if len(qid) != len(opt) or len(qid) > MAX_BATCH_ANSWERS:
+        return JSONResponse({"status": "error", "msg": "答案数量不合法"}, status_code=400)
+    graded = await db_submit_answers_async(s["username"], list(zip(qid, opt)))
+    return {"status": "ok", "saved": len(graded)}
+
+
 @router.post("/finish-test")
-async def finish_test(request: Request):
-    s = check_session(request);
+async def finish_test(request: Request, idem_key: str = Form(None)):
+    """只登记交卷就返回（一次写事务），判分与成绩单由后台流水线生成；
+    幂等键取表单字段 idem_key 或请求头 Idempotency-Key，同一键重复提交不会重复登记"""
+    s = await check_session(request);
     if not s: return RedirectResponse("/index")
-    u = s["username"];
-    now = datetime.now()
-    if os.path.exists(os.path.join(DATA_DIR, f"{u}.lock")): return RedirectResponse("/profile", 303)
-    u_info = get_user_info(u);
-    nickname = u_info["nickname"] if u_info else "未知"
-    qs = db_get_questions();
-    ans = db_get_user_answers(u)
-    video_progs = db_get_progress(u)
-    total_score = 0;
-    start_ts = s.get("test_start", time.time())
-    duration_str = f"{int(time.time() - start_ts) // 60}分{int(time.time() - start_ts) % 60}秒"
-
-    for q in qs:
-        if ans.get(q['id'], {}).get('is_correct'): total_score += 1
-
-    score_ratio = total_score / len(qs) if len(qs) > 0 else 0
-    grade = "A" if score_ratio >= 0.75 else "B" if score_ratio >= 0.50 else "C" if score_ratio >= 0.25 else "D"
-
-    idx = len(glob.glob(os.path.join(DATA_DIR, f"{u}_成绩单_*.txt"))) + 1
-    fpath = os.path.join(DATA_DIR, f"{u}_成绩单_{idx}.txt")
-
-    with open(fpath, "w", encoding="utf-8") as f:
-        f.write("=" * 70 + "\n        深圳大学神经语言学实验室 - 实验考核报告\n" + "=" * 70 + "\n")
-        f.write(
-            f"用户昵称: {nickname} | 账号: {u}\n考核时间: {now.strftime('%Y-%m-%d %H:%M:%S')} | 耗时: {duration_str}\n最终成绩: {total_score}/{len(qs)} | 评级: {grade}\n\n")
-
-        # 第一部分：答题总览
-        f.write("-" * 22 + " [第一部分：答题总览] " + "-" * 22 + "\n")
-        f.write(f"{'题号':<10}{'用户作答':<15}{'正确答案':<15}{'结果':<10}\n")
-        for i, q in enumerate(qs, 1):
-            ua = ans.get(q['id'], {})
-            u_opt = ua.get('selected_option', '-')
-            res = "√" if ua.get('is_correct') else "×"
-            f.write(f"{i:<12}{u_opt:<18}{q['answer']:<18}{res:<10}\n")
-
-        # 第二部分：详细解析
-        f.write("\n" + "-" * 22 + " [第二部分：题目详细解析] " + "-" * 22 + "\n")
-        for i, q in enumerate(qs, 1):
-            ua = ans.get(q['id'], {})
-            f.write(
-                f"题{i}: {q['content']}\n选项: A:{q['option_a']} B:{q['option_b']} C:{q['option_c']} D:{q['option_d']}\n")
-            f.write(
-                f"用户作答: {ua.get('selected_option', '未填')} | 正确答案: {q['answer']} | {'√' if ua.get('is_correct') else '×'}\n" + "-" * 30 + "\n")
-
-        # 第三部分：学习进度
-        f.write("\n" + "-" * 22 + " [第三部分：课件进度存档] " + "-" * 22 + "\n")
-        if video_progs:
-            f.write(f"{'课件名称':<40}{'观看进度':<10}\n")
-            for vp in video_progs:
-                f.write(f"{vp['title']:<43}{vp['progress']:<10}\n")
-        else:
-            f.write("暂无课件观看记录。\n")
-        f.write("\n报告由系统自动生成。")
-
-    with open(os.path.join(DATA_DIR, f"{u}.lock"), "w") as lock:
-        lock.write("L")
-    if "test_start" in s: del s["test_start"]
-    with get_user_db() as conn:
-        conn.execute("DELETE FROM user_answers WHERE username=?", (u,)); conn.commit()
+    key = idem_key or request.headers.get("idempotency-key")
+    sid = await db_submit_exam_async(s["username"], EXAM_EEG, key[:64] if key else None)
+    if sid is not None: submission_pipeline.enqueue(sid)
     return RedirectResponse("/profile", 303)
 
 
 @router.post("/add-question")
 async def aq(content: str = Form(...), option_a: str = Form(...), option_b: str = Form(...), option_c: str = Form(...),
              option_d: str = Form(...), answer: str = Form(...)):
-    db_add_question(content, option_a, option_b, option_c, option_d, answer.upper());
+    await db_add_question_async(content, option_a, option_b, option_c, option_d, answer.upper());
     return JSONResponse({"status": "ok"})
 
 
@@ -414,28 +591,23 @@ async def aq(content: str = Form(...), option_a: str = Form(...), option_b: str
 async def edit_q(request: Request, qid: int = Form(...), content: str = Form(...), option_a: str = Form(...),
                  option_b: str = Form(...), option_c: str = Form(...), option_d: str = Form(...),
                  answer: str = Form(...)):
-    s = check_session(request)
+    s = await check_session(request)
     if s and s["role"] == "admin":
-        with get_res_db() as conn:
-            conn.execute(
-                "UPDATE questions SET content=?, option_a=?, option_b=?, option_c=?, option_d=?, answer=? WHERE id=?",
-                (content, option_a, option_b, option_c, option_d, answer.upper(), qid))
-            conn.commit();
-            return JSONResponse({"status": "ok"})
+        await db_edit_question_async(qid, content, option_a, option_b, option_c, option_d, answer.upper())
+        return JSONResponse({"status": "ok"})
     return JSONResponse({"status": "error"}, status_code=403)
 
 
 @router.post("/delete-question")
 async def dq(request: Request, qid: int = Form(...)):
-    s = check_session(request);
-    if s and s["role"] == "admin": db_delete_question(qid); return JSONResponse({"status": "ok"})
+    s = await check_session(request);
+    if s and s["role"] == "admin": await db_delete_question_async(qid); return JSONResponse({"status": "ok"})
     return JSONResponse({"status": "error"}, status_code=403)
 
 
 @router.post("/reset-all")
 async def handle_reset_all(request: Request):
-    s = check_session(request)
+    s = await check_session(request)
     if s and s["role"] == "admin":
-        db_reset_all_answers();
-        [os.remove(f) for f in glob.glob(os.path.join(DATA_DIR, "*.lock"))]
+        await db_reset_exam_async()
     return RedirectResponse("/profile", 303)
\ No newline at end of file
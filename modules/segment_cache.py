@@ -0,0 +1,83 @@
+# modules/segment_cache.py
+import asyncio, os
+from collections import OrderedDict
+from starlette.concurrency import run_in_threadpool
+from .config import SEGMENT_CACHE_BYTES, SEGMENT_SIZE
+
+# 🌟 热点分片缓存：同一视频的同一段数据在上课时被上百人同时请求，
+# 按 (文件, inode, mtime, 对齐偏移) 缓存，LRU 淘汰，并发未命中只读一次磁盘（single-flight）
+
+
+def _read_segment(path: str, offset: int, size: int) -> bytes:
+    with open(path, "rb") as f:
+        f.seek(offset)
+        return f.read(size)
+
+
+class SegmentCache:
+    def __init__(self, budget: int, segment_size: int):
+        self.budget, self.segment_size = budget, segment_size
+        self.entries = OrderedDict()  # key -> bytes，末尾为最近使用
+        self.by_path = {}  # path -> {key}，用于按文件失效
+        self.inflight = {}  # key -> asyncio.Task，正在读取的分片
+        self.used = 0
+        self.hits = self.misses = self.evictions = self.coalesced = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.budget > 0
+
+    async def get(self, path: str, st: os.stat_result, offset: int) -> bytes:
+        """取 offset 所在的对齐分片；offset 必须是 segment_size 的整数倍"""
+        key = (path, st.st_ino, st.st_mtime_ns, offset)
+        data = self.entries.get(key)
+        if data is not None:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return data
+        self.misses += 1
+        task = self.inflight.get(key)
+        if task is None:
+            size = min(self.segment_size, st.st_size - offset)
+            task = asyncio.ensure_future(run_in_threadpool(_read_segment, path, offset, size))
+            self.inflight[key] = task
+            task.add_done_callback(lambda t, k=key: self._loaded(k, t))
+        else:
+            self.coalesced += 1  # 搭便车：同一分片已在读取中
+        # shield：发起读取的客户端断开时，其它等待同一分片的请求不受影响
+        return await asyncio.shield(task)
+
+    def _loaded(self, key, task):
+        self.inflight.pop(key, None)
+        if task.cancelled() or task.exception() is not None: return
+        data = task.result()
+        if len(data) > self.budget or key in self.entries: return
+        self.entries[key] = data
+        self.by_path.setdefault(key[0], set()).add(key)
+        self.used += len(data)
+        while self.used > self.budget:
+            old_key, old = self.entries.popitem(last=False)
+            self._forget(old_key, old)
+            self.evictions += 1
+
+    def _forget(self, key, data):
+        self.used -= len(data)
+        keys = self.by_path.get(key[0])
+        if keys is not None:
+            keys.discard(key)
+            if not keys: del self.by_path[key[0]]
+
+    def invalidate(self, path: str):
+        """文件被删除或覆盖时丢弃其全部分片"""
+        for key in self.by_path.pop(path, set()):
+            data = self.entries.pop(key, None)
+            if data is not None: self.used -= len(data)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {"budget_bytes": self.budget, "used_bytes": self.used, "segments": len(self.entries),
+                "segment_size": self.segment_size, "hits": self.hits, "misses": self.misses,
+                "evictions": self.evictions, "coalesced": self.coalesced, "hit_ratio": round(self.hits / total, 4) if total else 0.0}
+
+
+segment_cache = SegmentCache(SEGMENT_CACHE_BYTES, SEGMENT_SIZE)
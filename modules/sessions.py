@@ -0,0 +1,254 @@
+# modules/sessions.py
+import asyncio, heapq, json, secrets, threading, time
+from collections import OrderedDict
+from .db_pool import ConnectionPool
+from .database import _async
+from .migrations import migrate, SESSION_MIGRATIONS
+from .config import SESSION_BACKEND, SESSION_DB, SESSION_CACHE_TTL, SESSION_ABSOLUTE_TTL, SESSION_IDLE_TTL, \
+    SESSION_MAX, SESSION_SWEEP_INTERVAL, SESSION_TOUCH_INTERVAL
+
+# 🌟 可插拔会话存储：默认进程内字典（与原 active_sessions 行为一致）；
+# 多 worker 部署时改用 SQLite(WAL) 共享表，并在每个进程前面加一层短 TTL 的本地读缓存，
+# check_session 绝大多数情况下仍是一次内存查找；需要访问 SQLite 时经由数据库执行器，不占用事件循环。
+# 会话有绝对有效期与空闲超时，后台任务定时清理过期会话，总数超过上限时按 LRU 淘汰
+
+
+class MemorySessionStore:
+    """进程内会话表：OrderedDict 维持 LRU 顺序（超过上限淘汰最久未访问的），
+    最小堆按到期时刻排序，后台定时弹出已过期的会话"""
+
+    def __init__(self, absolute_ttl: float, idle_ttl: float, max_sessions: int):
+        self.absolute_ttl, self.idle_ttl, self.max_sessions = absolute_ttl, idle_ttl, max_sessions
+        self.lock = threading.Lock()
+        self.data = OrderedDict()  # sid -> [会话数据, 创建时刻, 最近访问时刻]
+        self.heap = []  # (预计到期时刻, sid)，每个会话至多一项；访问只更新时间戳，弹出时再核对
+        self.expired = self.evicted = 0
+
+    def _deadline(self, entry) -> float:
+        return min(entry[1] + self.absolute_ttl, entry[2] + self.idle_ttl)
+
+    def get(self, sid):
+        now = time.time()
+        with self.lock:
+            entry = self.data.get(sid)
+            if entry is None: return None
+            if self._deadline(entry) <= now:
+                del self.data[sid]
+                self.expired += 1
+                return None
+            entry[2] = now
+            self.data.move_to_end(sid)
+            return dict(entry[0])
+
+    def create(self, data: dict) -> str:
+        sid, now = secrets.token_urlsafe(32), time.time()
+        with self.lock:
+            entry = self.data[sid] = [dict(data), now, now]
+            heapq.heappush(self.heap, (self._deadline(entry), sid))
+            while len(self.data) > self.max_sessions:
+                self.data.popitem(last=False)
+                self.evicted += 1
+        return sid
+
+    def delete(self, sid):
+        with self.lock:
+            self.data.pop(sid, None)
+
+    # 纯内存操作，直接在事件循环里完成
+    async def get_async(self, sid):
+        return self.get(sid)
+
+    async def create_async(self, data: dict) -> str:
+        return self.create(data)
+
+    async def delete_async(self, sid):
+        self.delete(sid)
+
+    def sweep(self) -> int:
+        """弹出所有预计已到期的堆项：确已过期的删除，期间被访问过的按新的到期时刻放回"""
+        now, removed = time.time(), 0
+        with self.lock:
+            heap = self.heap
+            while heap and heap[0][0] <= now:
+                _, sid = heapq.heappop(heap)
+                entry = self.data.get(sid)
+                if entry is None: continue  # 已注销或被 LRU 淘汰
+                deadline = self._deadline(entry)
+                if deadline <= now:
+                    del self.data[sid]
+                    removed += 1
+                else:
+                    heapq.heappush(heap, (deadline, sid))
+            self.expired += removed
+            # 注销 / 淘汰留下的失效堆项过多时重建，内存只与在线会话数成正比
+            if len(heap) > 2 * len(self.data) + 1024:
+                self.heap = [(self._deadline(e), sid) for sid, e in self.data.items()]
+                heapq.heapify(self.heap)
+        return removed
+
+    def close(self):
+        pass
+
+    def stats(self) -> dict:
+        return {"backend": "memory", "live": len(self.data), "expired": self.expired, "evicted": self.evicted,
+                "heap_size": len(self.heap), "max_sessions": self.max_sessions}
+
+
+class SQLiteSessionStore:
+    """所有 worker 共享同一张会话表；会话数据以 JSON 存储。
+    最近访问时刻每 SESSION_TOUCH_INTERVAL 秒才回写一次，避免每个请求都产生写事务"""
+
+    def __init__(self, path: str, absolute_ttl: float, idle_ttl: float, max_sessions: int):
+        self.absolute_ttl, self.idle_ttl, self.max_sessions = absolute_ttl, idle_ttl, max_sessions
+        self.pool = ConnectionPool(path)
+        self.expired = self.evicted = 0
+        with self.pool.connection() as c:
+            migrate(c, SESSION_MIGRATIONS, path)
+        # 与数据访问层一样：读（含顺带的 last_seen 回写）走读线程池，创建 / 注销交给写线程
+        self.get_async = _async(self.get)
+        self.create_async = _async(self.create, write=True)
+        self.delete_async = _async(self.delete, write=True)
+
+    def get(self, sid):
+        now = time.time()
+        with self.pool.connection() as c:
+            r = c.execute("SELECT data, expires_at, last_seen FROM sessions WHERE sid = ?", (sid,)).fetchone()
+            if r is None: return None
+            if r["expires_at"] <= now or r["last_seen"] + self.idle_ttl <= now:
+                c.execute("DELETE FROM sessions WHERE sid = ?", (sid,))
+                c.commit()
+                self.expired += 1
+                return None
+            if now - r["last_seen"] >= SESSION_TOUCH_INTERVAL:
+                c.execute("UPDATE sessions SET last_seen = ? WHERE sid = ?", (now, sid))
+                c.commit()
+            return json.loads(r["data"])
+
+    def create(self, data: dict) -> str:
+        sid, now = secrets.token_urlsafe(32), time.time()
+        with self.pool.connection() as c:
+            c.execute("INSERT INTO sessions (sid, data, created_at, expires_at, last_seen) VALUES (?,?,?,?,?)",
+                      (sid, json.dumps(data, ensure_ascii=False), now, now + self.absolute_ttl, now))
+            c.commit()
+        return sid
+
+    def delete(self, sid):
+        with self.pool.connection() as c:
+            c.execute("DELETE FROM sessions WHERE sid = ?", (sid,))
+            c.commit()
+
+    def sweep(self) -> int:
+        """删除绝对 / 空闲超时的会话（两列各有索引），再按最近访问时刻淘汰超出上限的部分"""
+        now = time.time()
+        with self.pool.connection() as c:
+            removed = c.execute("DELETE FROM sessions WHERE expires_at <= ? OR last_seen <= ?",
+                                (now, now - self.idle_ttl)).rowcount
+            over = c.execute("SELECT COUNT(*) FROM sessions").fetchone()[0] - self.max_sessions
+            if over > 0:
+                self.evicted += c.execute("""DELETE FROM sessions WHERE sid IN
+                    (SELECT sid FROM sessions ORDER BY last_seen LIMIT ?)""", (over,)).rowcount
+            c.commit()
+        self.expired += removed
+        return removed
+
+    def close(self):
+        self.pool.close_all()
+
+    def stats(self) -> dict:
+        with self.pool.connection() as c:
+            live = c.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+        return {"backend": "sqlite", "live": live, "expired": self.expired, "evicted": self.evicted,
+                "max_sessions": self.max_sessions}
+
+
+class CachedSessionStore:
+    """共享存储前的本地读缓存：命中且未超过 ttl 秒直接返回；本进程的写操作同步更新缓存，
+    其他 worker 的注销最多延迟 ttl 秒可见"""
+
+    def __init__(self, backend, ttl: float):
+        self.backend, self.ttl = backend, ttl
+        self.lock = threading.Lock()
+        self.cache = {}  # sid -> (过期时刻, 会话数据 / None)
+        self.hits = self.misses = 0
+
+    def _cached(self, sid):
+        """(是否命中, 会话数据)"""
+        now = time.monotonic()
+        with self.lock:
+            entry = self.cache.get(sid)
+            if entry is not None and entry[0] > now:
+                self.hits += 1
+                return True, (dict(entry[1]) if entry[1] is not None else None)
+            self.misses += 1
+        return False, None
+
+    def _remember(self, sid, s):
+        now = time.monotonic()
+        with self.lock:
+            self.cache[sid] = (now + self.ttl, s)
+            # 顺带清掉过期的缓存项，缓存大小只和最近 ttl 秒内的活跃会话数有关
+            if len(self.cache) > 1024:
+                self.cache = {k: v for k, v in self.cache.items() if v[0] > now}
+        return dict(s) if s is not None else None
+
+    def get(self, sid):
+        hit, s = self._cached(sid)
+        return s if hit else self._remember(sid, self.backend.get(sid))
+
+    async def get_async(self, sid):
+        hit, s = self._cached(sid)
+        return s if hit else self._remember(sid, await self.backend.get_async(sid))
+
+    def create(self, data: dict) -> str:
+        sid = self.backend.create(data)
+        self._remember(sid, dict(data))
+        return sid
+
+    async def create_async(self, data: dict) -> str:
+        sid = await self.backend.create_async(data)
+        self._remember(sid, dict(data))
+        return sid
+
+    def delete(self, sid):
+        self.backend.delete(sid)
+        with self.lock:
+            self.cache.pop(sid, None)
+
+    async def delete_async(self, sid):
+        await self.backend.delete_async(sid)
+        with self.lock:
+            self.cache.pop(sid, None)
+
+    def sweep(self) -> int:
+        now = time.monotonic()
+        with self.lock:
+            self.cache = {k: v for k, v in self.cache.items() if v[0] > now}
+        return self.backend.sweep()
+
+    def close(self):
+        self.backend.close()
+
+    def stats(self) -> dict:
+        return {**self.backend.stats(), "cache_ttl": self.ttl, "cache_size": len(self.cache),
+                "cache_hits": self.hits, "cache_misses": self.misses}
+
+
+def make_session_store(backend: str, path: str, cache_ttl: float):
+    if backend == "memory": return MemorySessionStore(SESSION_ABSOLUTE_TTL, SESSION_IDLE_TTL, SESSION_MAX)
+    if backend == "sqlite":
+        store = SQLiteSessionStore(path, SESSION_ABSOLUTE_TTL, SESSION_IDLE_TTL, SESSION_MAX)
+        return CachedSessionStore(store, cache_ttl) if cache_ttl > 0 else store
+    raise ValueError(f"未知的会话存储类型: {backend}")
+
+
+session_store = make_session_store(SESSION_BACKEND, SESSION_DB, SESSION_CACHE_TTL)
+
+
+async def session_sweep_loop():
+    """后台定时清理过期会话（lifespan 中启动）"""
+    while True:
+        await asyncio.sleep(SESSION_SWEEP_INTERVAL)
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, session_store.sweep)
+        except Exception as e:
+            print(f"⚠️ 会话清理失败: {e}")
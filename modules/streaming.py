@@ -0,0 +1,211 @@
+# modules/streaming.py
+import os, mmap, mimetypes, secrets
+from email.utils import formatdate, parsedate_to_datetime
+from typing import List, Optional, Tuple
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import Response
+from .config import STREAM_CHUNK_SIZE, STREAM_MAX_RANGES
+from .segment_cache import segment_cache
+from .bandwidth import scheduler
+
+# 🌟 Range 引擎：解析 Range / If-Range / If-None-Match，按 206 / 200 / 304 / 416 返回
+# 优先走 ASGI 的 zerocopysend 扩展（服务器内部用 os.sendfile 直接写 socket），
+# 服务器不支持时退回 mmap：数据直接从页缓存切片，不再逐块 f.read()
+
+
+def make_etag(st: os.stat_result) -> str:
+    """由文件大小与修改时间生成强 ETag"""
+    return f'"{st.st_size:x}-{st.st_mtime_ns:x}"'
+
+
+def parse_range_header(range_header: Optional[str], file_size: int) -> Optional[List[Tuple[int, int]]]:
+    """解析 Range 头：返回 None 表示忽略（按整文件 200 返回），返回 [] 表示无法满足（416）"""
+    if not range_header:
+        return None
+    unit, _, spec = range_header.partition("=")
+    if unit.strip().lower() != "bytes" or not spec.strip():
+        return None
+    ranges = []
+    for part in spec.split(","):
+        part = part.strip()
+        if not part: continue
+        first, sep, last = part.partition("-")
+        first, last = first.strip(), last.strip()
+        if not sep or not (first.isdigit() or last.isdigit()):
+            return None  # 语法错误：按 RFC 7233 忽略整个 Range 头
+        if first and last and not (first.isdigit() and last.isdigit()):
+            return None
+        if not first:
+            # 后缀区间 bytes=-500：取最后 500 字节
+            length = int(last)
+            if length == 0: continue
+            start, end = max(file_size - length, 0), file_size - 1
+        else:
+            start = int(first)
+            end = int(last) if last else file_size - 1
+            if last and end < start: return None
+            end = min(end, file_size - 1)
+        if start >= file_size: continue
+        ranges.append((start, end))
+    if len(ranges) > STREAM_MAX_RANGES:
+        return None  # 区间过多视为滥用，直接回整文件
+    return _coalesce(ranges)
+
+
+def _coalesce(ranges: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+    """合并重叠/相邻区间，防止同一段数据被重复发送"""
+    if len(ranges) < 2: return ranges
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def _etag_list(header: str) -> List[str]:
+    return [t.strip() for t in header.split(",") if t.strip()]
+
+
+def _if_none_match(header: Optional[str], etag: str) -> bool:
+    """If-None-Match 采用弱比较，命中则返回 304"""
+    if not header: return False
+    tags = [t[2:] if t.startswith("W/") else t for t in _etag_list(header)]
+    return "*" in tags or etag in tags
+
+
+def _if_range_ok(header: Optional[str], etag: str, st: os.stat_result) -> bool:
+    """If-Range 采用强比较：ETag 或 Last-Modified 不一致时忽略 Range，回整文件"""
+    if not header: return True
+    header = header.strip()
+    if header.startswith('"') or header.startswith("W/"):
+        return header == etag
+    try:
+        return int(parsedate_to_datetime(header).timestamp()) == int(st.st_mtime)
+    except (TypeError, ValueError):
+        return False
+
+
+class RangeFileResponse(Response):
+    """把文件的若干区间写给客户端：单区间直接发送，多区间按 multipart/byteranges 封装"""
+
+    def __init__(self, path: str, st: os.stat_result, ranges: List[Tuple[int, int]], status_code: int,
+                 headers: dict, media_type: str, send_body: bool = True, client: Optional[tuple] = None):
+        self.path, self.st, self.ranges, self.send_body = path, st, ranges, send_body
+        self.client = client  # (用户名, ip, 码率)，用于出口带宽调度
+        self.status_code = status_code
+        self.media_type = media_type
+        self.background = None
+        self.parts = []  # [(前缀字节, start, end)]，多区间时前缀为分段头
+        if len(ranges) > 1:
+            boundary = secrets.token_hex(12)
+            for start, end in ranges:
+                prefix = (f"\r\n--{boundary}\r\nContent-Type: {media_type}\r\n"
+                          f"Content-Range: bytes {start}-{end}/{st.st_size}\r\n\r\n").encode("latin-1")
+                self.parts.append((prefix, start, end))
+            self.epilogue = f"\r\n--{boundary}--\r\n".encode("latin-1")
+            headers["Content-Type"] = f"multipart/byteranges; boundary={boundary}"
+        else:
+            self.parts = [(b"", start, end) for start, end in ranges]
+            self.epilogue = b""
+        length = sum(len(p) + e - s + 1 for p, s, e in self.parts) + len(self.epilogue)
+        headers["Content-Length"] = str(length)
+        self.init_headers(headers)
+
+    async def __call__(self, scope, receive, send):
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        if not self.send_body or not self.parts:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+        close = None
+        if self.client is not None:
+            send, close = scheduler.wrap(send, *self.client)
+        try:
+            await self._send_body(scope, send)
+        finally:
+            if close is not None: close()
+
+    async def _send_body(self, scope, send):
+        zerocopy = "http.response.zerocopysend" in scope.get("extensions", {})
+        if not zerocopy and segment_cache.enabled:
+            await self._send_cached(send)
+            return
+        with open(self.path, "rb") as f:
+            if zerocopy:
+                await self._send_zerocopy(f, send)
+            else:
+                mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                try:
+                    await self._send_mmap(mm, send)
+                finally:
+                    mm.close()
+
+    async def _send_zerocopy(self, f, send):
+        for prefix, start, end in self.parts:
+            if prefix: await send({"type": "http.response.body", "body": prefix, "more_body": True})
+            await send({"type": "http.response.zerocopysend", "file": f, "offset": start,
+                        "count": end - start + 1, "more_body": True})
+        await send({"type": "http.response.body", "body": self.epilogue, "more_body": False})
+
+    async def _send_cached(self, send):
+        """经热点分片缓存发送：整段命中时直接复用缓存中的 bytes 对象，只有区间首尾需要切片"""
+        seg_size = segment_cache.segment_size
+        for prefix, start, end in self.parts:
+            if prefix: await send({"type": "http.response.body", "body": prefix, "more_body": True})
+            pos = start
+            while pos <= end:
+                seg_off = pos - pos % seg_size
+                seg = await segment_cache.get(self.path, self.st, seg_off)
+                stop = min(end + 1, seg_off + len(seg))
+                if stop <= pos: break  # 文件在发送过程中被截断
+                chunk = seg if (pos == seg_off and stop == seg_off + len(seg)) else seg[pos - seg_off:stop - seg_off]
+                await send({"type": "http.response.body", "body": chunk, "more_body": True})
+                pos = stop
+        await send({"type": "http.response.body", "body": self.epilogue, "more_body": False})
+
+    async def _send_mmap(self, mm, send):
+        for prefix, start, end in self.parts:
+            if prefix: await send({"type": "http.response.body", "body": prefix, "more_body": True})
+            pos = start
+            while pos <= end:
+                stop = min(pos + STREAM_CHUNK_SIZE, end + 1)
+                # 冷数据切片可能触发缺页读盘，放到线程池避免卡住事件循环
+                chunk = await run_in_threadpool(mm.__getitem__, slice(pos, stop))
+                await send({"type": "http.response.body", "body": chunk, "more_body": True})
+                pos = stop
+        await send({"type": "http.response.body", "body": self.epilogue, "more_body": False})
+
+
+def send_video_range(file_path: str, request_headers, method: str = "GET", client: Optional[tuple] = None) -> Response:
+    """视频流入口：保持原有 206 头部约定（inline、长缓存、keep-alive），同时补齐条件请求"""
+    st = os.stat(file_path)
+    file_size = st.st_size
+    etag = make_etag(st)
+    mime_type = mimetypes.guess_type(file_path)[0] or "video/mp4"
+    headers = {
+        "Accept-Ranges": "bytes",
+        "Content-Type": mime_type,
+        "Cache-Control": "public, max-age=31536000",
+        "X-Content-Type-Options": "nosniff",
+        "Content-Disposition": "inline",
+        "Connection": "keep-alive",
+        "ETag": etag,
+        "Last-Modified": formatdate(st.st_mtime, usegmt=True),
+    }
+    if _if_none_match(request_headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers={k: headers[k] for k in ("ETag", "Cache-Control", "Last-Modified")})
+
+    send_body = method != "HEAD"
+    ranges = None
+    if _if_range_ok(request_headers.get("if-range"), etag, st):
+        ranges = parse_range_header(request_headers.get("range"), file_size)
+    if ranges is None:
+        whole = [(0, file_size - 1)] if file_size else []
+        return RangeFileResponse(file_path, st, whole, 200, headers, mime_type, send_body, client)
+    if not ranges:
+        return Response(status_code=416, headers={"Content-Range": f"bytes */{file_size}", "Accept-Ranges": "bytes"})
+    if len(ranges) == 1:
+        start, end = ranges[0]
+        headers["Content-Range"] = f"bytes {start}-{end}/{file_size}"
+    return RangeFileResponse(file_path, st, ranges, 206, headers, mime_type, send_body, client)
@@ -0,0 +1,128 @@
+# modules/submissions.py
+import asyncio, io, json, time
+from datetime import datetime
+from .database import db_get_questions_async, get_user_info_async, db_get_progress_async, db_claim_submission_async, \
+    db_complete_submission_async, db_fail_submission_async, db_pending_submissions_async
+from .config import FINISH_WORKERS, FINISH_POLL_INTERVAL, FINISH_STALE_SECONDS, FINISH_MAX_TRIES
+
+# 🌟 交卷流水线：考试结束全班同时交卷时，/finish-test 只做一次写事务（状态置为已交卷 + 快照作答）就返回，
+# 判分、生成三段式报告、保存成绩单由后台 worker 完成；个人中心在生成期间显示“生成中”。
+# 提交状态在数据库里：进程重启或多 worker 部署时，定时扫描会认领遗留 / 其他进程的待处理提交
+
+
+def grade_of(score: int, total: int) -> str:
+    ratio = score / total if total > 0 else 0
+    return "A" if ratio >= 0.75 else "B" if ratio >= 0.50 else "C" if ratio >= 0.25 else "D"
+
+
+def render_report(u, nickname, finished, duration, qs, ans, video_progs, total_score, grade) -> str:
+    """生成实验考核报告正文（答题总览 / 题目详细解析 / 课件进度存档）"""
+    duration_str = f"{int(duration) // 60}分{int(duration) % 60}秒"
+    with io.StringIO() as f:
+        f.write("=" * 70 + "\n        深圳大学神经语言学实验室 - 实验考核报告\n" + "=" * 70 + "\n")
+        f.write(
+            f"用户昵称: {nickname} | 账号: {u}\n考核时间: {finished.strftime('%Y-%m-%d %H:%M:%S')} | 耗时: {duration_str}\n最终成绩: {total_score}/{len(qs)} | 评级: {grade}\n\n")
+
+        # 第一部分：答题总览
+        f.write("-" * 22 + " [第一部分：答题总览] " + "-" * 22 + "\n")
+        f.write(f"{'题号':<10}{'用户作答':<15}{'正确答案':<15}{'结果':<10}\n")
+        for i, q in enumerate(qs, 1):
+            ua = ans.get(q['id'], {})
+            u_opt = ua.get('selected_option', '-')
+            res = "√" if ua.get('is_correct') else "×"
+            f.write(f"{i:<12}{u_opt:<18}{q['answer']:<18}{res:<10}\n")
+
+        # 第二部分：详细解析
+        f.write("\n" + "-" * 22 + " [第二部分：题目详细解析] " + "-" * 22 + "\n")
+        for i, q in enumerate(qs, 1):
+            ua = ans.get(q['id'], {})
+            f.write(
+                f"题{i}: {q['content']}\n选项: A:{q['option_a']} B:{q['option_b']} C:{q['option_c']} D:{q['option_d']}\n")
+            f.write(
+                f"用户作答: {ua.get('selected_option', '未填')} | 正确答案: {q['answer']} | {'√' if ua.get('is_correct') else '×'}\n" + "-" * 30 + "\n")
+
+        # 第三部分：学习进度
+        f.write("\n" + "-" * 22 + " [第三部分：课件进度存档] " + "-" * 22 + "\n")
+        if video_progs:
+            f.write(f"{'课件名称':<40}{'观看进度':<10}\n")
+            for vp in video_progs:
+                f.write(f"{vp['title']:<43}{vp['progress']:<10}\n")
+        else:
+            f.write("暂无课件观看记录。\n")
+        f.write("\n报告由系统自动生成。")
+        return f.getvalue()
+
+
+class SubmissionPipeline:
+    def __init__(self, workers: int):
+        self.workers = workers
+        self.queue, self.tasks = None, []
+        self.queued = set()  # 已在队列中的提交 id，避免扫描时重复入队
+        self.done = self.failed = 0
+
+    def start(self):
+        self.queue = asyncio.Queue()
+        self.tasks = [asyncio.ensure_future(self._worker()) for _ in range(self.workers)]
+        self.tasks.append(asyncio.ensure_future(self._poll()))
+
+    async def stop(self):
+        for t in self.tasks: t.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+
+    def enqueue(self, sid: int):
+        if self.queue is None or sid in self.queued: return  # 未启动时交给下次启动后的扫描
+        self.queued.add(sid)
+        self.queue.put_nowait(sid)
+
+    async def _poll(self):
+        while True:
+            try:
+                for sid in await db_pending_submissions_async(time.time() - FINISH_STALE_SECONDS):
+                    self.enqueue(sid)
+            except Exception as e:
+                print(f"⚠️ 扫描待处理交卷失败: {e}")
+            await asyncio.sleep(FINISH_POLL_INTERVAL)
+
+    async def _worker(self):
+        while True:
+            sid = await self.queue.get()
+            self.queued.discard(sid)
+            try:
+                await self.process(sid)
+            except Exception as e:
+                self.failed += 1
+                print(f"⚠️ 交卷 {sid} 生成成绩单失败: {e}")
+                try:
+                    await db_fail_submission_async(sid, str(e), FINISH_MAX_TRIES)
+                except Exception:
+                    pass  # 状态保持 processing，超时后由扫描重新认领
+
+    async def process(self, sid: int):
+        sub = await db_claim_submission_async(sid, time.time() - FINISH_STALE_SECONDS)
+        if sub is None: return  # 已被其他 worker / 进程认领或完成
+        u = sub["username"]
+        u_info = await get_user_info_async(u)
+        qs = await db_get_questions_async()
+        video_progs = await db_get_progress_async(u)
+        ans = {int(qid): {"selected_option": opt, "is_correct": ok}
+               for qid, (opt, ok) in json.loads(sub["answers"] or "{}").items()}
+        total_score = sum(1 for q in qs if ans.get(q['id'], {}).get('is_correct'))
+        grade = grade_of(total_score, len(qs))
+        start_ts = sub["started_at"] or sub["submitted_at"]
+        finished = datetime.fromtimestamp(sub["submitted_at"]).replace(microsecond=0)
+        report = await asyncio.get_running_loop().run_in_executor(
+            None, render_report, u, u_info["nickname"] if u_info else "未知", finished,
+            sub["submitted_at"] - start_ts, qs, ans, video_progs, total_score, grade)
+        # 保留题目级作答历史（含未作答的题）供题目分析
+        rows = [(q['id'], ans.get(q['id'], {}).get('selected_option'), ans.get(q['id'], {}).get('is_correct'))
+                for q in qs]
+        await db_complete_submission_async(sid, u, datetime.fromtimestamp(start_ts).replace(microsecond=0), finished,
+                                           total_score, len(qs), grade, report.encode("utf-8"), rows)
+        self.done += 1
+
+    def stats(self) -> dict:
+        return {"workers": self.workers, "queued": len(self.queued), "done": self.done, "failed": self.failed}
+
+
+submission_pipeline = SubmissionPipeline(FINISH_WORKERS)
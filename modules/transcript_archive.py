@@ -0,0 +1,123 @@
+# modules/transcript_archive.py
+import os, re, struct, sys, zlib
+from .config import ARCHIVE_DIR, ARCHIVE_SEGMENT_BYTES
+
+# 🌟 成绩单归档：不再每份成绩单一个小 TXT，而是压缩后追加写入分段文件 seg-000001.bin …
+# 每段写满 ARCHIVE_SEGMENT_BYTES 后换下一段；records 表里的 (owner, seq) 唯一索引记录
+# (段号, 偏移, 长度)，读取一份成绩单只需一次 seek + read。
+# 每条记录自带头部（账号、序号、CRC），即使索引丢失也能顺序扫描重建
+
+_MAGIC = b"TRA1"
+_HEADER = struct.Struct("<4sIIIIH")  # magic, seq, crc32(原文), 原文长度, 压缩后长度, 账号字节数
+
+
+class ArchiveError(Exception):
+    pass
+
+
+class TranscriptArchive:
+    def __init__(self, directory: str, segment_bytes: int):
+        self.directory, self.segment_bytes = directory, segment_bytes
+
+    def _path(self, segment: int) -> str:
+        return os.path.join(self.directory, f"seg-{segment:06d}.bin")
+
+    def segments(self) -> list:
+        if not os.path.isdir(self.directory): return []
+        return sorted(int(m.group(1)) for m in (re.fullmatch(r"seg-(\d+)\.bin", n) for n in os.listdir(self.directory)) if m)
+
+    def _writable_segment(self) -> int:
+        # 每次追加都按目录现状挑选：多进程同时换段时最多各自追加到同一个新段，互不覆盖
+        segs = self.segments()
+        if not segs: return 1
+        last = segs[-1]
+        return last + 1 if os.path.getsize(self._path(last)) >= self.segment_bytes else last
+
+    def append(self, owner: str, seq: int, data: bytes):
+        """追加一条记录，返回 (段号, 偏移, 长度)；调用方在同一数据库写事务内登记索引"""
+        os.makedirs(self.directory, exist_ok=True)
+        name = owner.encode("utf-8")
+        comp = zlib.compress(data, 6)
+        frame = _HEADER.pack(_MAGIC, seq, zlib.crc32(data), len(data), len(comp), len(name)) + name + comp
+        segment = self._writable_segment()
+        # 追加模式下一次 write 写入整条记录，写完后的位置减去长度即为本条偏移
+        with open(self._path(segment), "ab") as f:
+            f.write(frame)
+            f.flush()
+            offset = f.tell() - len(frame)
+            os.fsync(f.fileno())
+        return segment, offset, len(frame)
+
+    def _decode(self, frame: bytes):
+        magic, seq, crc, raw_len, comp_len, name_len = _HEADER.unpack_from(frame)
+        if magic != _MAGIC: raise ArchiveError("归档记录头部损坏")
+        start = _HEADER.size + name_len
+        try:
+            data = zlib.decompress(frame[start:start + comp_len])
+        except zlib.error:
+            raise ArchiveError("归档记录数据损坏")
+        if len(data) != raw_len or zlib.crc32(data) != crc: raise ArchiveError("归档记录校验失败")
+        return frame[_HEADER.size:start].decode("utf-8"), seq, data
+
+    def read(self, segment: int, offset: int, length: int) -> bytes:
+        with open(self._path(segment), "rb") as f:
+            f.seek(offset)
+            frame = f.read(length)
+        if len(frame) != length: raise ArchiveError("归档记录不完整")
+        return self._decode(frame)[2]
+
+    def scan(self, segment: int):
+        """顺序扫描一个段，产出 (账号, 序号, 偏移, 长度)，用于校验或重建索引"""
+        with open(self._path(segment), "rb") as f:
+            offset = 0
+            while True:
+                head = f.read(_HEADER.size)
+                if len(head) < _HEADER.size: return
+                _, seq, _, _, comp_len, name_len = _HEADER.unpack(head)
+                length = _HEADER.size + name_len + comp_len
+                owner = self._decode(head + f.read(length - _HEADER.size))[0]
+                yield owner, seq, offset, length
+                offset += length
+
+
+transcript_archive = TranscriptArchive(ARCHIVE_DIR, ARCHIVE_SEGMENT_BYTES)
+
+
+# --- 一次性迁移工具：python -m modules.transcript_archive migrate [--delete] / verify ---
+def _migrate(delete: bool):
+    from .database import init_db, db_list_records, db_archive_existing
+    from .config import DATA_DIR
+    init_db()
+    moved = 0
+    for rec in db_list_records():
+        if rec["segment"] is not None: continue
+        path = os.path.join(DATA_DIR, rec["path"])
+        if not os.path.exists(path):
+            print(f"⚠️ 缺少存档文件，跳过: {rec['path']}")
+            continue
+        with open(path, "rb") as f:
+            data = f.read()
+        db_archive_existing(rec["id"], rec["owner"], rec["seq"], data)
+        if delete: os.remove(path)
+        moved += 1
+    print(f"📦 已归档 {moved} 份成绩单" + ("，原 TXT 已删除" if delete else "（原 TXT 保留，确认无误后可加 --delete 重新运行清理）"))
+
+
+def _verify():
+    from .database import db_list_records
+    index = {(r["owner"], r["seq"]): r for r in db_list_records() if r["segment"] is not None}
+    seen = 0
+    for segment in transcript_archive.segments():
+        for owner, seq, offset, length in transcript_archive.scan(segment):
+            r = index.get((owner, seq))
+            if r is not None and (r["segment"], r["seg_offset"], r["seg_length"]) == (segment, offset, length): seen += 1
+    missing = len(index) - seen
+    print(f"🔎 索引 {len(index)} 条，段文件中定位一致 {seen} 条，不一致 / 缺失 {missing} 条")
+    return missing == 0
+
+
+if __name__ == "__main__":
+    cmd = sys.argv[1] if len(sys.argv) > 1 else ""
+    if cmd == "migrate": _migrate("--delete" in sys.argv)
+    elif cmd == "verify": sys.exit(0 if _verify() else 1)
+    else: print("用法: python -m modules.transcript_archive migrate [--delete] | verify")
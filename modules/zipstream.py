@@ -0,0 +1,93 @@
+# modules/zipstream.py
+import io, os, struct, time, zlib
+
+# 🌟 流式 ZIP 打包：边读文件边压缩边产出字节，不在内存里攒整个压缩包，第一个字节立即可发。
+# 每个条目先写本地文件头（大小未知，置 bit 3），数据之后跟数据描述符，最后输出中央目录；
+# 超过 4GB 的条目 / 偏移自动使用 ZIP64 扩展字段。
+# zip_stream 是同步生成器：交给 StreamingResponse 时 Starlette 会在线程池里迭代，压缩不占用事件循环
+
+_READ_SIZE = 64 * 1024
+_FLUSH_SIZE = 64 * 1024  # 小文件很多时攒够这么多再产出一次，减少线程池往返
+_ZIP32_MAX = 0xFFFFFFFF
+_UTF8_FLAG, _DESCRIPTOR_FLAG = 0x0800, 0x0008
+
+
+def _dos_time(ts: float):
+    t = time.localtime(ts)
+    if t.tm_year < 1980: return 0, (1 << 5) | 1
+    return (t.tm_hour << 11) | (t.tm_min << 5) | (t.tm_sec // 2), ((t.tm_year - 1980) << 9) | (t.tm_mon << 5) | t.tm_mday
+
+
+def zip_stream(entries, compress: bool = True):
+    """entries 为 (压缩包内文件名, 来源) 的可迭代对象：来源是磁盘路径，或返回 bytes 的无参函数
+    （如从归档读取的成绩单）；不存在的文件 / 返回 None 的来源直接跳过"""
+    method = 8 if compress else 0
+    central, offset, buf = [], 0, bytearray()
+
+    def emit(data):
+        nonlocal offset
+        buf.extend(data)
+        offset += len(data)
+
+    for arcname, source in entries:
+        if callable(source):
+            data = source()
+            if data is None: continue
+            f, size_hint, mtime = io.BytesIO(data), len(data), time.time()
+        else:
+            try:
+                f = open(source, "rb")
+            except FileNotFoundError:
+                continue
+            st = os.fstat(f.fileno())
+            size_hint, mtime = st.st_size, st.st_mtime
+        with f:
+            name = arcname.encode("utf-8")
+            dos_time, dos_date = _dos_time(mtime)
+            # 源文件接近 4GB 时预先声明 ZIP64，数据描述符随之改用 8 字节长度
+            zip64 = size_hint >= 0xF0000000
+            header_offset = offset
+            extra = struct.pack("<HHQQ", 0x0001, 16, 0, 0) if zip64 else b""
+            emit(struct.pack("<IHHHHHIIIHH", 0x04034B50, 45 if zip64 else 20, _UTF8_FLAG | _DESCRIPTOR_FLAG, method,
+                             dos_time, dos_date, 0, _ZIP32_MAX if zip64 else 0, _ZIP32_MAX if zip64 else 0,
+                             len(name), len(extra)) + name + extra)
+            crc, size, comp_size = 0, 0, 0
+            compressor = zlib.compressobj(6, zlib.DEFLATED, -15) if compress else None
+            while True:
+                chunk = f.read(_READ_SIZE)
+                if not chunk: break
+                crc = zlib.crc32(chunk, crc)
+                size += len(chunk)
+                out = compressor.compress(chunk) if compress else chunk
+                comp_size += len(out)
+                emit(out)
+                if len(buf) >= _FLUSH_SIZE:
+                    yield bytes(buf); buf.clear()
+            if compress:
+                out = compressor.flush()
+                comp_size += len(out)
+                emit(out)
+        zip64 = zip64 or size > _ZIP32_MAX or comp_size > _ZIP32_MAX
+        emit(struct.pack("<IIQQ" if zip64 else "<IIII", 0x08074B50, crc, comp_size, size))
+        central.append((name, method, dos_time, dos_date, crc, comp_size, size, header_offset))
+        if len(buf) >= _FLUSH_SIZE:
+            yield bytes(buf); buf.clear()
+
+    cd_start = offset
+    for name, method, dos_time, dos_date, crc, comp_size, size, header_offset in central:
+        # ZIP64 扩展字段只包含溢出的那几项，顺序固定为 原始大小、压缩后大小、本地头偏移
+        fields = [v for v in (size, comp_size, header_offset) if v >= _ZIP32_MAX]
+        extra = struct.pack("<HH", 0x0001, 8 * len(fields)) + struct.pack(f"<{len(fields)}Q", *fields) if fields else b""
+        clamp = lambda v: _ZIP32_MAX if v >= _ZIP32_MAX else v
+        emit(struct.pack("<IHHHHHHIIIHHHHHII", 0x02014B50, 45 if fields else 20, 45 if fields else 20,
+                         _UTF8_FLAG | _DESCRIPTOR_FLAG, method, dos_time, dos_date, crc, clamp(comp_size), clamp(size),
+                         len(name), len(extra), 0, 0, 0, 0, clamp(header_offset)) + name + extra)
+    cd_size, count = offset - cd_start, len(central)
+    if count >= 0xFFFF or cd_start >= _ZIP32_MAX or cd_size >= _ZIP32_MAX:
+        zip64_eocd = offset
+        emit(struct.pack("<IQHHIIQQQQ", 0x06064B50, 44, 45, 45, 0, 0, count, count, cd_size, cd_start))
+        emit(struct.pack("<IIQI", 0x07064B50, 0, zip64_eocd, 1))
+        emit(struct.pack("<IHHHHIIH", 0x06054B50, 0, 0, 0xFFFF, 0xFFFF, _ZIP32_MAX, _ZIP32_MAX, 0))
+    else:
+        emit(struct.pack("<IHHHHIIH", 0x06054B50, 0, 0, count, count, cd_size, cd_start, 0))
+    yield bytes(buf)
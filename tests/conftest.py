@@ -0,0 +1,60 @@
+# tests/conftest.py
+import contextlib, os, shutil, sys, tempfile
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# 🌟 数据库、Data/、模板与缓存目录都是相对路径：整个测试会话切到临时目录运行（复制模板与静态资源），
+# 不会读写仓库里的 users.db / Data/
+WORKDIR = tempfile.mkdtemp(prefix="teaching-platform-tests-")
+shutil.copytree(os.path.join(ROOT, "templates"), os.path.join(WORKDIR, "templates"))
+shutil.copytree(os.path.join(ROOT, "static"), os.path.join(WORKDIR, "static"),
+                ignore=shutil.ignore_patterns("uploads", "videos"))
+os.chdir(WORKDIR)
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+def fresh_db():
+    """每个用例使用全新的数据库文件与 Data/ 目录"""
+    from modules.database import close_db, init_db
+    from modules.question_bank import question_bank
+    close_db()
+    for name in os.listdir("."):
+        if name.startswith(("users.db", "resources.db", "sessions.db")): os.remove(name)
+    shutil.rmtree("Data", ignore_errors=True)
+    os.makedirs("Data")
+    question_bank.invalidate()
+    init_db()
+    yield
+    close_db()
+
+
+@pytest.fixture
+def app_client(fresh_db):
+    """运行 lifespan（启动后台任务）并返回客户端工厂：make(cookies=None) -> httpx.AsyncClient"""
+    import httpx
+    from app import app
+
+    @contextlib.asynccontextmanager
+    async def running():
+        async with app.router.lifespan_context(app):
+            transport = httpx.ASGITransport(app=app)
+            clients = []
+
+            def make(cookies=None):
+                c = httpx.AsyncClient(transport=transport, base_url="http://testserver", cookies=cookies)
+                clients.append(c)
+                return c
+
+            try:
+                yield make
+            finally:
+                for c in clients: await c.aclose()
+
+    return running
@@ -0,0 +1,64 @@
+# tests/test_assets.py
+import gzip, os, re
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_fingerprinted_url_and_encoding_negotiation(app_client):
+    from modules.assets import assets, brotli
+    with open("static/css/global.css", "rb") as f:
+        source = f.read()
+    async with app_client() as make:  # 启动时构建
+        url = assets.url("css/global.css")
+        assert re.fullmatch(r"/assets/css/global\.[0-9a-f]{12}\.css", url)
+        assert assets.url("uploads/avatar.png") == "/static/uploads/avatar.png"  # 不在流水线内的文件
+        c = make()
+        assert url in (await c.get("/index")).text
+
+        plain = await c.get(url, headers={"Accept-Encoding": "identity"})
+        assert plain.status_code == 200 and plain.content == source
+        assert "content-encoding" not in plain.headers
+        assert plain.headers["cache-control"] == "public, max-age=31536000, immutable"
+        assert plain.headers["vary"] == "Accept-Encoding"
+
+        gz = await c.get(url, headers={"Accept-Encoding": "gzip"})
+        assert gz.headers["content-encoding"] == "gzip" and gz.content == source  # httpx 自动解压
+        assert int(gz.headers["content-length"]) < len(source)
+        # q=0 表示明确拒绝该编码
+        assert "content-encoding" not in (await c.get(url, headers={"Accept-Encoding": "gzip;q=0"})).headers
+        if brotli is not None:
+            assert (await c.get(url, headers={"Accept-Encoding": "gzip, br"})).headers["content-encoding"] == "br"
+
+        # 只接受已构建的带指纹文件名
+        assert (await c.get("/assets/css/global.css")).status_code == 404
+        assert (await c.get("/assets/../app.py")).status_code == 404
+
+
+async def test_etag_revalidation(app_client):
+    from modules.assets import assets
+    async with app_client() as make:
+        url = assets.url("css/global.css")
+        c = make()
+        plain = await c.get(url, headers={"Accept-Encoding": "identity"})
+        gz = await c.get(url, headers={"Accept-Encoding": "gzip"})
+        assert plain.headers["etag"] != gz.headers["etag"]  # 每种编码各自的验证器
+        for r, enc in ((plain, "identity"), (gz, "gzip")):
+            again = await c.get(url, headers={"Accept-Encoding": enc, "If-None-Match": r.headers["etag"]})
+            assert again.status_code == 304 and not again.content
+            assert again.headers["etag"] == r.headers["etag"]
+        assert (await c.get(url, headers={"Accept-Encoding": "gzip", "If-None-Match": plain.headers["etag"]})).status_code == 200
+        assert (await c.get(url, headers={"If-None-Match": 'W/' + plain.headers["etag"],
+                                          "Accept-Encoding": "identity"})).status_code == 304
+
+
+def test_precompressed_files_on_disk():
+    from modules.assets import assets
+    assets.refresh()
+    hashed = assets.manifest["css/global.css"][1]
+    target = os.path.join(assets.build, hashed)
+    with open(target, "rb") as f, open(target + ".gz", "rb") as g:
+        assert gzip.decompress(g.read()) == f.read()
+    assert "gzip" in assets.served[hashed]
+    logo = assets.manifest["szu_logo.png"][1]
+    assert assets.served[logo] == set()  # 图片不预压缩
@@ -0,0 +1,123 @@
+# tests/test_bandwidth.py
+import asyncio
+from types import SimpleNamespace
+import pytest
+from modules.bandwidth import FairScheduler, client_ip
+
+
+def _request(peer, fwd=None):
+    return SimpleNamespace(client=SimpleNamespace(host=peer), headers={"x-forwarded-for": fwd} if fwd else {})
+
+
+def test_forwarded_for_ignored_from_untrusted_peer():
+    assert client_ip(_request("203.0.113.5", "198.51.100.1")) == "203.0.113.5"
+
+
+def test_forwarded_for_from_local_tunnel():
+    assert client_ip(_request("127.0.0.1", "198.51.100.1")) == "198.51.100.1"
+    # 客户端自己填的前缀不可信：取代理追加的最右侧地址
+    assert client_ip(_request("127.0.0.1", "10.0.0.1, 198.51.100.1")) == "198.51.100.1"
+    assert client_ip(_request("::1", "198.51.100.1, 127.0.0.1")) == "198.51.100.1"
+    assert client_ip(_request("127.0.0.1")) == "127.0.0.1"
+
+
+@pytest.mark.anyio
+async def test_parallel_ranges_share_one_priority_allowance():
+    """同一会话 8 路并发请求：优先通道合计只给一份额度，所有字节（含优先字节）都计入会话桶"""
+    quantum, priority = 256 * 1024, 512 * 1024
+    sched = FairScheduler(global_rate=10 ** 9, ip_rate=0, session_rate=4 * 1024 * 1024, pacing_factor=0,
+                          quantum=quantum, priority_bytes=priority)
+    urgent_bytes = []
+
+    async def record_global(client, n, urgent):
+        if urgent: urgent_bytes.append(n)
+
+    async def send(message):
+        pass
+
+    sched._global = record_global
+    streams = [sched.wrap(send, "sid-1", "198.51.100.1") for _ in range(8)]
+    session_bucket = sched.buckets[("sid", "sid-1")][0]
+    burst = session_bucket.tokens
+    await asyncio.gather(*[s({"type": "http.response.body", "body": b"x" * priority, "more_body": False})
+                           for s, _ in streams])
+    assert sum(urgent_bytes) == priority
+    assert burst - session_bucket.tokens >= 8 * priority * 0.95  # 允许运行期间的少量回补
+    for _, close in streams: close()
+    assert sched.buckets[("sid", "sid-1")][1] == 0  # 流都结束了，桶仍保留给下一个 Range 请求
+
+
+@pytest.mark.anyio
+async def test_limits_carry_over_between_range_requests():
+    """上一个请求耗尽的额度不会因为换一个 Range 请求而重置；桶回满后才被清理"""
+    sched = FairScheduler(global_rate=0, ip_rate=0, session_rate=1024 * 1024, pacing_factor=0,
+                          quantum=64 * 1024, priority_bytes=64 * 1024)
+
+    async def send(message):
+        pass
+
+    s, close = sched.wrap(send, "alice", "198.51.100.1")
+    await s({"type": "http.response.body", "body": b"x" * 1024 * 1024, "more_body": False})
+    close()
+    s, close = sched.wrap(send, "alice", "198.51.100.1")
+    bucket, prio = sched.buckets[("sid", "alice")][0], sched.buckets[("prio", "alice")][0]
+    assert bucket.tokens < bucket.burst / 2 and not prio.take(prio.burst)
+    close()
+    sched.pruned_at = 0
+    sched._prune()
+    assert ("sid", "alice") in sched.buckets  # 还没回满
+    for b, _ in sched.buckets.values(): b.stamp -= 3600
+    sched.pruned_at = 0
+    sched._prune()
+    assert not sched.buckets
+
+
+@pytest.mark.anyio
+async def test_zerocopysend_is_split_into_quanta():
+    """零拷贝发送的一整段区间按 quantum 切成 offset/count 小段，每段单独过闸"""
+    quantum = 64 * 1024
+    sched = FairScheduler(global_rate=0, ip_rate=0, session_rate=10 ** 9, pacing_factor=0,
+                          quantum=quantum, priority_bytes=0)
+    sent, gated = [], []
+    real_delay = sched._bucket("sid", "bob", sched.session_rate).delay
+    sched._release("sid", "bob")
+
+    def delay(n):
+        gated.append(n)
+        return real_delay(n)
+
+    sched.buckets[("sid", "bob")][0].delay = delay
+
+    async def send(message):
+        sent.append(message)
+
+    s, close = sched.wrap(send, "bob", "198.51.100.1")
+    count = 3 * quantum + 100
+    await s({"type": "http.response.zerocopysend", "file": None, "offset": 1000, "count": count, "more_body": True})
+    close()
+    assert gated == [quantum] * 3 + [100]
+    assert [(m["offset"], m["count"]) for m in sent] == [(1000 + i * quantum, min(quantum, count - i * quantum))
+                                                         for i in range(4)]
+    assert all(m["more_body"] for m in sent)
+
+
+@pytest.mark.anyio
+async def test_stream_buckets_keyed_on_validated_session(app_client, monkeypatch):
+    """伪造的 session_id 不会换到新桶：没有有效会话时按客户端 IP 计"""
+    import os
+    from modules.bandwidth import scheduler
+    from modules.database import db_import_users
+    os.makedirs("static/videos", exist_ok=True)
+    with open("static/videos/clip.mp4", "wb") as f: f.write(os.urandom(4096))
+    monkeypatch.setattr(scheduler, "session_rate", 10 ** 9)
+    monkeypatch.setattr(scheduler, "buckets", {})
+    db_import_users([(1, "alice", "pw", None)])
+    async with app_client() as make:
+        for forged in ("a", "b", "c"):
+            r = await make(cookies={"session_id": forged}).get("/video-stream/clip.mp4")
+            assert r.status_code == 200
+        assert {k for k in scheduler.buckets if k[0] == "sid"} == {("sid", "127.0.0.1")}
+        c = make()
+        await c.post("/login", data={"username": "alice", "password": "pw", "role": "student"})
+        await c.get("/video-stream/clip.mp4")
+        assert ("sid", "alice") in scheduler.buckets
@@ -0,0 +1,58 @@
+# tests/test_finish_load.py
+import asyncio, time
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+STUDENTS = 300
+
+
+async def test_300_simultaneous_submits(app_client):
+    """考试结束时全班同时交卷，且每人用同一幂等键重复点击一次：
+    请求全部快速返回，每人恰好一份成绩单和一次作答记录"""
+    from modules.database import db_import_users, db_add_question, db_get_questions, db_list_records, \
+        db_list_submissions, get_user_db
+    from modules.sessions import session_store
+
+    db_import_users((i, f"s{i}", "pw", None) for i in range(STUDENTS))
+    for i in range(20): db_add_question(f"Q{i}", "a", "b", "c", "d", "ABCD"[i % 4])
+    qids = [q["id"] for q in db_get_questions()]
+
+    async with app_client() as make:
+        clients = [make({"session_id": session_store.create({"username": f"s{i}", "role": "student"})})
+                   for i in range(STUDENTS)]
+        await asyncio.gather(*[c.get("/eeg-test") for c in clients])
+        await asyncio.gather(*[c.post("/submit-answers", data={"qid": qids, "opt": ["A"] * len(qids)})
+                               for c in clients])
+        latencies = []
+
+        async def submit(c, i):
+            t = time.perf_counter()
+            r = await c.post("/finish-test", data={"idem_key": f"key-{i}"})
+            latencies.append(time.perf_counter() - t)
+            return r.status_code
+
+        start = time.perf_counter()
+        codes = await asyncio.gather(*[submit(c, i) for i, c in enumerate(clients)],
+                                     *[submit(c, i) for i, c in enumerate(clients)])
+        burst = time.perf_counter() - start
+        assert set(codes) == {303}
+
+        deadline = time.monotonic() + 60
+        while db_list_submissions():
+            assert time.monotonic() < deadline, "成绩单未在 60 秒内全部生成"
+            await asyncio.sleep(0.05)
+        done = time.perf_counter() - start
+
+        latencies.sort()
+        print(f"\n{2 * STUDENTS} 次交卷请求 {burst:.2f}s 内全部返回（p50 {latencies[len(latencies) // 2] * 1000:.0f}ms，"
+              f"p99 {latencies[int(len(latencies) * 0.99)] * 1000:.0f}ms），{done:.2f}s 后成绩单全部生成")
+
+        records = db_list_records()
+        assert len(records) == STUDENTS
+        assert {r["owner"] for r in records} == {f"s{i}" for i in range(STUDENTS)}
+        with get_user_db() as c:
+            assert c.execute("SELECT COUNT(*) FROM attempts").fetchone()[0] == STUDENTS
+            assert c.execute("SELECT COUNT(*) FROM user_answers").fetchone()[0] == 0
+        r = await clients[7].get("/view-record/s7_成绩单_1.txt")
+        assert r.status_code == 200 and "最终成绩: 5/20" in r.text
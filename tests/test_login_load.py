@@ -0,0 +1,83 @@
+# tests/test_login_load.py
+import asyncio, random, time
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+STUDENTS = 500
+WINDOW = 30  # 全班在开考后 30 秒内登录
+
+
+async def test_unknown_user_runs_the_kdf(fresh_db):
+    """不存在的账号也要在口令线程池里跑一次 KDF，登录耗时不能暴露账号是否存在"""
+    from modules.database import create_user_async, verify_user_async
+    from modules.passwords import password_pool
+    await create_user_async("alice", "pw")
+    before = password_pool.completed
+    assert not await verify_user_async("nobody", "pw")
+    assert not await verify_user_async("alice", "wrong")
+    assert await verify_user_async("alice", "pw")
+    assert password_pool.completed - before == 3
+
+
+async def test_imported_passwords_are_salted_and_upgraded(fresh_db):
+    """名单导入的初始口令存加盐的轻量 KDF 哈希（不是裸 SHA-256），首次登录成功后升级为完整参数"""
+    from modules.database import db_get_password_hash, db_import_users, verify_user_async
+    from modules.passwords import PASSWORD_IMPORT_PBKDF2_ITERATIONS, _LEGACY, hash_password
+    assert db_import_users([(1, "s1", "pw", None), (2, "s2", "pw", None)]) == (2, [])
+    h1, h2 = db_get_password_hash("s1"), db_get_password_hash("s2")
+    assert h1 != h2 and not _LEGACY.fullmatch(h1)
+    assert h1.startswith(f"pbkdf2_sha256${PASSWORD_IMPORT_PBKDF2_ITERATIONS}$")
+    assert await verify_user_async("s1", "pw")
+    upgraded = db_get_password_hash("s1")
+    assert upgraded != h1 and upgraded.split("$")[:2] == hash_password("x").split("$")[:2]
+    assert not await verify_user_async("s2", "wrong") and db_get_password_hash("s2") == h2
+
+
+async def test_500_logins_within_30_seconds(app_client, monkeypatch):
+    """开考登录风暴：500 人在 30 秒内陆续登录（名单导入的轻量哈希在首次登录时升级为完整参数）。
+    线程池排满时立即返回 503 + Retry-After，客户端按提示重试；全部登录成功，事件循环始终保持响应。
+    测试机 CPU 核数不定，KDF 迭代次数降到十分之一，到达时间窗口按同样比例压缩"""
+    from modules import passwords
+    from modules.database import db_import_users, get_user_db
+    monkeypatch.setattr(passwords, "PASSWORD_PBKDF2_ITERATIONS", passwords.PASSWORD_PBKDF2_ITERATIONS // 10)
+    db_import_users((i, f"s{i}", f"pw{i}", None) for i in range(STUDENTS))
+    window = WINDOW / 10
+
+    async with app_client() as make:
+        busy, probe_ms, storm_over = [0], [], asyncio.Event()
+
+        async def login(i):
+            await asyncio.sleep(random.uniform(0, window))
+            c = make()
+            while True:
+                r = await c.post("/login", data={"username": f"s{i}", "password": f"pw{i}", "role": "student"})
+                if r.status_code == 303: return time.perf_counter()
+                assert r.status_code == 503, r.status_code
+                busy[0] += 1
+                await asyncio.sleep(int(r.headers["retry-after"]) / 10)
+
+        async def probe():
+            # 登录风暴期间其他页面（走事件循环、不涉及哈希）的响应时间
+            c = make()
+            while not storm_over.is_set():
+                t = time.perf_counter()
+                assert (await c.get("/login-page")).status_code == 200
+                probe_ms.append((time.perf_counter() - t) * 1000)
+                await asyncio.sleep(0.05)
+
+        start = time.perf_counter()
+        prober = asyncio.ensure_future(probe())
+        finished = await asyncio.gather(*[login(i) for i in range(STUDENTS)])
+        storm_over.set()
+        await prober
+
+    elapsed = max(finished) - start
+    probe_ms.sort()
+    p99 = probe_ms[int(len(probe_ms) * 0.99)]
+    print(f"\n{STUDENTS} 人 {elapsed:.1f}s 内全部登录（到达窗口 {window:.0f}s），503 重试 {busy[0]} 次，"
+          f"其他页面 p99 {p99:.0f}ms")
+    assert elapsed < window * 3
+    assert p99 < 500
+    with get_user_db() as c:
+        assert c.execute("SELECT COUNT(*) FROM users WHERE password LIKE 'pbkdf2_sha256$%'").fetchone()[0] == STUDENTS
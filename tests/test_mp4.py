@@ -0,0 +1,77 @@
+# tests/test_mp4.py
+import os, struct
+import pytest
+from modules.mp4 import MP4Error, faststart, scan_top_level
+
+SAMPLES = [os.urandom(n) for n in (3000, 1234, 777, 4096)]
+
+
+def _box(btype: bytes, payload: bytes) -> bytes:
+    return struct.pack(">I4s", len(payload) + 8, btype) + payload
+
+
+def _moov(offsets, co64=False):
+    if co64:
+        table = _box(b"co64", struct.pack(f">II{len(offsets)}Q", 0, len(offsets), *offsets))
+    else:
+        table = _box(b"stco", struct.pack(f">II{len(offsets)}I", 0, len(offsets), *offsets))
+    mvhd = _box(b"mvhd", struct.pack(">IIIII", 0, 0, 0, 1000, 8000) + bytes(80))  # 8 秒
+    tkhd = _box(b"tkhd", bytes(76) + struct.pack(">II", 1280 << 16, 720 << 16))
+    hdlr = _box(b"hdlr", struct.pack(">II4s", 0, 0, b"vide") + bytes(13))
+    stbl = _box(b"stbl", _box(b"stsd", bytes(8)) + table)
+    mdia = _box(b"mdia", hdlr + _box(b"minf", stbl))
+    return _box(b"moov", mvhd + _box(b"trak", tkhd + mdia))
+
+
+def _write_moov_last(path, co64=False, trailer=b""):
+    """ftyp + mdat(样本) + moov（录屏软件的默认布局），moov 之后可再跟一个 box"""
+    ftyp = _box(b"ftyp", b"isom" + bytes(4) + b"isommp41")
+    offsets, pos = [], len(ftyp) + 8
+    for s in SAMPLES:
+        offsets.append(pos); pos += len(s)
+    with open(path, "wb") as f:
+        f.write(ftyp + _box(b"mdat", b"".join(SAMPLES)) + _moov(offsets, co64) + trailer)
+
+
+def _chunk_offsets(path):
+    with open(path, "rb") as f: data = f.read()
+    moov = next(b for b in scan_top_level(path) if b[0] == b"moov")
+    for table, fmt in ((b"stco", "I"), (b"co64", "Q")):
+        i = data.find(table, moov[1], moov[1] + moov[3])
+        if i >= 0:
+            count = struct.unpack_from(">I", data, i + 8)[0]
+            return data, list(struct.unpack_from(f">{count}{fmt}", data, i + 12))
+    raise AssertionError("没有块偏移表")
+
+
+@pytest.mark.parametrize("co64", [False, True])
+def test_faststart_moves_moov_and_rewrites_offsets(tmp_path, co64):
+    path = str(tmp_path / "lecture.mp4")
+    _write_moov_last(path, co64, trailer=_box(b"free", bytes(16)))
+    size = os.path.getsize(path)
+    meta = faststart(path)
+    assert [b[0] for b in scan_top_level(path)] == [b"ftyp", b"moov", b"mdat", b"free"]
+    assert os.path.getsize(path) == size
+    data, offsets = _chunk_offsets(path)
+    assert [data[o:o + len(s)] for o, s in zip(offsets, SAMPLES)] == SAMPLES
+    assert meta == {"duration": 8.0, "width": 1280, "height": 720, "bitrate": size}
+    assert not os.path.exists(path + ".faststart")
+
+
+def test_already_faststart_is_left_alone(tmp_path):
+    path = str(tmp_path / "lecture.mp4")
+    _write_moov_last(path)
+    faststart(path)
+    with open(path, "rb") as f: before = f.read()
+    assert faststart(path)["duration"] == 8.0
+    with open(path, "rb") as f: assert f.read() == before
+
+
+def test_not_an_mp4(tmp_path):
+    path = str(tmp_path / "notes.mp4")
+    with open(path, "wb") as f: f.write(b"not a video at all")
+    with pytest.raises(MP4Error):
+        faststart(path)
+    with open(path, "wb") as f: f.write(_box(b"ftyp", b"isom") + _box(b"mdat", bytes(10)))
+    with pytest.raises(MP4Error):
+        faststart(path)
@@ -0,0 +1,81 @@
+# tests/test_page_cache.py
+import os, shutil
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def editable_templates():
+    """用例可以修改模板 / 静态资源，结束后还原并清空页面缓存"""
+    from modules.page_cache import page_cache
+    shutil.copytree("templates", ".templates.bak")
+    shutil.copytree("static", ".static.bak")
+    page_cache.pages.clear()
+    yield
+    for name in ("templates", "static"):
+        shutil.rmtree(name)
+        os.rename(f".{name}.bak", name)
+    page_cache.pages.clear()
+
+
+def _edit(path, old, new):
+    with open(path, encoding="utf-8") as f:
+        text = f.read()
+    assert old in text
+    st = os.stat(path)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text.replace(old, new, 1))
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 10 ** 9))  # 保证修改时间一定变化
+
+
+async def test_etag_and_template_invalidation(app_client, editable_templates):
+    from modules.page_cache import page_cache
+    async with app_client() as make:
+        c = make()
+        first = await c.get("/login-page")
+        etag = first.headers["etag"]
+        assert first.status_code == 200 and first.headers["cache-control"] == "no-cache"
+        assert (await c.get("/login-page", headers={"If-None-Match": etag})).status_code == 304
+        hits = page_cache.hits
+        assert (await c.get("/login-page")).content == first.content and page_cache.hits == hits + 1
+
+        # 修改页面模板本身
+        _edit("templates/login.html", "{% block content %}", "{% block content %}<!-- v2 -->")
+        second = await c.get("/login-page", headers={"If-None-Match": etag})
+        assert second.status_code == 200 and "<!-- v2 -->" in second.text and second.headers["etag"] != etag
+
+        # 修改继承的父模板，所有子页面都失效
+        _edit("templates/base.html", "<head>", "<head><!-- base v2 -->")
+        third = await c.get("/login-page", headers={"If-None-Match": second.headers["etag"]})
+        assert third.status_code == 200 and "<!-- base v2 -->" in third.text
+        assert "<!-- base v2 -->" in (await c.get("/register-page")).text
+
+
+def test_role_is_part_of_the_key(editable_templates):
+    from starlette.requests import Request
+    from modules.page_cache import page_cache
+    request = Request({"type": "http", "method": "GET", "path": "/index", "headers": [], "query_string": b""})
+    guest, admin = page_cache.render(request, "index.html"), page_cache.render(request, "index.html", role="admin")
+    assert guest.headers["etag"] != admin.headers["etag"]
+    assert "账号管理" in admin.body.decode() and "账号管理" not in guest.body.decode()
+    assert page_cache.render(request, "index.html", role="admin").headers["etag"] == admin.headers["etag"]
+
+
+async def test_asset_rebuild_invalidates_pages(app_client, editable_templates):
+    from modules.assets import assets
+    from modules.sessions import session_store
+    async with app_client() as make:
+        c = make({"session_id": session_store.create({"username": "s1", "role": "student"})})
+        first = await c.get("/video-catalog")
+        assert first.headers["cache-control"] == "private, no-cache"
+        old_url = assets.url("css/global.css")
+        assert old_url in first.text
+
+        # 样式表内容变化：后台检查重建之前页面不变，重建后指纹变化，引用它的页面重新渲染
+        _edit("static/css/global.css", "{", "{ outline: 0;")
+        assert (await c.get("/video-catalog", headers={"If-None-Match": first.headers["etag"]})).status_code == 304
+        assert assets.refresh() == 1  # 后台任务的一次检查
+        new_url = assets.url("css/global.css")
+        page = await c.get("/video-catalog", headers={"If-None-Match": first.headers["etag"]})
+        assert new_url != old_url and page.status_code == 200 and new_url in page.text and old_url not in page.text
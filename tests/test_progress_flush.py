@@ -0,0 +1,22 @@
+# tests/test_progress_flush.py
+import time
+
+
+def test_close_waits_for_running_flush_then_writes_the_rest(fresh_db):
+    """关闭时定时落盘还在写线程上执行：其快照与之后到达的新进度都不能丢"""
+    from modules.database import close_db, db_get_progress, progress_buffer, get_user_db, _executor
+    progress_buffer.put("a", 1, "30%")
+    rows = progress_buffer.drain()  # 定时落盘已取走快照、正在写库
+
+    def slow_flush():
+        time.sleep(0.2)
+        with get_user_db() as c:
+            c.executemany("INSERT OR REPLACE INTO video_progress (username, video_id, progress) VALUES (?,?,?)", rows)
+            c.commit()
+        progress_buffer.done(True)
+
+    _executor(True).submit(slow_flush)
+    progress_buffer.put("a", 2, "90%")  # 落盘期间到达的新进度
+    close_db()
+    assert progress_buffer.stats()["pending"] == 0
+    assert sorted(p["progress"] for p in db_get_progress("a")) == ["30%", "90%"]
@@ -0,0 +1,76 @@
+# tests/test_query_plans.py
+import ast, os, re
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _static_queries():
+    """modules/database.py 中所有以字符串字面量写死的 execute / executemany 语句"""
+    with open(os.path.join(ROOT, "modules", "database.py"), encoding="utf-8") as f:
+        tree = ast.parse(f.read())
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute) \
+                and node.func.attr in ("execute", "executemany") and node.args \
+                and isinstance(node.args[0], ast.Constant) and isinstance(node.args[0].value, str):
+            yield node.lineno, node.args[0].value
+
+
+def _dynamic_queries(c):
+    """运行时拼接的语句（f-string / 条件拼接）：调用生成它们的函数并记录实际执行的 SQL"""
+    from modules import database as db
+    seen = []
+    c.set_trace_callback(seen.append)
+    try:
+        for sort in db.USER_SORT_COLUMNS:
+            for q, after in (("", None), ("ab", None), ("abc", None), ("", ("x", 1)), ("abc", ("x", 1))):
+                db.db_search_users(q, sort, desc=False, after=after)
+                db.db_search_users(q, sort, desc=True, after=after)
+        db.db_delete_users(["a", "b"])
+        for owner in (None, "a"):
+            for q in ("", "ab", "abc"): db.db_list_records(owner, q)
+            db.db_list_submissions(owner)
+        db.progress_buffer.put("a", 1, "50%")
+        db.db_get_progress("a")
+        db.progress_buffer.discard_user("a")
+    finally:
+        c.set_trace_callback(None)
+    return [s for s in seen if s.lstrip().upper().startswith(("SELECT", "INSERT", "UPDATE", "DELETE"))]
+
+
+def _plan(c, sql):
+    # 绑定参数全部给 NULL 只影响结果、不影响计划；?N 形式按最大编号计数
+    numbered = [int(n) for n in re.findall(r"\?(\d+)", sql)]
+    count = max(numbered) if numbered else sql.count("?")
+    return [r[3] for r in c.execute("EXPLAIN QUERY PLAN " + sql, [None] * count).fetchall()]
+
+
+def _full_scans(plan, tables):
+    """计划中对真实表的全表扫描（覆盖索引的 SCAN ... USING INDEX 也算）；虚拟表、子查询、json_each 除外"""
+    scans = []
+    for step in plan:
+        m = re.match(r"SCAN (\w+)(?:\s+AS\s+\w+)?(.*)", step)
+        if m and m.group(1) in tables and "VIRTUAL TABLE" not in m.group(2): scans.append(step)
+    return scans
+
+
+# 1～2 个字符的关键字走 LIKE '%..%' 子串匹配（≥3 个字符走 trigram 全文索引），B-tree 索引无法加速，属预期
+_SHORT_KEYWORD = re.compile(r"LIKE '%[^%]{1,2}%'")
+
+
+def test_no_full_table_scans(fresh_db):
+    """带 WHERE 条件的语句都必须走索引；只有本意就是列出整张表的语句（不带 WHERE）允许全表扫描"""
+    from modules.database import get_user_db
+    with get_user_db() as c:
+        tables = {r[0] for schema in ("main", "res")
+                  for r in c.execute(f"SELECT name FROM {schema}.sqlite_master WHERE type = 'table'")}
+        queries = [(f"database.py:{line}", sql) for line, sql in _static_queries()]
+        queries += [("dynamic", sql) for sql in _dynamic_queries(c)]
+        assert len(queries) > 80
+        offenders = []
+        for where, sql in queries:
+            if not re.search(r"\bWHERE\b", sql, re.I) or "sqlite_master" in sql or _SHORT_KEYWORD.search(sql):
+                continue
+            for step in _full_scans(_plan(c, sql), tables):
+                offenders.append(f"{where}: {step}\n    {' '.join(sql.split())}")
+        c.rollback()
+    assert not offenders, "全表扫描：\n" + "\n".join(offenders)
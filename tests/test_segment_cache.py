@@ -0,0 +1,75 @@
+# tests/test_segment_cache.py
+import asyncio, os
+import pytest
+from modules import segment_cache as sc
+from modules.segment_cache import SegmentCache
+
+pytestmark = pytest.mark.anyio
+
+SEG = 4096
+
+
+@pytest.fixture
+def video(tmp_path):
+    path = str(tmp_path / "lecture.mp4")
+    data = os.urandom(SEG * 4 + 100)
+    with open(path, "wb") as f: f.write(data)
+    return path, data
+
+
+async def test_concurrent_misses_read_disk_once(video, monkeypatch):
+    """上百个请求同时要同一分片：只读一次磁盘，其余搭便车"""
+    path, data = video
+    reads = []
+    real = sc._read_segment
+
+    def counting(p, offset, size):
+        reads.append(offset)
+        return real(p, offset, size)
+
+    monkeypatch.setattr(sc, "_read_segment", counting)
+    cache = SegmentCache(SEG * 10, SEG)
+    st = os.stat(path)
+    got = await asyncio.gather(*[cache.get(path, st, SEG) for _ in range(100)])
+    assert reads == [SEG] and all(g == data[SEG:2 * SEG] for g in got)
+    assert cache.coalesced == 99 and not cache.inflight
+    assert await cache.get(path, st, SEG * 4) == data[SEG * 4:]  # 末尾不满一个分片
+    assert cache.hits == 0 and await cache.get(path, st, SEG) == data[SEG:2 * SEG] and cache.hits == 1
+
+
+async def test_cancelled_leader_does_not_break_followers(video):
+    path, data = video
+    cache = SegmentCache(SEG * 10, SEG)
+    st = os.stat(path)
+    leader = asyncio.ensure_future(cache.get(path, st, 0))
+    await asyncio.sleep(0)
+    follower = asyncio.ensure_future(cache.get(path, st, 0))
+    await asyncio.sleep(0)
+    leader.cancel()
+    assert await follower == data[:SEG]
+
+
+async def test_lru_budget(video):
+    path, data = video
+    cache = SegmentCache(SEG * 2, SEG)
+    st = os.stat(path)
+    for off in (0, SEG, 0, 2 * SEG):  # 访问 0 之后 SEG 成为最久未用
+        await cache.get(path, st, off)
+    assert cache.used <= cache.budget and cache.evictions == 1
+    assert {k[3] for k in cache.entries} == {0, 2 * SEG}
+
+
+async def test_invalidate_and_rewrite(video):
+    """覆盖同名文件后 mtime / inode 变化，旧分片不会被读到；invalidate 释放预算"""
+    path, data = video
+    cache = SegmentCache(SEG * 10, SEG)
+    await cache.get(path, os.stat(path), 0)
+    cache.invalidate(path)
+    assert cache.used == 0 and not cache.entries and not cache.by_path
+
+    await cache.get(path, os.stat(path), 0)
+    new = os.urandom(len(data))
+    with open(path, "wb") as f: f.write(new)
+    st = os.stat(path)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 10 ** 9))
+    assert await cache.get(path, os.stat(path), 0) == new[:SEG]
@@ -0,0 +1,116 @@
+# tests/test_streaming.py
+import os, re
+import pytest
+from modules.streaming import parse_range_header, send_video_range
+
+SIZE = 3 * 1024 * 1024 + 123  # 跨越多个缓存分片，末尾不对齐
+
+
+@pytest.fixture
+def video():
+    os.makedirs("static/videos", exist_ok=True)
+    path = "static/videos/lecture.mp4"
+    data = os.urandom(SIZE)
+    with open(path, "wb") as f: f.write(data)
+    from modules.segment_cache import segment_cache
+    segment_cache.invalidate(path)
+    yield data
+    os.remove(path)
+
+
+def test_parse_range_header():
+    assert parse_range_header(None, 1000) is None
+    assert parse_range_header("bytes=0-99", 1000) == [(0, 99)]
+    assert parse_range_header("bytes=900-", 1000) == [(900, 999)]
+    assert parse_range_header("bytes=-100", 1000) == [(900, 999)]
+    assert parse_range_header("bytes=-5000", 1000) == [(0, 999)]
+    assert parse_range_header("bytes=990-5000", 1000) == [(990, 999)]
+    # 重叠、相邻区间合并
+    assert parse_range_header("bytes=0-9,5-19,20-29,100-109", 1000) == [(0, 29), (100, 109)]
+    # 语法错误或单位不认识：忽略整个头
+    for bad in ("bytes=abc", "bytes=5-1", "items=0-1", "bytes=", "bytes=1-x", "bytes=0"):
+        assert parse_range_header(bad, 1000) is None, bad
+    # 都落在文件之外：无法满足
+    assert parse_range_header("bytes=1000-", 1000) == []
+    assert parse_range_header("bytes=-0", 1000) == []
+    assert parse_range_header(",".join(f"{i * 10}-{i * 10 + 1}" for i in range(17)), 1000) is None
+
+
+def _multipart(body: bytes, boundary: str):
+    parts = []
+    for chunk in body.split(b"--" + boundary.encode())[1:-1]:
+        head, _, payload = chunk.partition(b"\r\n\r\n")
+        m = re.search(rb"Content-Range: bytes (\d+)-(\d+)/(\d+)", head)
+        parts.append(((int(m.group(1)), int(m.group(2)), int(m.group(3))), payload[:-2]))
+    return parts
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("cached", [True, False])
+async def test_range_requests(app_client, video, monkeypatch, cached):
+    """分片缓存与 mmap 两条发送路径返回同样的字节"""
+    from modules.segment_cache import segment_cache
+    if not cached: monkeypatch.setattr(segment_cache, "budget", 0)
+    async with app_client() as make:
+        c = make()
+        r = await c.get("/video-stream/lecture.mp4")
+        assert r.status_code == 200 and r.content == video and r.headers["accept-ranges"] == "bytes"
+
+        start, end = 1024 * 1024 - 10, 2 * 1024 * 1024 + 10  # 跨分片边界
+        r = await c.get("/video-stream/lecture.mp4", headers={"Range": f"bytes={start}-{end}"})
+        assert r.status_code == 206
+        assert r.headers["content-range"] == f"bytes {start}-{end}/{SIZE}"
+        assert r.content == video[start:end + 1] and int(r.headers["content-length"]) == end - start + 1
+
+        r = await c.get("/video-stream/lecture.mp4", headers={"Range": "bytes=-500"})
+        assert r.status_code == 206 and r.content == video[-500:]
+
+        r = await c.get("/video-stream/lecture.mp4", headers={"Range": "bytes=0-99,200-299,250-399"})
+        assert r.status_code == 206 and "content-range" not in r.headers
+        ctype = r.headers["content-type"]
+        assert ctype.startswith("multipart/byteranges; boundary=")
+        parts = _multipart(r.content, ctype.split("boundary=")[1])
+        assert parts == [((0, 99, SIZE), video[:100]), ((200, 399, SIZE), video[200:400])]
+        assert int(r.headers["content-length"]) == len(r.content)
+
+
+@pytest.mark.anyio
+async def test_unsatisfiable_and_conditional(app_client, video):
+    async with app_client() as make:
+        c = make()
+        r = await c.get("/video-stream/lecture.mp4", headers={"Range": f"bytes={SIZE}-"})
+        assert r.status_code == 416 and r.headers["content-range"] == f"bytes */{SIZE}"
+
+        etag = (await c.head("/video-stream/lecture.mp4")).headers["etag"]
+        r = await c.get("/video-stream/lecture.mp4", headers={"If-None-Match": f"W/{etag}"})
+        assert r.status_code == 304 and not r.content
+
+        r = await c.get("/video-stream/lecture.mp4", headers={"Range": "bytes=0-9", "If-Range": etag})
+        assert r.status_code == 206 and r.content == video[:10]
+        # If-Range 不匹配（文件已更换）：忽略 Range，回整个新文件
+        r = await c.get("/video-stream/lecture.mp4", headers={"Range": "bytes=0-9", "If-Range": '"stale"'})
+        assert r.status_code == 200 and r.content == video
+        r = await c.get("/video-stream/lecture.mp4",
+                        headers={"Range": "bytes=0-9", "If-Range": "Mon, 01 Jan 2001 00:00:00 GMT"})
+        assert r.status_code == 200
+
+        r = await c.head("/video-stream/lecture.mp4", headers={"Range": "bytes=0-9"})
+        assert r.status_code == 206 and not r.content and r.headers["content-length"] == "10"
+        assert (await c.get("/video-stream/missing.mp4")).status_code == 404
+
+
+@pytest.mark.anyio
+async def test_zerocopysend_messages(video):
+    """服务器声明 zerocopysend 扩展时按区间发 offset/count，文件内容不经过 Python"""
+    resp = send_video_range("static/videos/lecture.mp4", {"range": "bytes=0-9,100-199"})
+    messages = []
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {"type": "http", "extensions": {"http.response.zerocopysend": {}}}
+    await resp(scope, None, send)
+    assert messages[0]["status"] == 206
+    zc = [(m["offset"], m["count"]) for m in messages if m["type"] == "http.response.zerocopysend"]
+    assert zc == [(0, 10), (100, 100)]
+    assert messages[-1]["more_body"] is False
@@ -0,0 +1,59 @@
+# tests/test_transcript_archive.py
+import os
+import pytest
+from modules.transcript_archive import TranscriptArchive, ArchiveError
+
+
+def test_append_and_read(tmp_path):
+    archive = TranscriptArchive(str(tmp_path), 1024 * 1024)
+    reports = {(f"s{i}", i + 1): f"成绩单 {i}\n".encode("utf-8") * (i + 1) for i in range(20)}
+    located = {key: archive.append(key[0], key[1], data) for key, data in reports.items()}
+    assert archive.segments() == [1]
+    for key, (segment, offset, length) in located.items():
+        assert archive.read(segment, offset, length) == reports[key]
+
+
+def test_rollover_and_scan(tmp_path):
+    archive = TranscriptArchive(str(tmp_path), 1000)
+    located = [archive.append("s1", seq, os.urandom(300)) for seq in range(1, 13)]  # 随机内容压缩不了，约 3 条一段
+    segments = archive.segments()
+    assert len(segments) > 1 and segments == list(range(1, len(segments) + 1))
+    for segment in segments[:-1]:
+        assert os.path.getsize(archive._path(segment)) >= 1000  # 写满才换段
+    scanned = [(seg, off, ln) for seg in segments for _, _, off, ln in archive.scan(seg)]
+    assert scanned == located
+    assert [seq for seg in segments for _, seq, _, _ in archive.scan(seg)] == list(range(1, 13))
+
+
+def test_corrupt_frame_detected(tmp_path):
+    archive = TranscriptArchive(str(tmp_path), 1024 * 1024)
+    segment, offset, length = archive.append("s1", 1, b"report body" * 50)
+    with open(archive._path(segment), "r+b") as f:
+        f.seek(offset + length - 5)
+        f.write(b"\x00\x00\x00\x00\x00")
+    with pytest.raises(ArchiveError):
+        archive.read(segment, offset, length)
+    with pytest.raises(ArchiveError):
+        archive.read(segment, offset, length + 10)  # 超出文件末尾：记录不完整
+
+
+def test_reports_round_trip_through_the_index(fresh_db):
+    """成绩单经由 records 索引写入归档，按文件名读回；TXT 时代的旧存档仍可读"""
+    from datetime import datetime
+    from modules.database import db_complete_submission, db_get_record, db_read_record, db_submit_exam, \
+        db_claim_submission, db_import_users, db_list_records, db_reset_exam, EXAM_EEG
+    db_import_users([(1, "s1", "pw", None)])
+    for n in (1, 2):
+        sid = db_submit_exam("s1", EXAM_EEG, key=f"k{n}")
+        db_claim_submission(sid, 0)
+        path = db_complete_submission(sid, "s1", datetime.now(), datetime.now(), 1, 2, "C",
+                                      f"第 {n} 份".encode("utf-8"), [])
+        assert path == f"s1_成绩单_{n}.txt"
+        db_reset_exam()
+    records = db_list_records("s1")
+    assert [r["seq"] for r in records] == [2, 1] and all(r["segment"] is not None for r in records)
+    assert db_read_record(db_get_record("s1_成绩单_1.txt")).decode("utf-8") == "第 1 份"
+
+    with open(os.path.join("Data", "legacy.txt"), "wb") as f:
+        f.write(b"old report")
+    assert db_read_record({"segment": None, "path": "legacy.txt"}) == b"old report"
@@ -0,0 +1,119 @@
+# tests/test_uploads.py
+import os, zlib
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+CHUNK = 1024
+
+
+async def _admin(make):
+    from modules.database import create_user_async
+    await create_user_async("admin", "pw")
+    c = make()
+    r = await c.post("/login", data={"username": "admin", "password": "pw", "role": "admin", "admin_serial": "123456"})
+    assert r.status_code == 303
+    return c
+
+
+async def _init(c, data, chunk=CHUNK):
+    os.makedirs("static/videos", exist_ok=True)
+    r = await c.post("/upload-video/init", data={"title": "第一讲", "filename": "../lecture.mp4",
+                                                 "total_size": len(data), "chunk_size": chunk})
+    assert r.status_code == 200
+    return r.json()["upload_id"]
+
+
+async def _put(c, uid, index, piece, crc=None):
+    crc = f"{zlib.crc32(piece):08x}" if crc is None else crc
+    return await c.put(f"/upload-video/{uid}/chunk/{index}", content=piece, headers={"X-Chunk-CRC32": crc})
+
+
+async def test_chunked_upload_round_trip(app_client):
+    data = os.urandom(CHUNK * 3 + 100)
+    async with app_client() as make:
+        c = await _admin(make)
+        uid = await _init(c, data)
+        for i in range(4):
+            r = await _put(c, uid, i, data[i * CHUNK:(i + 1) * CHUNK])
+            assert r.status_code == 200 and r.json()["next_index"] == i + 1
+        r = await c.post(f"/upload-video/{uid}/finalize", data={"crc32": f"{zlib.crc32(data):08x}"})
+        assert r.status_code == 200
+        fn = r.json()["filename"]
+        assert fn.endswith("_lecture.mp4") and "/" not in fn
+        with open(os.path.join("static/videos", fn), "rb") as f: assert f.read() == data
+        assert not os.path.exists(f"static/videos/{uid}.part")
+        assert (await c.get(f"/upload-video/{uid}")).status_code == 404
+
+
+async def test_bad_crc_out_of_order_and_resume(app_client):
+    """校验和不符的分片被丢弃；跳号返回 409；重传已收到的分片是幂等的；断线后按 next_index 续传"""
+    data = os.urandom(CHUNK * 3)
+    async with app_client() as make:
+        c = await _admin(make)
+        uid = await _init(c, data)
+        assert (await _put(c, uid, 0, data[:CHUNK], crc="deadbeef")).status_code == 400
+        assert os.path.getsize(f"static/videos/{uid}.part") == 0
+        assert (await _put(c, uid, 0, data[:CHUNK - 1])).status_code == 400  # 长度不足
+        assert (await _put(c, uid, 1, data[CHUNK:2 * CHUNK])).status_code == 409
+        assert (await _put(c, uid, 0, data[:CHUNK])).status_code == 200
+        r = await _put(c, uid, 0, data[:CHUNK])
+        assert r.status_code == 200 and r.json()["next_index"] == 1
+
+        status = (await c.get(f"/upload-video/{uid}")).json()
+        assert status["next_index"] == 1 and status["received"] == CHUNK
+        for i in range(status["next_index"], 3):
+            assert (await _put(c, uid, i, data[i * CHUNK:(i + 1) * CHUNK])).status_code == 200
+        r = await c.post(f"/upload-video/{uid}/finalize", data={"crc32": "00000000"})
+        assert r.status_code == 400  # 整体校验和不符
+        r = await c.post(f"/upload-video/{uid}/finalize", data={"crc32": f"{zlib.crc32(data):08x}"})
+        assert r.status_code == 200
+
+
+async def test_incomplete_upload_cannot_finalize(app_client):
+    data = os.urandom(CHUNK * 2)
+    async with app_client() as make:
+        c = await _admin(make)
+        uid = await _init(c, data)
+        await _put(c, uid, 0, data[:CHUNK])
+        r = await c.post(f"/upload-video/{uid}/finalize", data={"crc32": f"{zlib.crc32(data):08x}"})
+        assert r.status_code == 400 and r.json()["next_index"] == 1
+
+
+async def test_lost_part_file_returns_404(app_client):
+    """.part 被清理或进程崩溃丢失时返回 JSON 404 而不是 500，并清掉登记与锁"""
+    from modules import routes
+    data = os.urandom(CHUNK)
+    async with app_client() as make:
+        c = await _admin(make)
+        uid = await _init(c, data)
+        assert (await _put(c, uid, 0, data)).status_code == 200
+        os.remove(f"static/videos/{uid}.part")
+        r = await c.post(f"/upload-video/{uid}/finalize", data={"crc32": f"{zlib.crc32(data):08x}"})
+        assert r.status_code == 404 and r.json()["status"] == "error"
+        assert uid not in routes.upload_locks
+        assert (await c.get(f"/upload-video/{uid}")).status_code == 404
+
+        uid = await _init(c, data)
+        os.remove(f"static/videos/{uid}.part")
+        r = await _put(c, uid, 0, data)
+        assert r.status_code == 404 and r.json()["status"] == "error"
+
+
+async def test_purge_drops_stale_uploads_and_locks(app_client, monkeypatch):
+    from modules import routes
+    data = os.urandom(CHUNK * 2)
+    async with app_client() as make:
+        c = await _admin(make)
+        uid = await _init(c, data)
+        await _put(c, uid, 0, data[:CHUNK])
+        assert uid in routes.upload_locks
+
+        async def expired(days):
+            return [uid]
+
+        monkeypatch.setattr(routes, "db_expired_uploads_async", expired)
+        await routes._purge_stale_uploads()
+        assert uid not in routes.upload_locks
+        assert not os.path.exists(f"static/videos/{uid}.part")
+        assert (await c.get(f"/upload-video/{uid}")).status_code == 404
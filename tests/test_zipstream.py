@@ -0,0 +1,45 @@
+# tests/test_zipstream.py
+import io, os, zipfile, zlib
+import pytest
+from modules.zipstream import zip_stream
+
+
+def _open(chunks) -> zipfile.ZipFile:
+    return zipfile.ZipFile(io.BytesIO(b"".join(chunks)))
+
+
+@pytest.mark.parametrize("compress", [True, False])
+def test_round_trip_with_zipfile(tmp_path, compress):
+    files = {"张三_成绩单.txt": "答对 18 / 20\n".encode("utf-8") * 500, "empty.txt": b"",
+             "random.bin": os.urandom(300 * 1024)}
+    entries = []
+    for name, data in files.items():
+        (tmp_path / name).write_bytes(data)
+        entries.append((name, str(tmp_path / name)))
+    entries.append(("missing.txt", str(tmp_path / "missing.txt")))  # 已被删除的文件跳过
+    entries.append(("archived.txt", lambda: b"from the archive"))
+    entries.append(("gone.txt", lambda: None))
+    zf = _open(zip_stream(entries, compress=compress))
+    assert zf.testzip() is None  # 逐条校验 CRC
+    infos = {i.filename: i for i in zf.infolist()}
+    assert list(infos) == ["张三_成绩单.txt", "empty.txt", "random.bin", "archived.txt"]
+    for name, data in files.items():
+        assert zf.read(name) == data and infos[name].CRC == zlib.crc32(data)
+    assert zf.read("archived.txt") == b"from the archive"
+    assert all(i.compress_type == (zipfile.ZIP_DEFLATED if compress else zipfile.ZIP_STORED) for i in zf.infolist())
+
+
+def test_output_is_incremental(tmp_path):
+    """大文件边压缩边产出：第一块远小于整包，不在内存里攒整个压缩包"""
+    (tmp_path / "big.bin").write_bytes(os.urandom(2 * 1024 * 1024))
+    chunks = list(zip_stream([("big.bin", str(tmp_path / "big.bin"))]))
+    assert len(chunks) > 10 and max(len(c) for c in chunks) < 256 * 1024
+    assert _open(chunks).read("big.bin") == (tmp_path / "big.bin").read_bytes()
+
+
+def test_zip64_end_of_central_directory():
+    """条目数超过 65535 时改写 ZIP64 目录结尾记录"""
+    count = 0x10000 + 10
+    zf = _open(zip_stream(((f"{i}.txt", lambda i=i: str(i).encode()) for i in range(count)), compress=False))
+    assert len(zf.infolist()) == count
+    assert zf.read("0.txt") == b"0" and zf.read(f"{count - 1}.txt") == str(count - 1).encode()